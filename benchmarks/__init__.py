@@ -0,0 +1,6 @@
+"""
+Benchmarks for workenv
+
+Run from the repository root, eg ``python -m benchmarks.memoize``, or
+``python -m benchmarks.suite --output results.json`` for the full suite
+"""
@@ -0,0 +1,55 @@
+"""
+Micro-benchmark for resolving Command.source, env, run and Project.commands
+
+Measures the cost per access as _common grows. Resolved values are memoized until the
+config changes, so the cost should not grow with the size of _common.
+
+Usage::
+
+    python -m benchmarks.memoize
+"""
+
+import timeit
+
+from workenv.config import Config
+
+COMMON_SIZES = [0, 10, 100, 1000]
+NUMBER = 10_000
+
+
+def make_config(common_size: int) -> Config:
+    config = Config()
+    config.load_data(
+        {
+            "_common": {
+                "source": [f"/path/src/{i}" for i in range(common_size)],
+                "env": {f"KEY_{i}": f"value_{i}" for i in range(common_size)},
+                "run": [f"run {i}" for i in range(common_size)],
+                "commands": {f"command_{i}": {} for i in range(common_size)},
+            },
+            "project": {
+                "path": "/path/1",
+                "commands": {"command": {"run": "ls"}},
+            },
+        }
+    )
+    return config
+
+
+def main():
+    print(f"{'_common size':>12}  {'attr':>8}  {'ns per access':>13}")
+    for size in COMMON_SIZES:
+        project = make_config(size).projects["project"]
+        command = project.commands["command"]
+        for attr, obj in [
+            ("source", command),
+            ("env", command),
+            ("run", command),
+            ("commands", project),
+        ]:
+            seconds = timeit.timeit(lambda: getattr(obj, attr), number=NUMBER)
+            print(f"{size:>12}  {attr:>8}  {seconds / NUMBER * 1e9:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
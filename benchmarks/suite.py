@@ -0,0 +1,247 @@
+"""
+Benchmark suite for startup, resolve, completion and save latency at scale
+
+Generates synthetic configs of different sizes and shapes in a temporary dir, then
+measures:
+
+* ``start_cold`` - run workenv in a new process to resolve a project, with an empty
+  cache
+* ``start_warm`` - the same, with the cache populated by a previous run
+* ``load_cold`` - ``Config(file)`` with an empty cache, so every file is parsed
+* ``load_warm`` - ``Config(file)`` using the cached snapshots
+* ``render`` - ``Command.__call__`` for a project, on a newly loaded config
+* ``complete_project`` - ``get_completion_words`` for a project name, using the index
+* ``complete_command`` - ``get_completion_words`` for a command name, using the index
+* ``save`` - add a project to a loaded config and ``Config.save()``
+
+Each measurement is repeated, and the min and median times in seconds are written as
+JSON, so results can be compared between releases.
+
+Usage::
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --sizes 10 1000 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+import workenv
+from workenv import loader
+from workenv.bash import get_completion_words
+from workenv.config import Config
+from workenv.index import load_index
+
+SIZES = [10, 100, 1000, 10_000, 50_000]
+
+# Number of projects to render per repeat, so large configs don't take too long
+RENDER_SAMPLE = 100
+
+
+class Scenario(NamedTuple):
+    projects: int
+    common: int
+    commands: int
+    deferred_ratio: float
+
+    @property
+    def name(self) -> str:
+        return (
+            f"projects={self.projects} common={self.common} "
+            f"commands={self.commands} deferred={self.deferred_ratio}"
+        )
+
+
+def get_scenarios(sizes: List[int]) -> List[Scenario]:
+    scenarios = []
+    for size in sizes:
+        scenarios.extend(
+            [
+                Scenario(projects=size, common=0, commands=0, deferred_ratio=0),
+                Scenario(projects=size, common=10, commands=5, deferred_ratio=0),
+                Scenario(projects=size, common=10, commands=5, deferred_ratio=0.5),
+            ]
+        )
+    return scenarios
+
+
+def get_project_data(scenario: Scenario, i: int) -> Dict:
+    return {
+        "path": f"/path/{{{{project.slug}}}}/{i}",
+        "env": {"PROJECT": "{{project.name}}", "INDEX": str(i)},
+        "run": ["echo {{project.name}}"],
+        "commands": {
+            f"command{j}": {"run": f"make {j} {{{{command.name}}}}"}
+            for j in range(scenario.commands)
+        },
+    }
+
+
+def generate(root: Path, scenario: Scenario) -> Path:
+    """
+    Write a config for the scenario, returning its path
+    """
+    root.mkdir(parents=True)
+    data: Dict = {
+        "_common": {
+            "env": {f"COMMON_{i}": f"{{{{project.name}}}}_{i}" for i in range(10)},
+            "commands": {
+                f"common{i}": {"run": f"run {i} {{{{project.path}}}}"}
+                for i in range(scenario.common)
+            },
+        }
+    }
+    deferred_every = (
+        round(1 / scenario.deferred_ratio) if scenario.deferred_ratio else None
+    )
+    for i in range(scenario.projects):
+        project_data = get_project_data(scenario, i)
+        if deferred_every and i % deferred_every == 0:
+            deferred_dir = root / "deferred" / str(i)
+            deferred_dir.mkdir(parents=True)
+            del project_data["path"]
+            (deferred_dir / "workenv.yaml").write_text(loader.dump(project_data))
+            data[f"project{i}"] = {"config": str(deferred_dir)}
+        else:
+            data[f"project{i}"] = project_data
+
+    file = root / "workenv_config.yml"
+    file.write_text(loader.dump(data))
+    return file
+
+
+def measure(fn: Callable[[], None], repeat: int, setup=None) -> Dict[str, float]:
+    """
+    Time a function, returning the min and median of the repeats in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times)}
+
+
+class Benchmark:
+    """
+    Measurements for one scenario, in its own dir
+    """
+
+    def __init__(self, root: Path, scenario: Scenario, repeat: int):
+        self.root = root
+        self.scenario = scenario
+        self.repeat = repeat
+        self.file = generate(root / "config", scenario)
+        self.cache_dir = root / "cache"
+        os.environ["WORKENV_CACHE_DIR"] = str(self.cache_dir)
+
+    def clear_cache(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def run_process(self):
+        subprocess.run(
+            [sys.executable, "-c", "from workenv.cli import run; run()", "project1"],
+            env={**os.environ, "WORKENV_CONFIG_PATH": str(self.file)},
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+
+    def load(self):
+        Config(file=self.file)
+
+    def render(self):
+        config = Config(file=self.file)
+        count = min(RENDER_SAMPLE, self.scenario.projects)
+        for i in range(count):
+            project = config.projects[f"project{i}"]
+            list(project())
+            for name in project.get_command_names():
+                list(project.get_command(name)())
+
+    def complete(self, words: str):
+        os.environ["COMP_WORDS"] = words
+        os.environ["COMP_CWORD"] = str(len(words.split(" ")) - 1)
+        try:
+            get_completion_words(load_index(self.file))
+        finally:
+            del os.environ["COMP_WORDS"]
+            del os.environ["COMP_CWORD"]
+
+    def save(self):
+        config = Config(file=self.file)
+        config.projects.set_raw("added", {"path": "/path/added"})
+        config.projects["added"]
+        config.save()
+
+    def restore_config(self):
+        shutil.copy(self.file.with_suffix(".orig"), self.file)
+        load_index(self.file)
+
+    def run(self) -> Dict[str, Dict[str, float]]:
+        repeat = self.repeat
+        shutil.copy(self.file, self.file.with_suffix(".orig"))
+        results = {
+            "start_cold": measure(self.run_process, repeat, setup=self.clear_cache),
+            "start_warm": measure(self.run_process, repeat),
+            "load_cold": measure(self.load, repeat, setup=self.clear_cache),
+            "load_warm": measure(self.load, repeat),
+            "render": measure(self.render, repeat),
+        }
+        load_index(self.file)
+        results["complete_project"] = measure(
+            lambda: self.complete("we project1"), repeat
+        )
+        results["complete_command"] = measure(
+            lambda: self.complete("we project1 c"), repeat
+        )
+        results["save"] = measure(self.save, repeat, setup=self.restore_config)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Path to write JSON results")
+    options = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, scenario in enumerate(get_scenarios(options.sizes)):
+            print(scenario.name, file=sys.stderr)
+            benchmark = Benchmark(Path(tmp) / str(i), scenario, options.repeat)
+            metrics = benchmark.run()
+            for metric, times in metrics.items():
+                median = times["median"] * 1000
+                print(f"  {metric:>16}  {median:>10.2f}ms", file=sys.stderr)
+            results.append({"scenario": scenario._asdict(), "metrics": metrics})
+
+    report = {
+        "workenv": workenv.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "yaml_backend": loader.backend.name,
+        "time": time.time(),
+        "results": results,
+    }
+    raw = json.dumps(report, indent=2)
+    if options.output:
+        Path(options.output).write_text(raw + "\n")
+    else:
+        print(raw)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Shared fixtures
+"""
+
+import sys
+
+import pytest
+
+from workenv import bash
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(monkeypatch, tmp_path):
+    """
+    Keep the cache out of the user's home dir
+    """
+    path = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(path))
+    monkeypatch.delenv("WORKENV_CACHE_DIR", raising=False)
+    return path / "workenv"
+
+
+@pytest.fixture
+def script_path(monkeypatch, tmp_path):
+    """
+    Script which runs workenv and logs each call, for scripts from bash.py
+    """
+    path = tmp_path / "workenv"
+    path.write_text(
+        "#!/bin/sh\n"
+        f"echo called >> {tmp_path / 'calls.log'}\n"
+        f'exec {sys.executable} -c "from workenv.cli import run; run()" "$@"\n'
+    )
+    path.chmod(0o755)
+    monkeypatch.setattr(bash, "get_script_path", lambda: path)
+    return path
+
+
+@pytest.fixture
+def count_calls(script_path):
+    """
+    Return a function to count the calls to script_path
+    """
+    log = script_path.parent / "calls.log"
+
+    def count_calls():
+        if not log.exists():
+            return 0
+        return len(log.read_text().splitlines())
+
+    return count_calls
@@ -0,0 +1,90 @@
+"""
+Test workenv/actions.py
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from workenv import actions
+from workenv.config import Config
+
+config_sample = """
+one:
+  path: /path/1
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample)
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    monkeypatch.chdir(tmp_path)
+    return file
+
+
+def test_add__file_changed_since_load__changes_kept(config_file, capsys):
+    conf = Config(file=config_file)
+
+    # Another process adds a project after we loaded the config
+    other = Config(file=config_file)
+    actions.add(other, ["add"], ["two"])
+
+    actions.add(conf, ["add"], ["three"])
+    assert list(Config(file=config_file).projects) == ["one", "two", "three"]
+    assert capsys.readouterr().out == "Added project two\nAdded project three\n"
+
+
+def test_add__added_since_load__reported(config_file, capsys):
+    conf = Config(file=config_file)
+    actions.add(Config(file=config_file), ["add"], ["two"])
+    actions.add(conf, ["add"], ["two"])
+    assert capsys.readouterr().err == "Project two already exists\n"
+
+
+def test_add__command_to_deferred_project__error(config_file, capsys, tmp_path):
+    deferred_file = tmp_path / "deferred" / "workenv.yaml"
+    deferred_file.parent.mkdir()
+    deferred_file.write_text("run: ls\n")
+    config_file.write_text(config_sample + f"deferred:\n  config: {deferred_file}\n")
+    raw = config_file.read_text()
+
+    actions.add(Config(file=config_file), ["add"], ["deferred", "test"])
+    assert capsys.readouterr().err == (
+        f"Project deferred is defined in {deferred_file}, add the command there\n"
+    )
+    assert config_file.read_text() == raw
+    assert deferred_file.read_text() == "run: ls\n"
+
+
+def test_remove__missing__not_saved(config_file, capsys):
+    actions.remove(Config(file=config_file), ["remove"], ["missing"])
+    assert capsys.readouterr().err == "Project missing not found\n"
+    assert config_file.read_text() == config_sample
+
+
+def test_add__parallel_writers__no_lost_updates(config_file, tmp_path):
+    count = 16
+    env = {**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)}
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from workenv.cli import run; "
+                f"sys.argv = ['workenv', '--add', 'project{i}']; run()",
+            ],
+            cwd=tmp_path,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        for i in range(count)
+    ]
+    assert [process.wait() for process in processes] == [0] * count
+
+    names = set(Config(file=config_file).projects)
+    assert names == {"one"} | {f"project{i}" for i in range(count)}
@@ -0,0 +1,216 @@
+"""
+Test workenv/bash.py
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from workenv import bash
+from workenv.config import Config
+from workenv.index import load_index
+
+config_sample = """
+_config:
+  native_completion: true
+_common:
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /path/1
+  commands:
+    list:
+      run: ls
+"my project":
+  path: /path/2
+deferred:
+  config: %(deferred_path)s
+"""
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("commands:\n  test:\n    run: pytest\n")
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"deferred_path": deferred_dir})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    return file
+
+
+def complete_in_bash(config_file, *words_list):
+    """
+    Run the completion script in bash for each list of words
+    """
+    script = bash.get_completion_script(Config(file=config_file), "we")
+    for words in words_list:
+        quoted = " ".join(f"'{word}'" for word in words)
+        script += f"""
+COMP_WORDS=({quoted})
+COMP_CWORD={len(words) - 1}
+_we_completion
+printf '%s|' "${{COMPREPLY[@]}}"
+echo
+"""
+    result = subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    return [line.rstrip("|").split("|") for line in result.stdout.splitlines()]
+
+
+def test_write_include(config_file):
+    bash.write_include(load_index(config_file))
+    include = bash.get_include_path(config_file).read_text()
+    deferred_file = config_file.parent / "deferred" / "workenv.yaml"
+    lines = include.splitlines()
+    assert lines[0].startswith("# workenv completion ")
+    assert lines[1:] == [
+        f"_WORKENV_INCLUDE='{lines[0]}'",
+        f"_WORKENV_SOURCES=({config_file} {deferred_file})",
+        f"_WORKENV_MISSING=({config_file.parent / 'workenv_config.d'})",
+        "_WORKENV_PROJECTS=(deferred 'my project' project)",
+        "declare -gA _WORKENV_COMMANDS=(",
+        "    [project]='list",
+        "open'",
+        "    ['my project']=open",
+        "    [deferred]='open",
+        "test'",
+        ")",
+    ]
+
+
+@requires_bash
+def test_native_completion__python_called_once(config_file, count_calls):
+    results = complete_in_bash(
+        config_file,
+        ["we", ""],
+        ["we", "m"],
+        ["we", "project", ""],
+        ["we", "deferred", "t"],
+        ["we", "missing", ""],
+    )
+    assert results == [
+        ["deferred", "my project", "project"],
+        ["my project"],
+        ["list", "open"],
+        ["test"],
+        [""],
+    ]
+    assert count_calls() == 1
+
+
+@requires_bash
+def test_native_completion__source_changed__include_rebuilt(config_file, count_calls):
+    assert complete_in_bash(config_file, ["we", "deferred", ""]) == [["open", "test"]]
+
+    deferred_file = config_file.parent / "deferred" / "workenv.yaml"
+    deferred_file.write_text("commands:\n  build:\n    run: make\n")
+
+    # Make sure the include is older, regardless of filesystem timestamp resolution
+    include_path = bash.get_include_path(config_file)
+    mtime = deferred_file.stat().st_mtime - 10
+    os.utime(include_path, (mtime, mtime))
+
+    assert complete_in_bash(config_file, ["we", "deferred", ""]) == [["build", "open"]]
+    assert count_calls() == 2
+    assert complete_in_bash(config_file, ["we", "deferred", ""]) == [["build", "open"]]
+    assert count_calls() == 2
+
+
+multiline_sample = """
+_config:
+  verbose: true
+  history: true
+project:
+  path: %(tmp_path)s
+  run: |-
+    if true; then
+      echo "it's one block"
+    fi
+"""
+
+
+@requires_bash
+def test_run__multiline_command__evaluated_once(tmp_path, monkeypatch, count_calls):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(multiline_sample % {"tmp_path": tmp_path})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    script = bash.get_completion_script(Config(file=file), "we")
+    script += "\nset -o history\nwe project\nhistory\n"
+    result = subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    lines = result.stdout.splitlines()
+    assert lines[:5] == [
+        f"$ cd {tmp_path}",
+        "$ if true; then",
+        '  echo "it\'s one block"',
+        "fi",
+        "it's one block",
+    ]
+    assert lines[5].split(maxsplit=1)[1] == f"cd {tmp_path}"
+    assert lines[6].split(maxsplit=1)[1] == "if true; then"
+    assert count_calls() == 1
+
+
+@requires_bash
+def test_old_bash__line_protocol(tmp_path, monkeypatch, count_calls):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(
+        "_config:\n  verbose: true\n  native_completion: true\n"
+        f'project:\n  path: {tmp_path}\n  run: echo "it\'s $PWD"\n'
+    )
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    script = bash.get_completion_script(Config(file=file), "we")
+
+    # Bash before 4.4 can't read NUL records, or use the native completion include
+    script = script.replace(bash.BASH_RECORDS_TEST, "false")
+    script += """
+we project
+COMP_WORDS=(we pro)
+COMP_CWORD=1
+_we_completion
+echo "${COMPREPLY[@]}"
+"""
+    result = subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    assert result.stdout.splitlines() == [
+        f"$ cd {tmp_path}",
+        '$ echo "it\'s $PWD"',
+        f"it's {tmp_path}",
+        "project",
+    ]
+    assert count_calls() == 2
+
+
+@requires_bash
+def test_native_completion__fuzzy__python_fallback(config_file, count_calls):
+    config_file.write_text(
+        config_sample.replace("_config:\n", "_config:\n  fuzzy_completion: true\n")
+        % {"deferred_path": config_file.parent / "deferred"}
+    )
+    results = complete_in_bash(config_file, ["we", "my-pr"], ["we", "m"])
+    assert results == [["my project"], ["my project"]]
+
+    # Called once to build the include, and once for the fuzzy match
+    assert count_calls() == 2
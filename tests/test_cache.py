@@ -0,0 +1,132 @@
+"""
+Test workenv/cache.py snapshots
+"""
+
+import os
+
+import pytest
+
+from workenv import loader
+from workenv.cache import get_cache_path, load_yaml, read_cache, write_cache
+from workenv.config import Config
+
+config_sample = """
+_config:
+  verbose: true
+_common:
+  env:
+    COMMON: value_common_{{project.name}}
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /path/1
+  source: venv/bin/activate
+  env:
+    PROJECT: value_project_{{project.slug}}
+  run: pwd
+  commands:
+    list:
+      run: ls
+deferred:
+  config: %(deferred_path)s
+"""
+
+deferred_sample = """
+env:
+  DEFERRED: "{{project.name}}"
+commands:
+  test:
+    run: pytest
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text(deferred_sample)
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"deferred_path": deferred_dir})
+    return file
+
+
+def get_state(config):
+    """
+    Render everything a config can output
+    """
+    state = {"yaml": config.to_yaml(), "verbose": config.verbose}
+    for name, project in config.projects.items():
+        state[name] = list(project())
+        for command_name in project.get_command_names():
+            command = project.commands[command_name].clone_to(project)
+            state[f"{name}.{command_name}"] = list(command())
+    return state
+
+
+def fail_parse(*args, **kwargs):
+    raise AssertionError("yaml parsed")
+
+
+def test_snapshot__matches_fresh_load(config_file, cache_dir, monkeypatch):
+    fresh = get_state(Config(file=config_file))
+    assert (cache_dir / "snapshots").is_dir()
+
+    monkeypatch.setattr(loader, "load", fail_parse)
+    snapshot = get_state(Config(file=config_file))
+    assert snapshot == fresh
+    assert snapshot["deferred.test"] == [
+        "cd " + str(config_file.parent / "deferred"),
+        "export COMMON=value_common_deferred",
+        "export DEFERRED=deferred",
+        "pytest",
+    ]
+
+
+def test_snapshot__main_file_changed__rebuilt(config_file):
+    Config(file=config_file)
+    config_file.write_text("other:\n  path: /path/2\n")
+
+    config = Config(file=config_file)
+    assert config.get_project_names() == ["other"]
+
+
+def test_snapshot__deferred_file_changed__rebuilt(config_file):
+    get_state(Config(file=config_file))
+    deferred_file = config_file.parent / "deferred" / "workenv.yaml"
+    deferred_file.write_text("run: make\n")
+
+    config = Config(file=config_file)
+    assert config.projects["deferred"].get_command_names() == ["open"]
+    assert list(config.projects["deferred"]())[-1] == "make"
+
+
+def test_snapshot__same_size_and_mtime__inode_change_rebuilt(tmp_path):
+    file = tmp_path / "data.yml"
+    file.write_text("a: 1\n")
+    stat = file.stat()
+    assert load_yaml(file) == {"a": 1}
+
+    replacement = tmp_path / "replacement.yml"
+    replacement.write_text("a: 2\n")
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, file)
+    assert load_yaml(file) == {"a": 2}
+
+
+def test_snapshot__corrupt__rebuilt(tmp_path):
+    file = tmp_path / "data.yml"
+    file.write_text("a: 1\n")
+    assert load_yaml(file) == {"a": 1}
+
+    get_cache_path("snapshots", file).write_bytes(b"corrupt")
+    assert load_yaml(file) == {"a": 1}
+
+
+def test_read_cache__other_version__missing(tmp_path):
+    path = tmp_path / "data.cache"
+    write_cache(path, 2, {"a": 1})
+    assert read_cache(path, 2) == {"a": 1}
+    assert read_cache(path, 1) is None
+    assert read_cache(tmp_path / "missing.cache", 2) is None
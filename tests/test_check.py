@@ -0,0 +1,88 @@
+"""
+Test workenv/check.py
+"""
+
+import sys
+
+import pytest
+
+from workenv.check import check_config
+from workenv.cli import run
+from workenv.config import Config
+
+config_sample = """
+_common:
+  source: ~/.common-missing
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: %(tmp_path)s/project
+  source: venv/bin/activate
+  commands:
+    elsewhere:
+      path: %(tmp_path)s/elsewhere
+deferred:
+  config: %(tmp_path)s/deferred
+broken:
+  config: %(tmp_path)s/broken
+file:
+  path: %(tmp_path)s/project/venv/bin/activate
+ok:
+  path: "%(tmp_path)s/{{project.name}}"
+  source: ../project/venv/bin/activate
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / ".common-missing").write_text("")
+    activate = tmp_path / "project" / "venv" / "bin" / "activate"
+    activate.parent.mkdir(parents=True)
+    activate.write_text("")
+    (tmp_path / "ok").mkdir()
+
+    (tmp_path / "deferred").mkdir()
+    (tmp_path / "deferred" / "workenv.yaml").write_text("source: $HOME/.missing\n")
+    (tmp_path / "broken").mkdir()
+    (tmp_path / "broken" / "workenv.yaml").write_text("commands: [invalid]\n")
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"tmp_path": tmp_path})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    return file
+
+
+def test_check_config__errors_reported(config_file, tmp_path):
+    reports = check_config(Config(file=config_file), max_workers=4)
+    assert [report.name for report in reports] == [
+        "project",
+        "deferred",
+        "broken",
+        "file",
+        "ok",
+    ]
+    assert {report.name: report.errors for report in reports} == {
+        "project": [f"Command elsewhere path {tmp_path}/elsewhere not found"],
+        "deferred": [f"Source {tmp_path}/.missing not found"],
+        "broken": [
+            "Could not load project: Unexpected commands in broken - expected dict,"
+            " but found list"
+        ],
+        "file": [f"Path {tmp_path}/project/venv/bin/activate is not a directory"],
+        "ok": [],
+    }
+    assert all(report.seconds >= 0 for report in reports)
+
+
+def test_check_action__failed__exit_code(capsys, monkeypatch, config_file):
+    monkeypatch.setattr(sys, "argv", ["workenv", "--check"])
+    with pytest.raises(SystemExit) as exc_info:
+        run()
+    assert exc_info.value.code == 1
+    captured = capsys.readouterr()
+    lines = captured.out.splitlines()
+    assert lines[0].startswith("ok: ok (")
+    assert lines[1] == "Checked 5 projects, 4 with errors"
+    assert "broken: failed (" in captured.err
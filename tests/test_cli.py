@@ -7,6 +7,7 @@ import sys
 import pytest
 
 from workenv.cli import run
+from workenv.config import Config
 
 config_sample = """
 _common:
@@ -92,6 +93,82 @@ def test_run_project_command(capsys, monkeypatch, config_file):
     )
 
 
+def test_run_project__protocol_2__records(capsys, monkeypatch, config_file):
+    config_file.write_text(config_sample)
+    monkeypatch.setattr(sys, "argv", ["workenv", "project", "list"])
+    monkeypatch.setenv("_WORKENV_PROTOCOL", "2")
+    run()
+    captured = capsys.readouterr()
+    assert captured.out == (
+        "workenv:2\0"
+        "cd /path/1\0"
+        "export COMMON=value_common_project\0"
+        "export PROJECT=value_project_project\0"
+        "ls\0"
+    )
+
+
+current_sample = """
+_common:
+  commands:
+    open:
+      run: xdg-open .
+outer:
+  path: %(tmp_path)s/src
+inner:
+  path: "%(tmp_path)s/src/{{project.slug}}"
+  run: echo inner
+deferred:
+  config: %(tmp_path)s/src/inner/deferred
+unknown:
+  path: $UNSET_PATH/src
+"""
+
+
+@pytest.fixture
+def current_config(config_file, tmp_path):
+    (tmp_path / "src/inner/deferred/sub").mkdir(parents=True)
+    (tmp_path / "src/inner/deferred/workenv.yaml").write_text("run: echo deferred\n")
+    config_file.write_text(current_sample % {"tmp_path": tmp_path})
+    return config_file
+
+
+@pytest.mark.parametrize(
+    "cwd,expected",
+    [
+        ("src", "outer"),
+        ("src/inner", "inner"),
+        ("src/inner/deferred/sub", "deferred"),
+        (".", None),
+    ],
+)
+def test_current(capsys, monkeypatch, current_config, tmp_path, cwd, expected):
+    monkeypatch.chdir(tmp_path / cwd)
+    monkeypatch.setattr(sys, "argv", ["workenv", "--current"])
+    if expected is None:
+        with pytest.raises(SystemExit) as e:
+            run()
+        assert e.value.code == 1
+        assert capsys.readouterr().out == ""
+    else:
+        run()
+        assert capsys.readouterr().out == f"{expected}\n"
+
+
+def test_run_current_project(capsys, monkeypatch, current_config, tmp_path):
+    monkeypatch.chdir(tmp_path / "src/inner")
+    monkeypatch.setattr(sys, "argv", ["workenv", ".", "open"])
+    run()
+    assert capsys.readouterr().out == f"cd {tmp_path}/src/inner\nxdg-open .\n"
+
+
+def test_run_current_project__not_found(capsys, monkeypatch, current_config, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["workenv", "."])
+    run()
+    assert capsys.readouterr().err == "No project found for the current dir\n"
+
+
 # TODO:
 def test_add_no_arguments():
     """
@@ -104,3 +181,90 @@ def test_add_no_arguments():
         project_name, command_name = (args + [None])[0:2]
     ValueError: not enough values to unpack (expected 2, got 1)
     """
+
+
+@pytest.fixture
+def complete(monkeypatch, capsys):
+    def complete(words, cword):
+        monkeypatch.setenv("_WORKENV_COMPLETE", "complete")
+        monkeypatch.setenv("COMP_WORDS", words)
+        monkeypatch.setenv("COMP_CWORD", str(cword))
+        monkeypatch.setattr(sys, "argv", ["workenv"])
+        run()
+        return capsys.readouterr().out.splitlines()
+
+    return complete
+
+
+@pytest.fixture
+def deferred_config(config_file, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("commands:\n  test:\n    run: pytest\n")
+    config_file.write_text(config_sample + f"deferred:\n  config: {deferred_dir}\n")
+    return deferred_dir / "workenv.yaml"
+
+
+def test_complete_project(complete, deferred_config):
+    assert complete("we ", 1) == ["deferred", "project"]
+    assert complete("we d", 1) == ["deferred"]
+
+
+def test_complete_command(complete, deferred_config):
+    assert complete("we project ", 2) == ["list", "open"]
+    assert complete("we deferred t", 2) == ["test"]
+    assert complete("we missing ", 2) == []
+
+
+def test_complete__fuzzy(complete, config_file):
+    config_file.write_text(
+        "_config:\n  fuzzy_completion: true\n"
+        "company-api-gateway:\n  path: /path/1\n"
+        "api-gateway-legacy:\n  path: /path/2\n"
+        "  commands:\n    run-tests:\n      run: pytest\n"
+    )
+    assert complete("we api-gw", 1) == ["api-gateway-legacy", "company-api-gateway"]
+    assert complete("we api", 1) == ["api-gateway-legacy"]
+    assert complete("we api-gateway-legacy r-t", 2) == ["run-tests"]
+
+    # Read from the cached word index
+    assert complete("we co-gw", 1) == ["company-api-gateway"]
+
+
+def test_complete__fuzzy_disabled__prefix_only(complete, config_file):
+    config_file.write_text("company-api-gateway:\n  path: /path/1\n")
+    assert complete("we api-gw", 1) == []
+
+
+def test_complete__index_used__config_not_loaded(
+    complete, deferred_config, monkeypatch
+):
+    assert complete("we deferred ", 2) == ["open", "test"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("config loaded")
+
+    monkeypatch.setattr(Config, "load", fail)
+    assert complete("we deferred ", 2) == ["open", "test"]
+
+
+def test_complete__deferred_file_changed__index_rebuilt(complete, deferred_config):
+    assert complete("we deferred ", 2) == ["open", "test"]
+    deferred_config.write_text("commands:\n  build:\n    run: make\n")
+    assert complete("we deferred ", 2) == ["build", "open"]
+
+
+def test_complete__config_saved__index_refreshed(
+    complete, config_file, deferred_config, monkeypatch
+):
+    assert complete("we ", 1) == ["deferred", "project"]
+
+    config = Config(file=config_file)
+    del config.projects["project"]
+    config.save()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("config loaded")
+
+    monkeypatch.setattr(Config, "load", fail)
+    assert complete("we ", 1) == ["deferred"]
@@ -0,0 +1,161 @@
+"""
+Test workenv/compiler.py
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from workenv import bash
+from workenv.compiler import get_compiled_path, get_entries, write_compiled
+from workenv.config import Config
+
+config_sample = """
+_config:
+  verbose: true
+_common:
+  env:
+    COMMON: "{{project.name}}"
+  commands:
+    open:
+      run: echo open {{project.name}}
+project:
+  path: %(tmp_path)s
+  run: echo "it's project"
+deferred:
+  config: %(tmp_path)s/deferred
+broken:
+  config: %(tmp_path)s/missing
+"""
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("run: echo deferred v1\n")
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"tmp_path": tmp_path})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    return file
+
+
+def run_in_bash(config_file, *commands):
+    script = bash.get_completion_script(Config(file=config_file), "we")
+    script += "\n" + "\n".join(commands)
+    result = subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    return result.stdout.splitlines(), result.stderr.splitlines()
+
+
+def test_get_entries__all_projects_and_commands(config_file, tmp_path):
+    entries = get_entries(Config(file=config_file))
+    assert entries == [
+        (
+            "project",
+            [f"cd {tmp_path}", "export COMMON=project", 'echo "it\'s project"'],
+        ),
+        (
+            "project\topen",
+            [f"cd {tmp_path}", "export COMMON=project", "echo open project"],
+        ),
+        (
+            "deferred",
+            [f"cd {tmp_path}/deferred", "export COMMON=deferred", "echo deferred v1"],
+        ),
+        (
+            "deferred\topen",
+            [f"cd {tmp_path}/deferred", "export COMMON=deferred", "echo open deferred"],
+        ),
+    ]
+
+
+def test_write_compiled__sources_recorded(config_file, tmp_path):
+    path = write_compiled(Config(file=config_file))
+    assert path == get_compiled_path(config_file)
+    raw = path.read_text()
+    assert (
+        f"_WORKENV_COMPILED_SOURCES=({config_file} {tmp_path}/deferred/workenv.yaml)"
+    ) in raw
+    fragments_dir = tmp_path / "workenv_config.d"
+    assert f"_WORKENV_COMPILED_MISSING=({fragments_dir} {tmp_path}/missing)" in raw
+
+
+@requires_bash
+def test_compiled__python_not_called(config_file, count_calls, tmp_path):
+    write_compiled(Config(file=config_file))
+    out, err = run_in_bash(
+        config_file,
+        "we project",
+        'echo "pwd=$PWD COMMON=$COMMON"',
+        "we project open",
+        "we deferred",
+    )
+    assert out == [
+        f"$ cd {tmp_path}",
+        "$ export COMMON=project",
+        '$ echo "it\'s project"',
+        "it's project",
+        f"pwd={tmp_path} COMMON=project",
+        f"$ cd {tmp_path}",
+        "$ export COMMON=project",
+        "$ echo open project",
+        "open project",
+        f"$ cd {tmp_path}/deferred",
+        "$ export COMMON=deferred",
+        "$ echo deferred v1",
+        "deferred v1",
+    ]
+    assert count_calls() == 0
+
+
+@requires_bash
+def test_compiled__unknown__falls_back(config_file, count_calls):
+    write_compiled(Config(file=config_file))
+    out, err = run_in_bash(config_file, "we missing", "we broken")
+    assert err[0] == "Unknown project missing"
+    assert count_calls() == 2
+
+
+@requires_bash
+def test_compiled__stale__recompiled(config_file, count_calls):
+    path = write_compiled(Config(file=config_file))
+    deferred_file = config_file.parent / "deferred" / "workenv.yaml"
+    deferred_file.write_text("run: echo deferred v2\n")
+    mtime = deferred_file.stat().st_mtime - 10
+    os.utime(path, (mtime, mtime))
+
+    out, err = run_in_bash(config_file, "we deferred", "we deferred")
+    assert out[-1] == "deferred v2"
+    assert out.count("deferred v2") == 2
+    assert count_calls() == 1
+
+
+@requires_bash
+def test_compiled__history__recorded_as_written(config_file, count_calls, tmp_path):
+    config_file.write_text(
+        config_file.read_text().replace("verbose: true", "history: true")
+        + "globbed:\n  run: ls *.pyc\n"
+    )
+    # The shell function only splits on newlines, but the whole command can match a glob
+    (tmp_path / "ls a.pyc").write_text("")
+    write_compiled(Config(file=config_file))
+    out, err = run_in_bash(
+        config_file, f"cd {tmp_path}", "set -o history", "we globbed", "history"
+    )
+    assert [line.split(maxsplit=1)[1] for line in out[1:]] == [
+        "export COMMON=globbed",
+        "ls *.pyc",
+        "history",
+    ]
+    assert count_calls() == 0
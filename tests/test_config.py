@@ -2,9 +2,14 @@
 Test workenv/config.py from_dict
 """
 
+import shutil
+import subprocess
+import time
 from pathlib import Path
 
-from workenv.config import Command, Config, Project, var_pattern
+import pytest
+
+from workenv.config import Command, Config, ConfigError, Project, var_pattern
 
 
 def test_project_attributes__parsed_to_project():
@@ -173,6 +178,139 @@ project:
     assert conf.projects["project"].run == ["/path/1/run/1", "/path/2/run/1"]
 
 
+parallel_sample = """
+project:
+  path: /path/1
+  run:
+  - echo start
+  - parallel:
+    - npm run watch
+    - - ./manage.py migrate
+      - ./manage.py runserver
+  - parallel:
+    - tail -f {{project.path}}/log
+    wait: false
+"""
+
+
+def test_parallel_run__rendered_as_background_jobs():
+    conf = Config()
+    conf.loads(parallel_sample)
+    assert list(conf.projects["project"]()) == [
+        "cd /path/1",
+        "echo start",
+        (
+            "( pids=(); { eval 'npm run watch'; } & pids+=($!);"
+            " { eval './manage.py migrate'; eval './manage.py runserver'; }"
+            " & pids+=($!);"
+            ' status=0; for pid in "${pids[@]}"; do wait "$pid" || status=$?; done;'
+            " exit $status )"
+        ),
+        "{ eval 'tail -f /path/1/log'; } &",
+    ]
+
+
+def test_parallel_run__to_dict__round_trips():
+    conf = Config()
+    conf.loads(parallel_sample)
+    data = conf.projects["project"].to_dict()
+    assert data["run"][1] == {
+        "parallel": [
+            "npm run watch",
+            ["./manage.py migrate", "./manage.py runserver"],
+        ]
+    }
+
+    clone = Config()
+    clone.loads(conf.to_yaml())
+    assert clone.projects["project"].to_dict() == data
+
+
+def test_parallel_run__single_group():
+    conf = Config()
+    conf.loads(
+        """
+project:
+  run:
+    parallel: [a, b]
+        """
+    )
+    assert conf.projects["project"].run == [{"parallel": ["a", "b"]}]
+
+
+@pytest.mark.parametrize(
+    "run",
+    ["{parallel: ls}", "{parallel: [ls], then: ls}", "{parallel: [ls], wait: 1}"],
+)
+def test_parallel_run__invalid_group__raises(run):
+    conf = Config()
+    conf.loads(f"invalid:\n  run:\n  - {run}\n")
+    with pytest.raises(ConfigError, match="Unexpected run step in invalid"):
+        conf.projects["invalid"]
+
+
+def test_parallel_run__invalid_job__raises():
+    conf = Config()
+    conf.loads("invalid:\n  run:\n  - parallel: [[ls, {a: b}]]\n")
+    with pytest.raises(ConfigError, match="Unexpected parallel job in invalid"):
+        conf.projects["invalid"]
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+def test_parallel_run__bash__jobs_overlap_and_failure_returned():
+    conf = Config()
+    conf.loads(
+        """
+project:
+  run:
+    parallel:
+    - sleep 0.5
+    - [sleep 0.5, "false"]
+    - sleep 0.5
+        """
+    )
+    script = "\n".join(conf.projects["project"]())
+    start = time.monotonic()
+
+    # The shell function splits on newlines only
+    result = subprocess.run(
+        ["bash", "-c", f"IFS=$'\\n'\n{script}\necho status=$?"],
+        stdout=subprocess.PIPE,
+    )
+    assert time.monotonic() - start < 1.4
+    assert result.stdout == b"status=1\n"
+
+
+@pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+def test_parallel_run__bash__comment_and_heredoc():
+    conf = Config()
+    conf.loads(
+        """
+project:
+  run:
+    parallel:
+    - ["echo first # comment", echo second]
+    - |-
+      cat <<EOF
+      third
+      EOF
+        """
+    )
+    script = "\n".join(conf.projects["project"]())
+    result = subprocess.run(
+        ["bash", "-c", f"{script}\necho status=$?"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.stderr == ""
+    assert sorted(result.stdout.splitlines()) == [
+        "first",
+        "second",
+        "status=0",
+        "third",
+    ]
+
+
 def test_common_command__project_includes_common_command():
     conf = Config()
     conf.loads(
@@ -269,3 +407,151 @@ project:
         "export key1=value1_project",
         "export key2=value2_project",
     ]
+
+
+def test_projects__lazy__only_accessed_project_built(monkeypatch):
+    built = []
+    from_dict = Project.from_dict.__func__
+
+    def tracking_from_dict(cls, config, name, data, parent=None):
+        built.append(name)
+        return from_dict(cls, config, name, data, parent)
+
+    monkeypatch.setattr(Project, "from_dict", classmethod(tracking_from_dict))
+    conf = Config()
+    conf.loads(
+        """
+one:
+  path: /path/1
+two:
+  path: /path/2
+three:
+  commands:
+    command: not a dict
+        """
+    )
+    assert built == []
+    assert conf.get_project_names() == ["one", "two", "three"]
+    assert "two" in conf.projects
+    assert built == []
+
+    assert conf.projects["two"].path == Path("/path/2")
+    assert built == ["two"]
+    assert conf.projects["two"] is conf.projects["two"]
+    assert built == ["two"]
+
+
+def test_projects__lazy__invalid_project_raises_on_access():
+    conf = Config()
+    conf.loads(
+        """
+valid:
+  path: /path/1
+invalid:
+  commands: not a dict
+        """
+    )
+    assert conf.projects["valid"].path == Path("/path/1")
+    with pytest.raises(ConfigError, match="Unexpected commands in invalid"):
+        conf.projects["invalid"]
+
+    # Still raises the config error when accessed again
+    with pytest.raises(ConfigError, match="Unexpected commands in invalid"):
+        conf.projects["invalid"]
+
+
+def test_projects__lazy__add_remove_save(tmp_path):
+    file = tmp_path / "config.yml"
+    file.write_text(
+        """
+one:
+  path: /path/1
+two:
+  run: ls
+        """
+    )
+    conf = Config(file=file)
+    conf.projects["three"] = Project(
+        config=conf,
+        name="three",
+        path=Path("/path/3"),
+        source=[],
+        env={},
+        run=[],
+        parent=None,
+    )
+    del conf.projects["one"]
+    assert list(conf.projects) == ["two", "three"]
+    assert len(conf.projects) == 2
+
+    conf.save()
+    # Only the changed projects are written
+    assert file.read_text() == "\ntwo:\n  run: ls\n        \nthree:\n  path: /path/3\n"
+
+
+def test_resolved__cached_until_config_changes():
+    conf = Config()
+    conf.loads(
+        """
+_common:
+  source: /path/1/src/1
+  env:
+    key1: value1
+project:
+  source: /path/2/src/1
+  run: ls
+        """
+    )
+    project = conf.projects["project"]
+    for attr in ["source", "env", "run", "commands"]:
+        assert getattr(project, attr) is getattr(project, attr)
+
+    source = project.source
+    conf.loads(
+        """
+_common:
+  source: /path/3/src/1
+        """
+    )
+    assert project.source is not source
+    assert project.source == ["/path/3/src/1", "/path/2/src/1"]
+
+
+def test_resolved__building_project__cache_kept(tmp_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(
+        "alpha:\n  source: /path/1/src/1\n"
+        "beta:\n  commands:\n    test:\n      run: pytest\n"
+    )
+    conf = Config(file=file)
+    source = conf.projects["alpha"].source
+    conf.projects["beta"]
+
+    # Finding changes builds the saved projects to compare
+    assert conf.get_changes() == {}
+    assert conf.projects["alpha"].source is source
+
+
+def test_resolved__add_command__commands_updated():
+    conf = Config()
+    conf.loads(
+        """
+_common:
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /path/1
+        """
+    )
+    project = conf.projects["project"]
+    assert project.get_command_names() == ["open"]
+
+    command = Command.from_dict(conf, "list", {"run": "ls"}, parent=project)
+    project.add_command("list", command)
+    assert project.get_command_names() == ["open", "list"]
+
+    conf.common_project.add_command(
+        "close", Command.from_dict(conf, "close", {}, parent=conf.common_project)
+    )
+    assert project.get_command_names() == ["open", "close", "list"]
@@ -0,0 +1,97 @@
+"""
+Test workenv/discover.py
+"""
+
+import os
+
+import pytest
+
+from workenv import actions, discover
+from workenv.config import Config, DeferredProject
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text("existing:\n  path: /path/existing\n")
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    monkeypatch.chdir(tmp_path)
+    return file
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "src"
+    for path in [
+        "one",
+        "group/two",
+        "group/two/nested",
+        "other/existing",
+        "one/node_modules/dep",
+        "one/.git/hooks",
+        "group/env/lib",
+    ]:
+        (root / path).mkdir(parents=True)
+        (root / path / "workenv.yaml").write_text("run: ls\n")
+    (root / "group/env/pyvenv.cfg").write_text("home = /usr/bin\n")
+    (root / "empty").mkdir()
+    return root
+
+
+@pytest.fixture
+def count_scans(monkeypatch):
+    scanned = []
+    scandir = os.scandir
+
+    def count(path):
+        scanned.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(discover.os, "scandir", count)
+    return scanned
+
+
+def test_find_project_dirs(root):
+    assert discover.find_project_dirs([str(root)]) == [
+        f"{root}/group/two",
+        f"{root}/group/two/nested",
+        f"{root}/one",
+        f"{root}/other/existing",
+    ]
+
+
+def test_find_project_dirs__unchanged__listings_cached(root, count_scans):
+    discover.find_project_dirs([str(root)])
+    count_scans.clear()
+
+    (root / "group" / "three").mkdir()
+    (root / "group" / "three" / "workenv.yaml").write_text("run: ls\n")
+    assert f"{root}/group/three" in discover.find_project_dirs([str(root)])
+    assert sorted(count_scans) == [f"{root}/group", f"{root}/group/three"]
+
+
+def test_discover__projects_added(config_file, root, capsys):
+    actions.discover(Config(file=config_file), ["discover"], [str(root)])
+    assert capsys.readouterr().out == (
+        "Added project two\n"
+        "Added project nested\n"
+        "Added project one\n"
+        "Added project other/existing\n"
+        "Found 4 projects, added 4\n"
+    )
+
+    config = Config(file=config_file)
+    assert list(config.projects) == [
+        "existing",
+        "two",
+        "nested",
+        "one",
+        "other/existing",
+    ]
+    project = config.projects["other/existing"]
+    assert isinstance(project, DeferredProject)
+    assert list(project()) == [f"cd {root}/other/existing", "ls"]
+
+    # Re-run finds the same projects, and adds nothing
+    actions.discover(Config(file=config_file), ["discover"], [str(root)])
+    assert capsys.readouterr().out == "Found 4 projects, added 0\n"
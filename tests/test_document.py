@@ -0,0 +1,202 @@
+"""
+Test workenv/document.py and incremental saves
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from workenv import document
+from workenv.config import Command, Config, Project
+from workenv.index import NameIndex
+
+config_sample = """# My projects
+_config:
+  verbose: true
+
+# First project
+one:
+  path: /path/1  # keep me
+  commands:
+    test:
+      run: pytest
+
+two:
+  path: /path/2
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    file = tmp_path / "config.yml"
+    file.write_text(config_sample)
+    return file
+
+
+def make_project(conf, name, path):
+    return Project(
+        config=conf,
+        name=name,
+        path=Path(path),
+        source=[],
+        env={},
+        run=[],
+        parent=None,
+    )
+
+
+def test_split_blocks():
+    lines, blocks = document.split_blocks(config_sample)
+    assert blocks == [(1, 3, 5), (5, 10, 11), (11, 13, 13)]
+    assert lines[5] == "one:\n"
+
+
+def test_split_blocks__multiple_documents__refused():
+    assert document.split_blocks("one:\n  path: /1\n---\ntwo:\n  path: /2\n") is None
+
+
+def test_splice__replace_remove_add():
+    raw, names = document.splice(
+        config_sample,
+        ["_config", "one", "two"],
+        {
+            "one": None,
+            "two": "two:\n  path: /path/new\n",
+            "three": "three:\n  path: /path/3\n",
+            "_common": "_common:\n  run: ls\n",
+        },
+    )
+    assert raw == (
+        "# My projects\n"
+        "_common:\n"
+        "  run: ls\n"
+        "_config:\n"
+        "  verbose: true\n"
+        "\n"
+        "# First project\n"
+        "\n"
+        "two:\n"
+        "  path: /path/new\n"
+        "three:\n"
+        "  path: /path/3\n"
+    )
+    assert names == ["_common", "_config", "two", "three"]
+
+
+def test_splice__names_mismatch__refused():
+    assert document.splice(config_sample, ["_config", "one"], {"one": None}) is None
+    assert (
+        document.splice(config_sample, ["_config", "two", "one"], {"one": None}) is None
+    )
+
+
+def test_splice__anchor_in_changed_block__refused():
+    raw = "one: &base\n  path: /1\ntwo:\n  <<: *base\n"
+    assert document.splice(raw, ["one", "two"], {"one": None}) is None
+    assert document.splice(raw, ["one", "two"], {"two": None}) == (
+        "one: &base\n  path: /1\n",
+        ["one"],
+    )
+
+
+def test_write_atomic__mode_kept_and_no_tmp_left(tmp_path):
+    file = tmp_path / "config.yml"
+    file.write_text("old")
+    file.chmod(0o600)
+    document.write_atomic(file, "new")
+    assert file.read_text() == "new"
+    assert file.stat().st_mode & 0o777 == 0o600
+    assert os.listdir(tmp_path) == ["config.yml"]
+
+
+def test_write_atomic__symlink_followed(tmp_path):
+    target = tmp_path / "target.yml"
+    target.write_text("old")
+    link = tmp_path / "config.yml"
+    link.symlink_to(target)
+    document.write_atomic(link, "new")
+    assert link.is_symlink()
+    assert target.read_text() == "new"
+
+
+def test_save__add_command__only_project_rewritten(config_file):
+    conf = Config(file=config_file)
+    project = conf.projects["two"]
+    project.add_command(
+        "build",
+        Command(
+            config=conf,
+            name="build",
+            path=None,
+            source=[],
+            env={},
+            run=["make"],
+            parent=project,
+        ),
+    )
+    conf.save()
+    assert config_file.read_text() == config_sample.replace(
+        "two:\n  path: /path/2\n",
+        "two:\n  commands:\n    build:\n      run:\n      - make\n  path: /path/2\n",
+    )
+
+
+def test_save__repeated__spliced_each_time(config_file):
+    conf = Config(file=config_file)
+    conf.projects["three"] = make_project(conf, "three", "/path/3")
+    conf.save()
+    del conf.projects["one"]
+    conf.save()
+    assert config_file.read_text() == (
+        "# My projects\n"
+        "_config:\n"
+        "  verbose: true\n"
+        "\n"
+        "# First project\n"
+        "\n"
+        "two:\n"
+        "  path: /path/2\n"
+        "three:\n"
+        "  path: /path/3\n"
+    )
+    assert list(Config(file=config_file).projects) == ["two", "three"]
+
+
+def test_save__file_changed__whole_config_written(config_file):
+    conf = Config(file=config_file)
+    config_file.write_text(config_sample + "# changed\n")
+    conf.projects["three"] = make_project(conf, "three", "/path/3")
+    conf.save()
+    raw = config_file.read_text()
+    assert "# My projects" not in raw
+    assert list(Config(file=config_file).projects) == ["one", "three", "two"]
+
+
+def test_save__index_current__only_changed_projects_loaded(config_file, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("commands:\n  test:\n    run: ls\n")
+    config_file.write_text(config_sample + f"deferred:\n  config: {deferred_dir}\n")
+    NameIndex.from_config(Config(file=config_file)).write()
+
+    conf = Config(file=config_file)
+    conf.projects["three"] = make_project(conf, "three", "/path/3")
+    conf.save()
+
+    assert [project.name for project in conf.projects.built()] == ["three"]
+    index = NameIndex.read(config_file)
+    assert index.is_current()
+    assert index.projects == {
+        "one": ["test"],
+        "two": [],
+        "deferred": ["test"],
+        "three": [],
+    }
+
+
+def test_locked__missing_dir__lock_in_cache_dir(tmp_path, cache_dir):
+    path = tmp_path / "missing" / ".workenv_config.yml"
+    with document.locked(path):
+        assert not path.parent.exists()
+    assert [lock.suffix for lock in (cache_dir / "locks").iterdir()] == [".lock"]
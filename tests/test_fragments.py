@@ -0,0 +1,176 @@
+"""
+Test workenv/fragments.py
+"""
+
+import pytest
+
+from workenv import actions
+from workenv.config import Config, ConfigError
+from workenv.index import load_index
+
+config_sample = """# main
+_common:
+  commands:
+    open:
+      run: xdg-open .
+main:
+  path: /path/main
+"""
+
+team_a_sample = """# team a
+alpha:
+  path: /path/alpha
+# keep me
+beta:
+  path: /path/beta
+"""
+
+team_b_sample = """gamma:
+  path: /path/gamma
+  commands:
+    test:
+      run: pytest
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample)
+    fragments_dir = tmp_path / "workenv_config.d"
+    fragments_dir.mkdir()
+    (fragments_dir / "team_a.yml").write_text(team_a_sample)
+    (fragments_dir / "team_b.yaml").write_text(team_b_sample)
+    (fragments_dir / "notes.txt").write_text("not: yaml")
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    monkeypatch.chdir(tmp_path)
+    return file
+
+
+def get_fragment(config, name):
+    return next(f for f in config.fragments if f.file.name == name)
+
+
+def test_load__projects_from_fragments(config_file):
+    config = Config(file=config_file)
+    assert list(config.projects) == ["main", "alpha", "beta", "gamma"]
+    assert list(config.projects["gamma"]()) == ["cd /path/gamma"]
+    assert config.projects["alpha"].get_command_names() == ["open"]
+    assert config.projects.get_fragment("main") is None
+    assert config.projects.get_fragment("gamma").file.name == "team_b.yaml"
+
+
+def test_load__cached_names__only_used_fragment_parsed(config_file):
+    Config(file=config_file)
+    config = Config(file=config_file)
+    assert list(config.projects) == ["main", "alpha", "beta", "gamma"]
+    assert not any(fragment.is_loaded() for fragment in config.fragments)
+
+    config.projects["gamma"]
+    assert not get_fragment(config, "team_a.yml").is_loaded()
+    assert get_fragment(config, "team_b.yaml").is_loaded()
+
+
+def test_load__fragment_changed__names_updated(config_file):
+    Config(file=config_file)
+    fragment_file = config_file.parent / "workenv_config.d" / "team_b.yaml"
+    fragment_file.write_text("delta:\n  path: /path/delta\n")
+    assert list(Config(file=config_file).projects) == ["main", "alpha", "beta", "delta"]
+
+
+def test_load__no_main_file(config_file):
+    config_file.unlink()
+    config = Config(file=config_file)
+    assert list(config.projects) == ["alpha", "beta", "gamma"]
+
+
+def test_load__duplicate_name__raises(config_file):
+    fragment_file = config_file.parent / "workenv_config.d" / "team_c.yml"
+    fragment_file.write_text("alpha:\n  path: /path/other\n")
+    with pytest.raises(ConfigError) as e:
+        Config(file=config_file)
+    assert e.value.message == (
+        f"Project alpha in {fragment_file} is already defined in"
+        f" {fragment_file.with_name('team_a.yml')}"
+    )
+
+
+def test_load__common_in_fragment__raises(config_file):
+    fragment_file = config_file.parent / "workenv_config.d" / "team_c.yml"
+    fragment_file.write_text("_common:\n  run: ls\n")
+    with pytest.raises(ConfigError) as e:
+        Config(file=config_file)
+    assert "cannot set _common" in e.value.message
+
+
+def test_save__fragment_project_changed__only_fragment_written(config_file):
+    fragments_dir = config_file.parent / "workenv_config.d"
+    config = Config(file=config_file)
+    actions.add(config, ["add"], ["beta", "build"])
+
+    assert config_file.read_text() == config_sample
+    assert (fragments_dir / "team_b.yaml").read_text() == team_b_sample
+    assert (fragments_dir / "team_a.yml").read_text() == (
+        "# team a\n"
+        "alpha:\n"
+        "  path: /path/alpha\n"
+        "# keep me\n"
+        "beta:\n"
+        "  commands:\n"
+        "    build:\n"
+        f"      path: {config_file.parent}\n"
+        "  path: /path/beta\n"
+    )
+    assert Config(file=config_file).projects["beta"].get_command_names() == [
+        "open",
+        "build",
+    ]
+
+
+def test_save__fragment_project_removed(config_file):
+    fragments_dir = config_file.parent / "workenv_config.d"
+    actions.remove(Config(file=config_file), ["remove"], ["gamma"])
+    assert config_file.read_text() == config_sample
+    assert (fragments_dir / "team_b.yaml").read_text() == ""
+    assert list(Config(file=config_file).projects) == ["main", "alpha", "beta"]
+
+
+def test_save__new_project__main_file_written(config_file):
+    fragments_dir = config_file.parent / "workenv_config.d"
+    actions.add(Config(file=config_file), ["add"], ["new"])
+    assert config_file.read_text() == (
+        config_sample + f"new:\n  path: {config_file.parent}\n"
+    )
+    assert (fragments_dir / "team_a.yml").read_text() == team_a_sample
+    assert list(Config(file=config_file).projects) == [
+        "main",
+        "new",
+        "alpha",
+        "beta",
+        "gamma",
+    ]
+
+
+def test_index__fragment_added__rebuilt(config_file):
+    assert load_index(config_file).get_project_names() == [
+        "main",
+        "alpha",
+        "beta",
+        "gamma",
+    ]
+    (config_file.parent / "workenv_config.d" / "team_c.yml").write_text("delta:\n")
+    assert load_index(config_file).get_project_names() == [
+        "main",
+        "alpha",
+        "beta",
+        "gamma",
+        "delta",
+    ]
+
+
+def test_index__fragment_saved__updated(config_file):
+    load_index(config_file)
+    actions.add(Config(file=config_file), ["add"], ["gamma", "build"])
+    index = load_index(config_file)
+    assert index.is_current()
+    assert index.get_command_names("gamma") == ["open", "test", "build"]
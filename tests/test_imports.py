@@ -0,0 +1,107 @@
+"""
+Test the import cost of the hot paths using python -X importtime
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Modules which must not be imported to resolve a project or complete a name
+SLOW_MODULES = [
+    "yaml",
+    "subprocess",
+    "datetime",
+    "shutil",
+    "unicodedata",
+    "pickle",
+    "hashlib",
+    "workenv.actions",
+]
+
+config_sample = """
+_common:
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /path/1
+  run: pwd
+"""
+
+
+def get_import_times(code, env=None):
+    """
+    Run code in a fresh interpreter and return {module: cumulative import time}
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env={
+            **os.environ,
+            "PYTHONPATH": str(Path(__file__).parent.parent),
+            **(env or {}),
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times, result.stdout
+
+
+@pytest.fixture
+def run_env(tmp_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample)
+    return {
+        "WORKENV_CONFIG_PATH": str(file),
+        "XDG_CACHE_HOME": str(tmp_path / "cache"),
+    }
+
+
+def assert_fast(times):
+    slow = [module for module in SLOW_MODULES if module in times]
+    assert slow == []
+
+
+def test_import_cli():
+    times, _ = get_import_times("import workenv.cli")
+    assert_fast(times)
+
+
+def test_resolve(run_env):
+    code = (
+        "import sys; sys.argv = ['we', 'project']; from workenv.cli import run; run()"
+    )
+
+    # First run builds the snapshot
+    times, _ = get_import_times(code, run_env)
+    assert "yaml" in times
+
+    times, out = get_import_times(code, run_env)
+    assert out == "cd /path/1\npwd\n"
+    assert_fast(times)
+
+
+def test_complete(run_env):
+    code = "import sys; sys.argv = ['we']; from workenv.cli import run; run()"
+    run_env.update(
+        _WORKENV_COMPLETE="complete",
+        COMP_WORDS="we project ",
+        COMP_CWORD="2",
+    )
+
+    # First run builds the index
+    get_import_times(code, run_env)
+
+    times, out = get_import_times(code, run_env)
+    assert out == "open\n"
+    assert_fast(times)
@@ -0,0 +1,220 @@
+"""
+Test workenv/incremental.py
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from workenv import bash
+from workenv.config import Config
+from workenv.constants import ACTIVE_VAR
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+config_sample = """
+_config:
+  incremental: true
+alpha:
+  path: %(tmp_path)s/alpha
+  source: ./activate
+  env:
+    PATH: /alpha/bin:$PATH
+    ALPHA: "1"
+    SHARED: alpha
+    UNEXPORTED: alpha
+  run: echo alpha
+  commands:
+    test:
+      run: pytest
+beta:
+  path: %(tmp_path)s/beta
+  source: ./activate
+  env:
+    SHARED: beta
+    EXISTING: beta
+gamma:
+  path: %(tmp_path)s/gamma
+  env:
+    GAMMA: "1"
+  snapshot: true
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    for name in ["alpha", "beta", "gamma"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "activate").write_text(f"export ACTIVATED={name}\n")
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"tmp_path": tmp_path})
+    monkeypatch.delenv(ACTIVE_VAR, raising=False)
+    monkeypatch.setenv("EXISTING", "original")
+    monkeypatch.delenv("SHARED", raising=False)
+    return file
+
+
+def activate(monkeypatch, config_file, *args):
+    """
+    Render the project or command, and record it as active as the shell would
+    """
+    project = Config(file=config_file).projects[args[0]]
+    command = project.get_command(args[1]) if len(args) > 1 else project
+    lines = list(command())
+    if lines[-1].startswith("unset"):
+        monkeypatch.delenv(ACTIVE_VAR, raising=False)
+    else:
+        name, _, value = shlex.split(lines[-1])[0].partition("=")
+        assert name == ACTIVE_VAR
+        monkeypatch.setenv(ACTIVE_VAR, value)
+    return lines[:-1]
+
+
+def save(name):
+    return f"[[ -n ${{_WORKENV_ORIG_{name}+x}} ]] || _WORKENV_ORIG_{name}=${{{name}+set:${name}}}"
+
+
+def restore(name):
+    return (
+        f'if [[ -n $_WORKENV_ORIG_{name} ]]; then {name}="${{_WORKENV_ORIG_{name}#set:}}";'
+        f" else unset {name}; fi"
+    )
+
+
+def test_first_activation__all_steps(monkeypatch, config_file, tmp_path):
+    assert activate(monkeypatch, config_file, "alpha") == [
+        f"cd {tmp_path}/alpha",
+        "source ./activate",
+        save("PATH"),
+        "export PATH=/alpha/bin:$PATH",
+        save("ALPHA"),
+        "export ALPHA=1",
+        save("SHARED"),
+        "export SHARED=alpha",
+        save("UNEXPORTED"),
+        "export UNEXPORTED=alpha",
+        "echo alpha",
+    ]
+
+
+def test_same_project__only_cd_and_run(monkeypatch, config_file, tmp_path):
+    activate(monkeypatch, config_file, "alpha")
+    assert activate(monkeypatch, config_file, "alpha") == [
+        f"cd {tmp_path}/alpha",
+        "echo alpha",
+    ]
+    assert activate(monkeypatch, config_file, "alpha", "test") == [
+        f"cd {tmp_path}/alpha",
+        "pytest",
+    ]
+
+
+def test_other_project__delta(monkeypatch, config_file, tmp_path):
+    activate(monkeypatch, config_file, "alpha")
+    assert activate(monkeypatch, config_file, "beta") == [
+        f"cd {tmp_path}/beta",
+        restore("PATH"),
+        "unset _WORKENV_ORIG_PATH",
+        restore("ALPHA"),
+        "unset _WORKENV_ORIG_ALPHA",
+        restore("UNEXPORTED"),
+        "unset _WORKENV_ORIG_UNEXPORTED",
+        "source ./activate",
+        restore("SHARED"),
+        "export SHARED=beta",
+        save("EXISTING"),
+        "export EXISTING=beta",
+    ]
+    assert activate(monkeypatch, config_file, "alpha")[:4] == [
+        f"cd {tmp_path}/alpha",
+        restore("EXISTING"),
+        "unset _WORKENV_ORIG_EXISTING",
+        "source ./activate",
+    ]
+
+
+def test_source_changed__sourced_again(monkeypatch, config_file, tmp_path):
+    activate(monkeypatch, config_file, "alpha")
+    (tmp_path / "alpha" / "activate").write_text("export ACTIVATED=changed\n")
+    assert "source ./activate" in activate(monkeypatch, config_file, "alpha")
+
+
+def test_snapshot__restores_and_clears_active(monkeypatch, config_file, tmp_path):
+    activate(monkeypatch, config_file, "alpha")
+    lines = list(Config(file=config_file).projects["gamma"]())
+    assert lines[:2] == [restore("PATH"), "unset _WORKENV_ORIG_PATH"]
+    assert restore("UNEXPORTED") in lines
+    assert lines[-1] == f"unset {ACTIVE_VAR}"
+
+
+def test_not_incremental__unchanged(monkeypatch, config_file):
+    config_file.write_text(config_file.read_text().replace("true", "false", 1))
+    monkeypatch.setenv(ACTIVE_VAR, "invalid")
+    lines = list(Config(file=config_file).projects["alpha"]())
+    assert lines[-1] == "echo alpha"
+
+
+@pytest.fixture
+def shim_script_path(monkeypatch, tmp_path):
+    """
+    Script which runs workenv with a different PATH to the shell, like a pyenv shim
+    """
+    path = tmp_path / "workenv"
+    path.write_text(
+        "#!/bin/sh\n"
+        "export PATH=/shim/bin:$PATH\n"
+        f'exec {sys.executable} -c "from workenv.cli import run; run()" "$@"\n'
+    )
+    path.chmod(0o755)
+    monkeypatch.setattr(bash, "get_script_path", lambda: path)
+    return path
+
+
+@requires_bash
+def test_bash__switching_restores_shell_environment(
+    config_file, shim_script_path, tmp_path
+):
+    script = bash.get_completion_script(Config(file=config_file), "we")
+    script += """
+UNEXPORTED=shell
+state() {
+    echo "$ACTIVATED ${ALPHA-unset} $SHARED $EXISTING ${UNEXPORTED-unset} $PATH"
+}
+we alpha > /dev/null
+state
+bash -c 'echo "child ${_WORKENV_ACTIVE-unset} ${_WORKENV_ORIG_PATH-unset}"'
+we beta
+state
+we alpha > /dev/null
+we alpha
+state
+we gamma
+state
+echo "${_WORKENV_ORIG_PATH-unset}"
+"""
+    result = subprocess.run(
+        ["bash", "-c", script],
+        env={
+            **os.environ,
+            "PATH": "/usr/bin:/bin",
+            "EXISTING": "original",
+            "PYTHONPATH": str(Path(__file__).parent.parent),
+            "WORKENV_CONFIG_PATH": str(config_file),
+        },
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert result.stdout == (
+        "alpha 1 alpha original alpha /alpha/bin:/usr/bin:/bin\n"
+        "child unset unset\n"
+        "beta unset beta beta shell /usr/bin:/bin\n"
+        "alpha\n"
+        "alpha 1 alpha original alpha /alpha/bin:/usr/bin:/bin\n"
+        "alpha unset  original shell /usr/bin:/bin\n"
+        "unset\n"
+    )
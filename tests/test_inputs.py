@@ -0,0 +1,141 @@
+"""
+Test workenv/inputs.py
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from workenv.compiler import get_entries
+from workenv.config import Config, ConfigError
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+config_sample = """
+project:
+  path: %(tmp_path)s
+  run:
+  - echo start
+  - run_if_changed: %(command)s
+    inputs:
+    - requirements*.txt
+    - src/**/*.py
+  commands:
+    test:
+      run: pytest
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    (tmp_path / "requirements.txt").write_text("django\n")
+    (tmp_path / "src" / "app").mkdir(parents=True)
+    (tmp_path / "src" / "app" / "models.py").write_text("# models\n")
+    file = tmp_path / "workenv_config.yml"
+    write_config(file, "echo installed")
+    return file
+
+
+def write_config(file, command):
+    file.write_text(config_sample % {"tmp_path": file.parent, "command": command})
+
+
+def activate(config_file):
+    """
+    Render the project and run it in bash, returning the steps which were output
+    """
+    lines = list(Config(file=config_file).projects["project"]())
+    subprocess.run(["bash", "-c", "\n".join(lines)], stdout=subprocess.DEVNULL)
+    return lines[1:]
+
+
+@requires_bash
+def test_run_if_changed__first_run__output(config_file):
+    lines = activate(config_file)
+    assert lines[0] == "echo start"
+    assert lines[1].startswith("{ eval 'echo installed'; } && printf %s ")
+
+
+@requires_bash
+def test_run_if_changed__unchanged__skipped(config_file, tmp_path):
+    activate(config_file)
+    assert activate(config_file) == ["echo start"]
+
+    # Touched but not changed
+    os.utime(tmp_path / "requirements.txt", ns=(0, 0))
+    assert activate(config_file) == ["echo start"]
+
+
+@requires_bash
+def test_run_if_changed__input_changed__output(config_file, tmp_path):
+    activate(config_file)
+    (tmp_path / "requirements.txt").write_text("django\nrequests\n")
+    assert len(activate(config_file)) == 2
+    assert activate(config_file) == ["echo start"]
+
+
+@requires_bash
+def test_run_if_changed__glob_matches_new_file__output(config_file, tmp_path):
+    activate(config_file)
+    (tmp_path / "src" / "app" / "views.py").write_text("# views\n")
+    assert len(activate(config_file)) == 2
+
+    (tmp_path / "requirements-dev.txt").write_text("pytest\n")
+    assert len(activate(config_file)) == 2
+
+
+@requires_bash
+def test_run_if_changed__command_changed__output(config_file):
+    activate(config_file)
+    write_config(config_file, "echo reinstalled")
+    assert activate(config_file)[1].startswith("{ eval 'echo reinstalled'; }")
+
+
+@requires_bash
+def test_run_if_changed__failed__output_again(config_file):
+    write_config(config_file, "'false'")
+    activate(config_file)
+    assert activate(config_file)[1].startswith("{ eval false; }")
+
+
+@requires_bash
+def test_run_if_changed__earlier_command_failed__output_again(config_file):
+    write_config(config_file, "['false', 'echo second']")
+    activate(config_file)
+    assert activate(config_file)[1].startswith("{ eval false && eval 'echo second'; }")
+
+
+@requires_bash
+def test_run_if_changed__comment__stamp_written(config_file):
+    write_config(config_file, "'echo installed # comment'")
+    activate(config_file)
+    assert activate(config_file) == ["echo start"]
+
+
+def test_run_if_changed__unresolved_input__always_output(tmp_path):
+    conf = Config()
+    conf.loads("project:\n  run:\n    run_if_changed: npm ci\n    inputs: lock.json\n")
+    assert list(conf.projects["project"]()) == ["eval 'npm ci'"]
+
+
+def test_run_if_changed__to_dict__round_trips(config_file):
+    conf = Config(file=config_file)
+    data = conf.projects["project"].to_dict()
+    assert data["run"][1] == {
+        "run_if_changed": "echo installed",
+        "inputs": ["requirements*.txt", "src/**/*.py"],
+    }
+
+
+def test_run_if_changed__invalid__raises():
+    conf = Config()
+    conf.loads("invalid:\n  run:\n    run_if_changed: ls\n    inputs: {a: b}\n")
+    with pytest.raises(ConfigError, match="Unexpected run_if_changed step in invalid"):
+        conf.projects["invalid"]
+
+
+def test_run_if_changed__not_compiled(config_file):
+    keys = [key for key, _ in get_entries(Config(file=config_file))]
+    assert keys == ["project\ttest"]
@@ -0,0 +1,97 @@
+"""
+Test workenv/loader.py backends
+"""
+
+import pytest
+import yaml
+
+from workenv import loader
+from workenv.config import Config, ConfigError
+
+config_sample = """
+_config:
+  verbose: true
+_common:
+  env:
+    PS1: '"\\\\[\\\\e[01;35m\\\\]{{project.slug}}>\\\\[\\\\e[00m\\\\]$PS1"'
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /päth/1
+  source:
+  - venv/bin/activate
+  env:
+    KEY: "yes"
+  run:
+  - "multi\\nline"
+  - "a: b"
+  - "'quoted'"
+"""
+
+requires_libyaml = pytest.mark.skipif(
+    not yaml.__with_libyaml__, reason="libyaml not available"
+)
+
+
+@pytest.fixture(params=[loader.BACKEND_C, loader.BACKEND_PYTHON])
+def backend(request, monkeypatch):
+    if request.param == loader.BACKEND_C and not yaml.__with_libyaml__:
+        pytest.skip("libyaml not available")
+    monkeypatch.setattr(loader, "backend", loader.get_backend(request.param))
+    return request.param
+
+
+def load_config():
+    config = Config()
+    config.loads(config_sample)
+    return config
+
+
+def test_backend__round_trip(backend):
+    config = load_config()
+    raw = config.to_yaml()
+
+    reloaded = Config()
+    reloaded.loads(raw)
+    assert reloaded.to_yaml() == raw
+    assert list(reloaded.projects["project"]()) == list(config.projects["project"]())
+    assert reloaded.projects["project"].run == ["multi\nline", "a: b", "'quoted'"]
+
+
+@requires_libyaml
+def test_backends__output_identical(monkeypatch):
+    monkeypatch.setattr(loader, "backend", loader.get_backend(loader.BACKEND_C))
+    c_config = load_config()
+    c_raw = c_config.to_yaml()
+
+    monkeypatch.setattr(loader, "backend", loader.get_backend(loader.BACKEND_PYTHON))
+    python_config = load_config()
+    python_raw = python_config.to_yaml()
+
+    assert c_raw == python_raw
+    assert loader.load(c_raw) == loader.load(python_raw)
+
+
+def test_get_backend__libyaml_missing__falls_back(monkeypatch):
+    monkeypatch.setattr(yaml, "__with_libyaml__", False)
+    backend = loader.get_backend()
+    assert backend.name == loader.BACKEND_PYTHON
+    assert backend.loader is yaml.SafeLoader
+    assert backend.dumper is yaml.SafeDumper
+
+
+def test_get_backend__libyaml_missing__forced_c_raises(monkeypatch):
+    monkeypatch.setattr(yaml, "__with_libyaml__", False)
+    with pytest.raises(ConfigError, match="not available"):
+        loader.get_backend(loader.BACKEND_C)
+
+
+@requires_libyaml
+def test_get_backend__default__uses_libyaml():
+    assert loader.get_backend().loader is yaml.CSafeLoader
+
+
+def test_get_backend__unknown__raises():
+    with pytest.raises(ConfigError, match="Unexpected value"):
+        loader.get_backend("java")
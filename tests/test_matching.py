@@ -0,0 +1,64 @@
+"""
+Test workenv/matching.py
+"""
+
+from workenv.matching import WordIndex, prefix_matches
+
+names = sorted(
+    [
+        "company-api-gateway",
+        "company-api",
+        "api-gateway-legacy",
+        "gateway",
+        "agile_wiki",
+        "docs.api.global",
+        "web",
+    ]
+)
+
+
+def test_prefix_matches():
+    assert prefix_matches(names, "company") == ["company-api", "company-api-gateway"]
+    assert prefix_matches(names, "") == names
+    assert prefix_matches(names, "z") == []
+
+
+def test_match__word_boundaries():
+    index = WordIndex.build(names)
+    assert index.match("api-gw") == ["api-gateway-legacy", "company-api-gateway"]
+    assert index.match("ag_wk") == ["agile_wiki"]
+
+    # A part must match within one word
+    assert index.match("agwk") == []
+
+
+def test_match__exact_words_first():
+    index = WordIndex.build(names)
+    # Every part starts a word, so these rank above the shorter subsequence match
+    assert index.match("api-ga") == [
+        "api-gateway-legacy",
+        "company-api-gateway",
+        "docs.api.global",
+    ]
+    assert index.match("gw") == [
+        "gateway",
+        "api-gateway-legacy",
+        "company-api-gateway",
+    ]
+
+
+def test_match__parts_in_order():
+    index = WordIndex.build(names)
+    assert index.match("gw-api") == []
+    assert index.match("legacy-api") == []
+
+
+def test_match__limit():
+    index = WordIndex.build(names)
+    assert index.match("api", limit=2) == ["company-api", "docs.api.global"]
+
+
+def test_match__from_data():
+    index = WordIndex.build(names)
+    loaded = WordIndex.from_data(names, index.to_data())
+    assert loaded.match("api-gw") == index.match("api-gw")
@@ -0,0 +1,233 @@
+"""
+Test workenv/needs.py
+"""
+
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from workenv import bash
+from workenv.config import Config, ConfigError
+from workenv.needs import find_cycle, get_schedule
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+config_sample = """
+_common:
+  commands:
+    lint:
+      needs: install
+      run: flake8
+project:
+  path: /path/1
+  commands:
+    install:
+      run: pip install -e .
+    network:
+      run: docker network create project
+    database:
+      needs: network
+      run: docker compose up -d database
+    test:
+      needs: [database, install]
+      run: pytest
+"""
+
+
+def load(raw):
+    conf = Config()
+    conf.loads(raw)
+    return conf
+
+
+def run_in_bash(script, *calls):
+    """
+    Run a rendered command in a shell function, as the shell function would
+    """
+    result = subprocess.run(
+        ["bash", "-c", "\n".join(["f() {", script, "}", *calls])],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return result.stdout
+
+
+def test_find_cycle():
+    assert find_cycle({"a": ["b"], "b": ["c"], "c": []}) is None
+    assert find_cycle({"a": ["b"], "b": ["c"], "c": ["b"]}) == ["b", "c", "b"]
+    assert find_cycle({"a": ["a"]}) == ["a", "a"]
+
+
+def test_get_schedule__levels_by_depth():
+    graph = {"a": [], "b": ["a"], "c": [], "d": ["b", "c"], "e": []}
+    assert get_schedule(graph, ["d"]) == [["a", "c"], ["b"], ["d"]]
+    assert get_schedule(graph, []) == []
+
+
+def test_needs__render__prerequisites_scheduled():
+    conf = load(config_sample)
+    assert list(conf.projects["project"].get_command("test")()) == [
+        (
+            '( pids=(); { [[ ":$_WORKENV_SATISFIED:" == *:project/network:* ]]'
+            " || ( eval 'cd /path/1'; eval 'docker network create project'; ); }"
+            " & pids+=($!);"
+            ' { [[ ":$_WORKENV_SATISFIED:" == *:project/install:* ]]'
+            " || ( eval 'cd /path/1'; eval 'pip install -e .'; ); }"
+            " & pids+=($!);"
+            ' status=0; for pid in "${pids[@]}"; do wait "$pid" || status=$?; done;'
+            " exit $status ) || return 1"
+        ),
+        '[[ ":$_WORKENV_SATISFIED:" == *:project/network:* ]]'
+        " || export _WORKENV_SATISFIED=$_WORKENV_SATISFIED:project/network",
+        '[[ ":$_WORKENV_SATISFIED:" == *:project/install:* ]]'
+        " || export _WORKENV_SATISFIED=$_WORKENV_SATISFIED:project/install",
+        '[[ ":$_WORKENV_SATISFIED:" == *:project/database:* ]]'
+        " || ( eval 'cd /path/1'; eval 'docker compose up -d database'; )"
+        " || return 1",
+        '[[ ":$_WORKENV_SATISFIED:" == *:project/database:* ]]'
+        " || export _WORKENV_SATISFIED=$_WORKENV_SATISFIED:project/database",
+        "cd /path/1",
+        "pytest",
+    ]
+
+
+def test_needs__common_command__needs_project_command():
+    conf = load(config_sample)
+    lines = list(conf.projects["project"].get_command("lint")())
+    assert "pip install -e ." in lines[0]
+    assert lines[-1] == "flake8"
+
+
+def test_needs__to_dict__round_trips():
+    conf = load(config_sample)
+    data = conf.projects["project"].to_dict()
+    assert data["commands"]["database"]["needs"] == ["network"]
+    assert load(conf.to_yaml()).projects["project"].to_dict() == data
+
+
+def test_needs__cycle__raises_on_load():
+    with pytest.raises(ConfigError) as e:
+        load(
+            """
+project:
+  commands:
+    a:
+      needs: b
+    b:
+      needs: [c]
+    c:
+      needs: a
+"""
+        )
+    assert e.value.message == "Commands in project need each other: a -> b -> c -> a"
+
+
+def test_needs__unknown_command__raises_on_load():
+    with pytest.raises(ConfigError) as e:
+        load("project:\n  needs: missing\n")
+    assert e.value.message == "Unknown command missing needed by project in project"
+
+
+def test_needs__invalid__raises_on_load():
+    with pytest.raises(ConfigError, match="Unexpected needs in a"):
+        load("project:\n  commands:\n    a:\n      needs: {b: c}\n")
+
+
+def test_needs__deferred_project__checked_when_built(tmp_path):
+    (tmp_path / "workenv.yaml").write_text("commands:\n  a:\n    needs: a\n")
+    conf = load(f"project:\n  config: {tmp_path}\n")
+    with pytest.raises(ConfigError, match="Commands in project need each other"):
+        conf.projects["project"].project
+
+
+@requires_bash
+def test_needs__bash__concurrent_and_skipped_once_satisfied(tmp_path):
+    conf = load(
+        f"""
+project:
+  path: {tmp_path}
+  commands:
+    first:
+      run: sleep 0.5; echo first
+    second:
+      run: sleep 0.5; echo second
+    test:
+      needs: [first, second]
+      run: echo test
+"""
+    )
+    script = "\n".join(conf.projects["project"].get_command("test")())
+    start = time.monotonic()
+    out = run_in_bash(script, "f", "f")
+    assert time.monotonic() - start < 0.9
+    assert sorted(out.splitlines()) == ["first", "second", "test", "test"]
+
+
+@requires_bash
+def test_needs__bash__failure_stops_command():
+    conf = load(
+        """
+project:
+  commands:
+    broken:
+      run: echo broken; false
+    test:
+      needs: broken
+      run: echo test
+"""
+    )
+    script = "\n".join(conf.projects["project"].get_command("test")())
+    out = run_in_bash(script, "f; echo status=$?", "f")
+    assert out == "broken\nstatus=1\nbroken\n"
+
+
+@requires_bash
+def test_needs__line_protocol__one_line_per_step(tmp_path, monkeypatch, script_path):
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(
+        f"""
+project:
+  path: {tmp_path}
+  commands:
+    setup:
+      run:
+      - echo setup # comment
+      - |-
+        cat <<EOF
+        heredoc
+        EOF
+      - parallel: ["true"]
+        wait: false
+    other:
+      run: echo other
+    empty:
+      needs: other
+    test:
+      needs: [setup, empty]
+      run: echo test
+"""
+    )
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    script = bash.get_completion_script(Config(file=file), "we")
+
+    # Force the shell function for bash before 4.4, which evaluates each line alone
+    script = script.replace(bash.BASH_RECORDS_TEST, "false")
+    script += "\nwe project test\necho status=$?\n"
+    result = subprocess.run(
+        ["bash", "-c", script],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    assert result.stderr == ""
+    assert sorted(result.stdout.splitlines()) == [
+        "heredoc",
+        "other",
+        "setup",
+        "status=0",
+        "test",
+    ]
@@ -0,0 +1,103 @@
+"""
+Test workenv/profile.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from workenv import profile
+from workenv.cli import run
+
+config_sample = """
+project:
+  path: /path/1
+  run: echo {{project.name}}
+deferred:
+  config: %(deferred_path)s
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("run: echo {{project.name}}\n")
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"deferred_path": deferred_dir})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    return file
+
+
+@pytest.fixture
+def enable_profile(monkeypatch):
+    def enable(target):
+        monkeypatch.setattr(profile, "enabled", True)
+        monkeypatch.setattr(profile, "target", target)
+        monkeypatch.setattr(profile, "phases", {})
+        monkeypatch.setattr(profile, "counts", {})
+
+    return enable
+
+
+def test_disabled__no_output(capsys, monkeypatch, config_file):
+    monkeypatch.setattr(profile, "enabled", False)
+    monkeypatch.setattr(sys, "argv", ["workenv", "project"])
+    run()
+    assert capsys.readouterr().err == ""
+    assert profile.phase("render") is profile.null_phase
+
+
+@pytest.mark.parametrize("value", ["", "0"])
+def test_disabled__env_var(value):
+    result = subprocess.run(
+        [sys.executable, "-c", "from workenv import profile; print(profile.enabled)"],
+        env={
+            **os.environ,
+            "PYTHONPATH": str(Path(__file__).parent.parent),
+            "WORKENV_PROFILE": value,
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout == "False\n"
+
+
+def test_enabled__json_line_on_stderr(capsys, monkeypatch, config_file, enable_profile):
+    enable_profile("1")
+    monkeypatch.setattr(sys, "argv", ["workenv", "deferred"])
+    run()
+    captured = capsys.readouterr()
+    assert captured.out == f"cd {config_file.parent / 'deferred'}\necho deferred\n"
+
+    data = json.loads(captured.err)
+    assert data["argv"] == ["deferred"]
+    assert set(data["phases"]) == {
+        "imports",
+        "config.load",
+        "deferred.load",
+        "render",
+        "echo",
+    }
+    assert all(phase["calls"] == 1 for phase in data["phases"].values())
+    assert data["counts"] == {"projects_built": 1, "templates_rendered": 2}
+
+
+def test_enabled__file__lines_appended(
+    capsys, monkeypatch, config_file, enable_profile, tmp_path
+):
+    log = tmp_path / "profile.log"
+    enable_profile(str(log))
+    monkeypatch.setattr(sys, "argv", ["workenv", "project"])
+    run()
+    run()
+    assert capsys.readouterr().err == ""
+    lines = log.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["counts"]["projects_built"] == 2
@@ -0,0 +1,145 @@
+"""
+Test workenv/server.py and workenv/client.py
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from workenv import client, constants
+from workenv.config import Config
+from workenv.server import Server
+
+config_sample = """
+_common:
+  commands:
+    open:
+      run: xdg-open .
+project:
+  path: /path/1
+  run: pwd
+deferred:
+  config: %(deferred_path)s
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    deferred_dir = tmp_path / "deferred"
+    deferred_dir.mkdir()
+    (deferred_dir / "workenv.yaml").write_text("run: ls\n")
+
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"deferred_path": deferred_dir})
+    monkeypatch.setenv("WORKENV_CONFIG_PATH", str(file))
+    return file
+
+
+@pytest.fixture
+def socket_path(config_file, tmp_path):
+    # Unix socket paths have a short length limit, so can't always use tmp_path
+    path = Path(f"/tmp/workenv-test-{os.getpid()}.sock")
+    server = Server(path, Config(file=config_file))
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+    thread.join()
+    path.unlink()
+
+
+def request(socket_path, *argv, **env):
+    return client.request(
+        str(socket_path),
+        list(argv),
+        {"WORKENV_CONFIG_PATH": os.environ["WORKENV_CONFIG_PATH"], **env},
+    )
+
+
+def test_resolve(socket_path):
+    response = request(socket_path, "project", "open")
+    assert response == {
+        "status": "ok",
+        "stdout": "cd /path/1\nxdg-open .\n",
+        "stderr": "",
+    }
+
+
+def test_resolve__unknown__error_returned(socket_path):
+    response = request(socket_path, "missing")
+    assert response["stdout"] == ""
+    assert response["stderr"] == "Unknown project missing\n"
+
+
+def test_complete(socket_path):
+    response = request(
+        socket_path,
+        _WORKENV_COMPLETE="complete",
+        COMP_WORDS="we project ",
+        COMP_CWORD="2",
+    )
+    assert response["stdout"] == "open\n"
+    assert "_WORKENV_COMPLETE" not in os.environ
+
+
+def test_action__fallback(socket_path):
+    assert request(socket_path, "--add", "other") == {"status": "fallback"}
+
+
+def test_current_project__fallback(socket_path):
+    assert request(socket_path, ".") == {"status": "fallback"}
+
+
+def test_other_config__fallback(socket_path, tmp_path):
+    response = request(socket_path, "project", WORKENV_CONFIG_PATH=str(tmp_path))
+    assert response == {"status": "fallback"}
+
+
+def test_config_changed__reloaded(socket_path, config_file):
+    assert request(socket_path, "project")["stdout"] == "cd /path/1\npwd\n"
+    config_file.write_text("project:\n  path: /path/2\n")
+    assert request(socket_path, "project")["stdout"] == "cd /path/2\n"
+
+
+def test_deferred_changed__reloaded(socket_path, config_file):
+    deferred_file = config_file.parent / "deferred" / "workenv.yaml"
+    deferred_dir = deferred_file.parent
+    assert request(socket_path, "deferred")["stdout"] == f"cd {deferred_dir}\nls\n"
+    deferred_file.write_text("run: make\n")
+    assert request(socket_path, "deferred")["stdout"] == f"cd {deferred_dir}\nmake\n"
+
+
+def test_client__server_running__output(socket_path):
+    result = subprocess.run(
+        [sys.executable, "-I", "-S", client.__file__, str(socket_path), "project"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert result.stdout == "cd /path/1\npwd\n"
+
+
+def test_client__server_not_running__fallback(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-I", "-S", client.__file__, str(tmp_path / "missing")],
+        capture_output=True,
+    )
+    assert result.returncode == client.FALLBACK
+    assert result.stdout == b""
+
+
+def test_client__forwarded_env__matches_constants():
+    # The client can't import constants, so check they are in sync
+    assert set(client.FORWARD_ENV) == {
+        constants.CONFIG_ENV_VAR,
+        constants.COMMAND_VAR,
+        constants.COMPLETE_VAR,
+        constants.PROTOCOL_VAR,
+        "COMP_WORDS",
+        "COMP_CWORD",
+    }
@@ -0,0 +1,159 @@
+"""
+Test workenv/snapshot.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from workenv.config import Config
+from workenv.snapshot import diff_env
+
+requires_bash = pytest.mark.skipif(not shutil.which("bash"), reason="requires bash")
+
+config_sample = """
+project:
+  path: %(tmp_path)s
+  source: ./activate
+  env:
+    PROJECT: "{{project.name}}"
+  run: export FROM_RUN=1
+  snapshot: true
+  commands:
+    test:
+      run: pytest
+      snapshot: false
+"""
+
+activate_sample = """
+echo activated >> %(tmp_path)s/activations.log
+export VIRTUAL_ENV=%(tmp_path)s/venv
+export PATH="%(tmp_path)s/venv/bin:$PATH"
+"""
+
+
+@pytest.fixture
+def config_file(monkeypatch, tmp_path):
+    (tmp_path / "activate").write_text(activate_sample % {"tmp_path": tmp_path})
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(config_sample % {"tmp_path": tmp_path})
+    return file
+
+
+def activate(config_file):
+    return list(Config(file=config_file).projects["project"]())
+
+
+def count_activations(tmp_path):
+    return len((tmp_path / "activations.log").read_text().splitlines())
+
+
+def test_diff_env():
+    before = {"PATH": "/usr/bin", "SAME": "1", "GONE": "1", "CHANGED": "a"}
+    after = {"PATH": "/venv/bin:/usr/bin", "SAME": "1", "CHANGED": "b", "NEW": "x y"}
+    assert diff_env(before, after) == [
+        'export PATH=/venv/bin:"$PATH"',
+        "export CHANGED=b",
+        "export NEW='x y'",
+        "unset GONE",
+    ]
+
+
+@requires_bash
+def test_snapshot__exports_captured(config_file, tmp_path):
+    lines = activate(config_file)
+    assert lines[0] == f"cd {tmp_path}"
+    assert sorted(lines[1:]) == [
+        "export FROM_RUN=1",
+        f'export PATH={tmp_path}/venv/bin:"$PATH"',
+        "export PROJECT=project",
+        f"export VIRTUAL_ENV={tmp_path}/venv",
+    ]
+    assert count_activations(tmp_path) == 1
+
+    # Used again without running the steps
+    assert activate(config_file) == lines
+    assert count_activations(tmp_path) == 1
+
+
+@requires_bash
+def test_snapshot__already_set__still_captured(config_file, monkeypatch, tmp_path):
+    # Taken in a shell where the project is already active
+    monkeypatch.setenv("VIRTUAL_ENV", f"{tmp_path}/venv")
+    monkeypatch.setenv("PROJECT", "project")
+    monkeypatch.setenv("FROM_RUN", "1")
+    lines = activate(config_file)
+    assert "export PROJECT=project" in lines
+    assert "export FROM_RUN=1" in lines
+    assert f"export VIRTUAL_ENV={tmp_path}/venv" in lines
+
+
+@requires_bash
+def test_snapshot__input_changed__captured_again(config_file, tmp_path):
+    activate(config_file)
+    activate_file = tmp_path / "activate"
+
+    # Same contents with a new mtime is still current
+    stat = activate_file.stat()
+    os.utime(activate_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    activate(config_file)
+    assert count_activations(tmp_path) == 1
+
+    activate_file.write_text(activate_file.read_text() + "export ADDED=1\n")
+    assert "export ADDED=1" in activate(config_file)
+    assert count_activations(tmp_path) == 2
+
+
+@requires_bash
+def test_snapshot__steps_changed__captured_again(config_file, tmp_path):
+    activate(config_file)
+    config_file.write_text(config_file.read_text().replace("FROM_RUN=1", "FROM_RUN=2"))
+    assert "export FROM_RUN=2" in activate(config_file)
+    assert count_activations(tmp_path) == 2
+
+
+@requires_bash
+def test_snapshot__steps_fail__steps_returned(config_file, tmp_path):
+    raw = config_file.read_text()
+    config_file.write_text(raw.replace("export FROM_RUN=1", "exit 3"))
+    assert activate(config_file) == [
+        f"cd {tmp_path}",
+        "source ./activate",
+        "export PROJECT=project",
+        "exit 3",
+    ]
+
+
+@requires_bash
+def test_snapshot__venv__prompt_not_captured(tmp_path):
+    subprocess.run(
+        [sys.executable, "-m", "venv", "--without-pip", str(tmp_path / "venv")],
+        check=True,
+    )
+    file = tmp_path / "workenv_config.yml"
+    file.write_text(
+        f"venv:\n  path: {tmp_path}\n  source: venv/bin/activate\n  snapshot: true\n"
+    )
+    lines = list(Config(file=file).projects["venv"]())
+    assert lines[0] == f"cd {tmp_path}"
+    assert f"export VIRTUAL_ENV={tmp_path}/venv" in lines
+    assert f'export PATH={tmp_path}/venv/bin:"$PATH"' in lines
+    names = [line.split()[1].split("=")[0] for line in lines[1:]]
+    assert not {"PS1", "PS2", "PROMPT_COMMAND"} & set(names)
+    assert not any(name.startswith("_OLD_VIRTUAL_") for name in names)
+
+
+def test_snapshot__disabled_for_command(config_file, tmp_path):
+    config = Config(file=config_file)
+    project = config.projects["project"]
+    assert project.snapshot == []
+    assert project.get_command("test").snapshot is None
+    assert list(project.get_command("test")()) == [
+        f"cd {tmp_path}",
+        "source ./activate",
+        "export PROJECT=project",
+        "pytest",
+    ]
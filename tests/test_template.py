@@ -0,0 +1,99 @@
+"""
+Test workenv/template.py
+"""
+
+from workenv import config as config_module
+from workenv.config import Config
+from workenv.template import Template, compile_template, slugify
+
+
+def test_template__segments():
+    template = Template("one {{project.name}} two {{ command.name }}")
+    assert template.segments == ["one ", ("project.name",), " two ", ("command.name",)]
+    assert template.static is None
+
+
+def test_template__static():
+    template = Template("no variables")
+    assert template.segments == ["no variables"]
+    assert template.static == "no variables"
+    assert Template(r"\{{project.name}}").static == "{{project.name}}"
+    assert Template("").static == ""
+
+
+def test_template__escaped():
+    template = Template(r"\{{project.name}} {{project.name}}")
+    assert template.segments == ["{{project.name}} ", ("project.name",)]
+    assert template.render({"project.name": "one"}) == "{{project.name}} one"
+
+
+def test_template__unknown_variable__empty():
+    assert Template("a{{project.unknown}}b").render({}) == "ab"
+
+
+def test_compile_template__reused():
+    assert compile_template("{{project.name}}") is compile_template("{{project.name}}")
+
+
+def test_slugify():
+    assert slugify("My Project_Name -- Ünïcode!") == "my-project_name-unicode"
+
+
+def test_variables__project_and_command():
+    conf = Config()
+    conf.loads(
+        """
+_common:
+  commands:
+    open:
+      run: echo {{command.name}} {{project.path}}
+My Project:
+  path: /path/{{project.slug}}
+  env:
+    NAME: "{{project.name}}"
+    PATH_VAR: "{{project.path}}"
+    COMMAND: "{{command.name}}"
+        """
+    )
+    project = conf.projects["My Project"]
+    assert list(project()) == [
+        "cd /path/my-project",
+        "export NAME=My Project",
+        "export PATH_VAR=/path/my-project",
+        "export COMMAND=My Project",
+    ]
+
+    command = project.commands["open"].clone_to(project)
+    assert list(command()) == [
+        "cd /path/my-project",
+        "export NAME=My Project",
+        "export PATH_VAR=/path/my-project",
+        "export COMMAND=open",
+        "echo open /path/my-project",
+    ]
+
+
+def test_slug__computed_once_per_project(monkeypatch):
+    calls = []
+
+    def counting_slugify(name):
+        calls.append(name)
+        return name
+
+    monkeypatch.setattr(config_module, "slugify", counting_slugify)
+    conf = Config()
+    conf.loads(
+        """
+project:
+  env:
+    ONE: "{{project.slug}}"
+  commands:
+    command:
+      env:
+        TWO: "{{project.slug}}"
+        """
+    )
+    project = conf.projects["project"]
+    list(project())
+    list(project.commands["command"]())
+    assert calls == ["project"]
@@ -1,13 +1,17 @@
 """
 Command line actions to manage workenv
+
+This module is only imported when an action is invoked, so any slow imports belong here
+or in the action itself rather than on the path to resolve a project.
 """
 
 import os
-import subprocess
+import sys
+from contextlib import contextmanager
 from pathlib import Path
 
 from . import bash
-from .config import Command, DeferredProject, Project
+from .config import Command, Config, DeferredProject, Project
 from .constants import COMMAND_NAME, PROJECT_DEFAULT_FILENAME
 from .io import echo, error
 
@@ -44,10 +48,29 @@ def edit(config, actions, args):
     """
     if len(args) > 0:
         error("Usage: workenv --edit")
+    import subprocess
+
     editor = os.environ.get("EDITOR") or "vim"
     subprocess.call([editor, config.file])
 
 
+@contextmanager
+def editing(config):
+    """
+    Lock the config file while it is changed and saved
+
+    If another process changed the file since it was loaded, yields a fresh config
+    loaded from the file, so changes are made on top of theirs rather than replacing
+    them.
+    """
+    from .document import locked
+
+    with locked(config.file):
+        if not config.is_current():
+            config = Config(file=config.file)
+        yield config
+
+
 @action
 def add(config, actions, args):
     """
@@ -59,51 +82,63 @@ def add(config, actions, args):
         return
     project_name, command_name = (args + [None])[0:2]
 
-    # Get or create project
-    if not command_name and project_name in config.projects:
-        error(f"Project {project_name} already exists")
-        return
+    with editing(config) as config:
+        # Get or create project
+        if not command_name and project_name in config.projects:
+            error(f"Project {project_name} already exists")
+            return
 
-    if project_name not in config.projects:
-        if (cwd / PROJECT_DEFAULT_FILENAME).is_file():
-            config.projects[project_name] = DeferredProject(
-                config=config,
-                name=project_name,
-                path=cwd,
+        if project_name not in config.projects:
+            if (cwd / PROJECT_DEFAULT_FILENAME).is_file():
+                config.projects[project_name] = DeferredProject(
+                    config=config,
+                    name=project_name,
+                    path=cwd,
+                )
+            else:
+                config.projects[project_name] = Project(
+                    config=config,
+                    name=project_name,
+                    path=cwd,
+                    source=[],
+                    env={},
+                    run=[],
+                    parent=None,
+                )
+        project = config.projects[project_name]
+
+        if not command_name:
+            config.save()
+            echo(f"Added project {project_name}")
+            return
+
+        if isinstance(project, DeferredProject):
+            # Only the path to its file is saved in the config
+            error(
+                f"Project {project_name} is defined in {project.file},"
+                " add the command there"
             )
-        else:
-            config.projects[project_name] = Project(
+            return
+
+        if command_name in project.commands:
+            error(f"Command {command_name} already exists in project {project_name}")
+            return
+
+        project.add_command(
+            command_name,
+            Command(
                 config=config,
-                name=project_name,
+                name=command_name,
                 path=cwd,
                 source=[],
                 env={},
                 run=[],
-                parent=None,
-            )
-    project = config.projects[project_name]
+                parent=project,
+            ),
+        )
 
-    if not command_name:
         config.save()
-        echo(f"Added project {project_name}")
-        return
-
-    if command_name in project.commands:
-        error(f"Command {command_name} already exists in project {project_name}")
-        return
-
-    project.commands[command_name] = Command(
-        config=config,
-        name=command_name,
-        path=cwd,
-        source=[],
-        env={},
-        run=[],
-        parent=project,
-    )
-
-    config.save()
-    echo(f"Added command {command_name} to project {project_name}")
+        echo(f"Added command {command_name} to project {project_name}")
 
 
 @action
@@ -117,9 +152,123 @@ def remove(config, actions, args):
 
     project_name = args[0]
 
-    if project_name not in config.projects:
-        error(f"Project {project_name} not found")
+    with editing(config) as config:
+        if project_name not in config.projects:
+            error(f"Project {project_name} not found")
+            return
+
+        del config.projects[project_name]
+        config.save()
+        echo(f"Removed {project_name}")
+
+
+@action
+def discover(config, actions, args):
+    """
+    Add every dir under the given dirs which has a workenv.yaml as a project
+    """
+    from .discover import find_project_dirs, get_project_name, get_registered_dirs
+
+    if len(args) == 0:
+        error("Usage: workenv --discover <dir> [<dir> ...]")
+        return
+
+    roots = [str(Path(arg).expanduser().resolve()) for arg in args]
+    found = find_project_dirs(roots)
+
+    added = []
+    with editing(config) as config:
+        registered = get_registered_dirs(config)
+        taken = set(config.projects)
+        for path in found:
+            if path in registered:
+                continue
+            project_name = get_project_name(path, roots, taken)
+            if project_name is None:
+                error(f"Could not add {path}: a project with its name already exists")
+                continue
+            config.projects[project_name] = DeferredProject(
+                config=config,
+                name=project_name,
+                path=path,
+            )
+            taken.add(project_name)
+            added.append(project_name)
+
+        if added:
+            config.save()
+
+    for project_name in added:
+        echo(f"Added project {project_name}")
+    echo(f"Found {len(found)} projects, added {len(added)}")
+
+
+@action
+def serve(config, actions, args):
+    """
+    Run a server which holds the config in memory to answer requests faster
+    """
+    from .config import ConfigError
+    from .server import get_socket_path, serve
+
+    if len(args) > 0:
+        error("Usage: workenv --serve")
+        return
+
+    socket_path = get_socket_path()
+    if socket_path is None:
+        error("Cannot serve: XDG_RUNTIME_DIR is not set")
+        return
+
+    echo(f"Serving {config.file} on {socket_path}")
+    try:
+        serve(config, socket_path)
+    except ConfigError as e:
+        error(f"Cannot serve: {e.message}")
+
+
+@action
+def compile(config, actions, args):
+    """
+    Compile projects into bash functions so they can be run without python
+    """
+    from .compiler import write_compiled
+
+    if len(args) > 0:
+        error("Usage: workenv --compile")
+        return
+
+    try:
+        path = write_compiled(config)
+    except OSError as e:
+        error(f"Could not write compiled projects: {e}")
+        return
+    echo(f"Compiled {len(config.projects)} projects to {path}")
+
+
+@action
+def check(config, actions, args):
+    """
+    Check every project loads, and the paths and source files it uses exist
+    """
+    from .check import check_config
+
+    if len(args) > 0:
+        error("Usage: workenv --check")
+        return
+
+    reports = check_config(config)
+    failed = 0
+    for report in reports:
+        timing = f"{report.seconds * 1000:.1f}ms"
+        if not report.errors:
+            echo(f"{report.name}: ok ({timing})")
+            continue
+        failed += 1
+        error(f"{report.name}: failed ({timing})")
+        for message in report.errors:
+            error(f"  {message}")
 
-    del config.projects[project_name]
-    config.save()
-    echo(f"Removed {project_name}")
+    echo(f"Checked {len(reports)} projects, {failed} with errors")
+    if failed:
+        sys.exit(1)
@@ -4,14 +4,23 @@ Bash autocompletion
 Based on click
 """
 
-import datetime
 import os
 import re
-import shutil
 import sys
 from pathlib import Path
 
-from .constants import COMMAND_VAR, COMPLETE_VAR, CONFIG_DEFAULT_FILENAME
+from . import profile
+from .cache import get_cache_path, write_file
+from .constants import (
+    ACTIVE_VAR,
+    COMMAND_VAR,
+    COMPLETE_VAR,
+    CONFIG_DEFAULT_FILENAME,
+    PROTOCOL_HEADER,
+    PROTOCOL_VAR,
+    PROTOCOL_VERSION,
+)
+from .matching import WordIndex, prefix_matches
 
 # The setup script to be added to .bashrc
 INSTALLATION_SCRIPT_BASH = """
@@ -21,34 +30,177 @@ eval "$(%(command_var)s=%(command_name)s %(complete_var)s=setup %(script_path)s)
 """
 
 # The completion script to run from .bashrc
-COMPLETION_ECHO = """
-            echo "\\$ $CMD"
+COMPLETION_LINES_ECHO = """
+        echo "\\$ $CMD"
 """
-COMPLETION_HISTORY = """
-            history -s $CMD
+COMPLETION_LINES_HISTORY = """
+        history -s "$CMD"
 """
-COMPLETION_SCRIPT_BASH = """
+COMPLETION_RECORDS_ECHO = """
+        SCRIPT+="printf '\\$ %s\\n' ${CMD@Q}"$'\\n'
+"""
+COMPLETION_RECORDS_HISTORY = """
+        history -s "$CMD"
+"""
+COMPLETION_SERVER = """
+    if [[ -S %(socket_path)s ]]; then
+        %(python_path)s -I -S %(client_path)s %(socket_path)s "$@" && return
+    fi
+"""
+COMPLETION_PYTHON = """
+%(python_func)s() {
+    local IFS=$'\n'
+    local WORDS="${COMP_WORDS[*]}"
+    COMPREPLY=( $( unset COMP_WORDS
+                   export COMP_WORDS="$WORDS" \\
+                          COMP_CWORD=$COMP_CWORD \\
+                          %(complete_var)s=complete
+                   %(complete_func)s_exec ) )
+    return 0
+}
+"""
+# Fall back to python for fuzzy matches when no names match the prefix
+COMPLETION_NATIVE_FUZZY = """
+    if [[ ${#COMPREPLY[@]} -eq 0 && -n "$CURRENT" ]]; then
+        %(python_func)s
+    fi
+"""
+# Native completion sources an include file of names generated by write_include(), and
+# only calls back into python when it is missing or older than a config file
+COMPLETION_NATIVE = """
+%(complete_func)s_stale() {
+    local SOURCE
+    for SOURCE in "${_WORKENV_SOURCES[@]}"; do
+        [[ "$SOURCE" -nt %(include_path)s ]] && return 0
+    done
+    for SOURCE in "${_WORKENV_MISSING[@]}"; do
+        [[ -e "$SOURCE" ]] && return 0
+    done
+    return 1
+}
+%(complete_func)s_load() {
+    local HEADER=""
+    if [[ -f %(include_path)s ]]; then
+        read -r HEADER < %(include_path)s
+        if [[ "$HEADER" != "$_WORKENV_INCLUDE" ]]; then
+            source %(include_path)s || return 1
+        fi
+    fi
+    if [[ -z "$HEADER" ]] || %(complete_func)s_stale; then
+        %(complete_var)s=include %(script_path)s || return 1
+        source %(include_path)s || return 1
+    fi
+}
+%(complete_func)s() {
+    if ! %(complete_func)s_load 2>/dev/null; then
+        %(python_func)s
+        return 0
+    fi
+    local CURRENT="${COMP_WORDS[COMP_CWORD]}"
+    local WORD
+    local -a WORDS=()
+    if [[ $COMP_CWORD -eq 1 ]]; then
+        WORDS=("${_WORKENV_PROJECTS[@]}")
+    elif [[ $COMP_CWORD -eq 2 && -n "${COMP_WORDS[1]}" ]]; then
+        local IFS=$'\n'
+        WORDS=(${_WORKENV_COMMANDS[${COMP_WORDS[1]}]})
+    fi
+    COMPREPLY=()
+    for WORD in "${WORDS[@]}"; do
+        [[ "$WORD" == "$CURRENT"* ]] && COMPREPLY+=("$WORD")
+    done
+    %(script_native_fuzzy)s
+    return 0
+}
+"""
+# Reading NUL-terminated records needs bash 4.4 - older versions use the original
+# protocol of one command per line, without compiled functions or native completion
+BASH_RECORDS_TEST = (
+    "(( BASH_VERSINFO[0] > 4 || BASH_VERSINFO[0] == 4 && BASH_VERSINFO[1] >= 4 ))"
+)
+COMPLETION_LINES = """
 %(command_name)s() {
     local IFS=$'\n'
     if [[ "$@" =~ (^| )--.* ]]; then
         %(script_path)s "$@"
-    else
-        CMDS=`%(script_path)s "$@"`;
-        for CMD in $CMDS; do
-            %(script_echo)s
-            %(script_history)s
-            eval $CMD
-        done
+        return
     fi
+    local CMD CMDS
+    CMDS=$(%(active_var)s="$%(active_var)s" %(complete_func)s_exec "$@")
+    for CMD in $CMDS; do
+        %(script_lines_echo)s
+        %(script_lines_history)s
+        eval "$CMD"
+    done
 }
-%(complete_func)s() {
+%(script_complete_python)s
+"""
+COMPLETION_RECORDS = """
+%(command_name)s() {
     local IFS=$'\n'
-    COMPREPLY=( $( env COMP_WORDS="${COMP_WORDS[*]}" \\
-                   COMP_CWORD=$COMP_CWORD \\
-                   %(complete_var)s=complete \\
-                   %(script_path)s ) )
-    return 0
+    local FUNC=""
+    if [[ "$@" =~ (^| )--.* ]]; then
+        %(script_path)s "$@"
+        return
+    fi
+    %(complete_func)s_compiled "$@"
+    if [[ -n "$FUNC" ]]; then
+        $FUNC
+        return
+    fi
+    local CMD SCRIPT=""
+    local -a CMDS
+    mapfile -d '' -t CMDS < <(
+        %(active_var)s="$%(active_var)s" %(protocol_var)s=%(protocol_version)s \\
+            %(complete_func)s_exec "$@"
+    )
+    # Nothing to run if workenv reported an error instead
+    [[ "${CMDS[0]}" == %(protocol_header)s ]] || return 0
+    for CMD in "${CMDS[@]:1}"; do
+        %(script_records_echo)s
+        %(script_records_history)s
+        SCRIPT+="$CMD"$'\n'
+    done
+    eval "$SCRIPT"
+}
+%(complete_func)s_compiled_stale() {
+    local SOURCE
+    for SOURCE in "${_WORKENV_COMPILED_SOURCES[@]}"; do
+        [[ "$SOURCE" -nt %(compiled_path)s ]] && return 0
+    done
+    for SOURCE in "${_WORKENV_COMPILED_MISSING[@]}"; do
+        [[ -e "$SOURCE" ]] && return 0
+    done
+    return 1
 }
+%(complete_func)s_compiled() {
+    # Find the compiled function for the project and command, if there is one
+    [[ -f %(compiled_path)s && $# -ge 1 && $# -le 2 ]] || return
+    local HEADER
+    read -r HEADER < %(compiled_path)s
+    if [[ "$HEADER" != "$_WORKENV_COMPILED" ]]; then
+        source %(compiled_path)s || return
+    fi
+    if %(complete_func)s_compiled_stale; then
+        %(script_path)s --compile > /dev/null || return
+        source %(compiled_path)s || return
+    fi
+    local KEY="$1"
+    [[ $# -eq 2 ]] && KEY+=$'\t'"$2"
+    FUNC="${_WORKENV_FUNCTIONS[$KEY]}"
+}
+%(script_complete)s
+"""
+COMPLETION_SCRIPT_BASH = """
+%(complete_func)s_exec() {
+    %(script_server)s
+    %(script_path)s "$@"
+}
+if %(bash_records_test)s; then
+%(script_records)s
+else
+%(script_lines)s
+fi
 %(complete_func)s_setup() {
     local IFS=$' '
     local COMPLETION_OPTIONS=""
@@ -88,18 +240,113 @@ def split_arg_string(string):
     return rv
 
 
+def get_server_script():
+    """
+    Script to send requests to the server if it is running
+    """
+    import shlex
+
+    from .server import get_socket_path
+
+    socket_path = get_socket_path()
+    if socket_path is None:
+        return ""
+
+    return COMPLETION_SERVER % {
+        "socket_path": shlex.quote(str(socket_path)),
+        "python_path": shlex.quote(sys.executable),
+        "client_path": shlex.quote(str(Path(__file__).parent / "client.py")),
+    }
+
+
+def get_include_path(config_path):
+    return get_cache_path("completion", config_path, suffix="bash")
+
+
+def write_include(index):
+    """
+    Write the include file for native completion from a NameIndex
+    """
+    import shlex
+    import time
+
+    header = f"# workenv completion {time.time_ns()}"
+    sources = [path for path, sig in index.sources.items() if sig is not None]
+    missing = [path for path, sig in index.sources.items() if sig is None]
+    commands = []
+    for name, command_names in index.projects.items():
+        names = "\n".join(sorted(command_names))
+        commands.append(f"    [{shlex.quote(name)}]={shlex.quote(names)}")
+    lines = [
+        header,
+        f"_WORKENV_INCLUDE={shlex.quote(header)}",
+        f"_WORKENV_SOURCES=({' '.join(map(shlex.quote, sources))})",
+        f"_WORKENV_MISSING=({' '.join(map(shlex.quote, missing))})",
+        f"_WORKENV_PROJECTS=({' '.join(map(shlex.quote, index.sorted_projects))})",
+        "declare -gA _WORKENV_COMMANDS=(",
+        *commands,
+        ")",
+    ]
+    write_file(get_include_path(index.file), ("\n".join(lines) + "\n").encode())
+
+
+def get_compiled_script_path(config):
+    """
+    Path to the compiled functions, for the shell function to use if they exist
+    """
+    import shlex
+
+    from .compiler import get_compiled_path
+
+    if not config.file:
+        return "/dev/null/workenv"
+    return shlex.quote(str(get_compiled_path(config.file)))
+
+
 def get_completion_script(config, command_name):
-    return (
-        COMPLETION_SCRIPT_BASH
-        % {
-            "complete_func": f"_{command_name}_completion",
-            "command_name": command_name,
-            "script_path": get_script_path(),
-            "complete_var": COMPLETE_VAR,
-            "script_echo": COMPLETION_ECHO if config.verbose else "",
-            "script_history": COMPLETION_HISTORY if config.history else "",
-        }
-    ).strip() + ";"
+    complete_func = f"_{command_name}_completion"
+    values = {
+        "complete_func": complete_func,
+        "python_func": complete_func,
+        "command_name": command_name,
+        "script_path": get_script_path(),
+        "complete_var": COMPLETE_VAR,
+        "script_lines_echo": COMPLETION_LINES_ECHO if config.verbose else "",
+        "script_lines_history": COMPLETION_LINES_HISTORY if config.history else "",
+        "script_records_echo": COMPLETION_RECORDS_ECHO if config.verbose else "",
+        "script_records_history": (
+            COMPLETION_RECORDS_HISTORY if config.history else ""
+        ),
+        "script_server": get_server_script(),
+        "protocol_var": PROTOCOL_VAR,
+        "protocol_version": PROTOCOL_VERSION,
+        "protocol_header": PROTOCOL_HEADER,
+        "active_var": ACTIVE_VAR,
+        "compiled_path": get_compiled_script_path(config),
+        "bash_records_test": BASH_RECORDS_TEST,
+    }
+
+    if config.native_completion and config.file:
+        import shlex
+
+        # Keep the python completion function as a fallback
+        values["python_func"] = f"{complete_func}_python"
+        values["include_path"] = shlex.quote(str(get_include_path(config.file)))
+        values["script_native_fuzzy"] = (
+            COMPLETION_NATIVE_FUZZY % values if config.fuzzy_completion else ""
+        )
+        script_complete = COMPLETION_PYTHON % values + COMPLETION_NATIVE % values
+    else:
+        script_complete = COMPLETION_PYTHON % values
+
+    values["script_complete"] = script_complete
+    values["script_complete_python"] = COMPLETION_PYTHON % {
+        **values,
+        "python_func": complete_func,
+    }
+    values["script_records"] = COMPLETION_RECORDS % values
+    values["script_lines"] = COMPLETION_LINES % values
+    return (COMPLETION_SCRIPT_BASH % values).strip() + ";"
 
 
 def autocomplete(config):
@@ -109,16 +356,28 @@ def autocomplete(config):
 
     elif complete_var == "setup":
         command_name = os.environ.get(COMMAND_VAR)
-        return [get_completion_script(config, command_name)]
+        with profile.phase("autocomplete.setup"):
+            return [get_completion_script(config, command_name)]
 
     elif complete_var == "complete":
-        return get_completion_words(config)
+        with profile.phase("autocomplete.complete"):
+            return get_completion_words(config)
 
     else:
         raise ValueError(f"Unexpected value for env var {COMPLETE_VAR}: {complete_var}")
 
 
-def get_completion_words(config):
+def get_completion_words(names):
+    """
+    Find completions for the current word
+
+    The names can be provided by a Config or a NameIndex - anything with
+    get_sorted_project_names(), get_word_index(), get_command_names(project_name) and
+    fuzzy_completion.
+
+    Names are matched by prefix, in sorted order. If none match and fuzzy completion
+    is enabled, they are matched at word boundaries, best match first.
+    """
     if "COMP_WORDS" not in os.environ or "COMP_CWORD" not in os.environ:
         return None
 
@@ -132,22 +391,23 @@ def get_completion_words(config):
 
     if len(args) == 0:
         # Completing a project
-        completions = config.get_project_names()
+        completions = prefix_matches(names.get_sorted_project_names(), incomplete)
+        if not completions and incomplete and names.fuzzy_completion:
+            completions = names.get_word_index().match(incomplete)
     elif len(args) == 1:
-        project = config.projects.get(args[0])
-        if not project:
-            completions = []
-        completions = project.get_command_names()
+        command_names = sorted(names.get_command_names(args[0]))
+        completions = prefix_matches(command_names, incomplete)
+        if not completions and incomplete and names.fuzzy_completion:
+            completions = WordIndex.build(command_names).match(incomplete)
     else:
         return []
-
-    # Filter
-    return [
-        completion for completion in completions if completion.startswith(incomplete)
-    ]
+    return completions
 
 
 def install(command_name):
+    import datetime
+    import shutil
+
     # Find path to script
     script_path = get_script_path()
 
@@ -0,0 +1,140 @@
+"""
+Persistent cache of parsed config files
+
+Parsing yaml is the slowest part of loading a config, so the parsed data for each
+source file is stored as a snapshot under the cache dir, keyed on the file's mtime,
+size and inode. When any of those change, the snapshot is rebuilt.
+
+Cache files are written with marshal rather than pickle, as it is built in to the
+interpreter and so costs nothing to import; a cache file is only read by the python
+version which wrote it, and with the same version of its format.
+"""
+
+from __future__ import annotations
+
+import marshal
+import os
+import sys
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from .constants import CACHE_DIR_ENV_VAR, CACHE_DIRNAME
+
+# Increment when the snapshot format changes
+SNAPSHOT_VERSION = 1
+
+# Header for all cache files
+CACHE_HEADER = (marshal.version, sys.version_info[:2])
+
+Signature = Tuple[int, int, int]
+
+
+def get_cache_dir() -> Path:
+    """
+    Find the cache dir, following the XDG base directory spec
+    """
+    path_str = os.environ.get(CACHE_DIR_ENV_VAR)
+    if path_str:
+        return Path(path_str).expanduser()
+
+    xdg_cache = os.environ.get("XDG_CACHE_HOME") or "~/.cache"
+    return Path(xdg_cache).expanduser() / CACHE_DIRNAME
+
+
+def get_signature(path: Path) -> Optional[Signature]:
+    """
+    Return the (mtime, size, inode) signature of a file, or None if it is missing
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def get_cache_path(kind: str, path: Path, suffix: str = "cache") -> Path:
+    """
+    Return the path to the cache file of the given kind for a source file
+    """
+    key = str(path.absolute()).replace("%", "%25").replace("/", "%2F")
+    if len(key) > 200:
+        # Too long for a filename - only import hashlib when we need it
+        import hashlib
+
+        key = hashlib.sha1(key.encode()).hexdigest()
+    return get_cache_dir() / kind / f"{key}.{suffix}"
+
+
+def read_cache(path: Path, version: int) -> Any:
+    """
+    Read a cache file, returning None if it is missing, unreadable, or was written with
+    a different version of its format
+    """
+    try:
+        # Read it all at once - marshal.load() makes a read call for every object
+        header, data_version, data = marshal.loads(path.read_bytes())
+    except Exception:
+        # A corrupt or incompatible cache file is treated as missing
+        return None
+    if header != CACHE_HEADER or data_version != version:
+        return None
+    return data
+
+
+def write_file(path: Path, raw: bytes):
+    """
+    Atomically write a file to the cache dir, creating any missing dirs
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(raw)
+    os.replace(tmp_path, path)
+
+
+def write_cache(path: Path, version: int, data: Any):
+    """
+    Atomically write a cache file, with the version of its format
+
+    Failures are ignored - the cache is an optimisation, and a read-only cache dir or
+    data which can't be marshalled should not stop workenv from working.
+    """
+    try:
+        write_file(path, marshal.dumps((CACHE_HEADER, version, data)))
+    except (OSError, ValueError):
+        pass
+
+
+def hash_file(path: str) -> Optional[str]:
+    """
+    Return the sha1 of a file's contents, or None if it can't be read
+    """
+    import hashlib
+
+    try:
+        with open(path, "rb") as file:
+            return hashlib.sha1(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def load_yaml(path: Path) -> Any:
+    """
+    Load and parse a yaml file, using the snapshot from a previous parse if the file
+    has not changed since
+    """
+    signature = get_signature(path)
+    snapshot_path = get_cache_path("snapshots", path)
+    if signature is not None:
+        snapshot = read_cache(snapshot_path, SNAPSHOT_VERSION)
+        if snapshot is not None and snapshot[0] == signature:
+            return snapshot[1]
+
+    # Signature is taken before reading, so if the file changes while we're reading
+    # it, the snapshot will be rebuilt next time
+    from . import loader
+
+    raw = path.read_text()
+    data = loader.load(raw)
+    if signature is not None:
+        write_cache(snapshot_path, SNAPSHOT_VERSION, (signature, data))
+    return data
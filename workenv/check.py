@@ -0,0 +1,160 @@
+"""
+Check projects can be loaded
+
+``workenv --check`` builds every project and checks that the paths and source files
+it uses exist. Nearly all of the time is spent waiting on the filesystem, so deferred
+project and fragment files are read and parsed across a thread pool, and every path is
+collected up front and then checked in one concurrent batch.
+
+Projects are built on the main thread - loading a file writes its parsed snapshot to
+the cache, so by the time a project is built from it it is a cache hit.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .cache import load_yaml
+from .config import (
+    Command,
+    Config,
+    ConfigError,
+    DeferredProject,
+    Project,
+    resolve_path,
+)
+from .constants import MAX_WORKERS
+
+
+class ProjectReport(NamedTuple):
+    name: str
+    seconds: float
+    errors: List[str]
+
+
+# A path to check, as (description, path, must be a directory)
+Requirement = Tuple[str, str, bool]
+
+
+def describe_error(e: Exception) -> str:
+    if isinstance(e, ConfigError):
+        return e.message
+    return str(e)
+
+
+def prefetch(file: Path) -> float:
+    """
+    Read and parse a deferred project or fragment file
+
+    Returns the time taken. Errors are ignored here, and raised again when the project
+    is built.
+    """
+    start = time.perf_counter()
+    try:
+        load_yaml(file)
+    except Exception:
+        pass
+    return time.perf_counter() - start
+
+
+def label(prefix: str, name: str) -> str:
+    if prefix:
+        return f"{prefix}{name}"
+    return name.capitalize()
+
+
+def get_requirements(project: Project) -> List[Requirement]:
+    """
+    Collect the paths and source files used by a project and its commands
+    """
+    requirements: List[Requirement] = []
+    seen = set()
+
+    commands: List[Tuple[str, Command]] = [("", project)]
+    for command_name in project.get_command_names():
+        commands.append((f"Command {command_name} ", project.get_command(command_name)))
+
+    for prefix, command in commands:
+        cwd = None
+        if command.path:
+            cwd = resolve_path(command.replace_values(str(command.path)), None)
+            if cwd is not None and cwd not in seen:
+                seen.add(cwd)
+                requirements.append((label(prefix, "path"), cwd, True))
+
+        for source in command.source:
+            path = resolve_path(command.replace_values(source), cwd)
+            if path is not None and path not in seen:
+                seen.add(path)
+                requirements.append((label(prefix, "source"), path, False))
+    return requirements
+
+
+def stat_path(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def check_config(config: Config, max_workers: int = MAX_WORKERS) -> List[ProjectReport]:
+    """
+    Build every project and check the paths they use exist
+    """
+    names = config.get_project_names()
+    timings: Dict[str, float] = {name: 0.0 for name in names}
+    errors: Dict[str, List[str]] = {name: [] for name in names}
+    requirements: Dict[str, List[Requirement]] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Parse fragments in the pool, so building their projects reads the snapshots
+        fragment_files = [f.file for f in config.fragments if not f.is_loaded()]
+        list(pool.map(prefetch, fragment_files))
+
+        projects = {}
+        for name in names:
+            start = time.perf_counter()
+            try:
+                projects[name] = config.projects[name]
+            except Exception as e:
+                errors[name].append(f"Could not load project: {describe_error(e)}")
+            timings[name] += time.perf_counter() - start
+
+        deferred = {
+            name: project
+            for name, project in projects.items()
+            if isinstance(project, DeferredProject)
+        }
+        deferred_files = [project.file for project in deferred.values()]
+        for name, seconds in zip(deferred, pool.map(prefetch, deferred_files)):
+            timings[name] += seconds
+
+        for name, project in projects.items():
+            start = time.perf_counter()
+            try:
+                if isinstance(project, DeferredProject):
+                    project = project.project
+                requirements[name] = get_requirements(project)
+            except Exception as e:
+                errors[name].append(f"Could not load project: {describe_error(e)}")
+            timings[name] += time.perf_counter() - start
+
+        paths = list(
+            {path for required in requirements.values() for _, path, _ in required}
+        )
+        stats = dict(zip(paths, pool.map(stat_path, paths)))
+
+    for name, required in requirements.items():
+        for description, path, is_dir in required:
+            result = stats[path]
+            if result is None:
+                errors[name].append(f"{description} {path} not found")
+            elif is_dir and not stat.S_ISDIR(result.st_mode):
+                errors[name].append(f"{description} {path} is not a directory")
+
+    return [ProjectReport(name, timings[name], errors[name]) for name in names]
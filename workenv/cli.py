@@ -1,16 +1,29 @@
 """
 Command line definition
+
+This is on the path of every command and tab press, so keep imports light - see
+tests/test_imports.py
 """
 
 import os
 import sys
 from pathlib import Path
 
-from .actions import registry as action_registry
-from .bash import autocomplete
+from . import profile
+from .bash import autocomplete, get_completion_words, write_include
 from .config import Config, ConfigError
-from .constants import COMMAND_VAR, CONFIG_DEFAULT_FILENAME, CONFIG_ENV_VAR
-from .io import echo, error
+from .constants import (
+    COMMAND_VAR,
+    COMPLETE_VAR,
+    CONFIG_DEFAULT_FILENAME,
+    CONFIG_ENV_VAR,
+    CURRENT_PROJECT,
+    PROTOCOL_HEADER,
+    PROTOCOL_VAR,
+    PROTOCOL_VERSION,
+)
+from .index import load_index
+from .io import echo, echo_records, error
 
 
 def get_config_path() -> Path:
@@ -18,13 +31,91 @@ def get_config_path() -> Path:
     return Path(path_str).expanduser()
 
 
+def complete(config_path: Path) -> bool:
+    """
+    Fast path for tab completion, using the name index instead of the config
+
+    Returns True if the completion request was handled
+    """
+    try:
+        with profile.phase("index.load"):
+            index = load_index(config_path)
+    except ConfigError as e:
+        error(f"Could not load config: {e.message}")
+        return True
+
+    completions = get_completion_words(index)
+    if completions is None:
+        return False
+
+    for completion in completions:
+        echo(completion)
+    return True
+
+
+def current(config_path: Path):
+    """
+    Fast path for --current, to print the project for the current dir using the index
+
+    This is intended for prompts, so exits with status 1 rather than printing an error
+    if there is no project.
+    """
+    try:
+        index = load_index(config_path)
+    except ConfigError as e:
+        error(f"Could not load config: {e.message}")
+        sys.exit(1)
+
+    project_name = index.find_project(os.getcwd())
+    if project_name is None:
+        sys.exit(1)
+    echo(project_name)
+
+
 def run():
+    profile.start()
+    try:
+        run_command()
+    finally:
+        profile.report(sys.argv[1:])
+
+
+def run_command():
+    config_path = get_config_path()
+    complete_var = os.environ.get(COMPLETE_VAR)
+    if complete_var == "complete" and complete(config_path):
+        return
+
+    if complete_var == "include":
+        # Write the include file for native completion
+        try:
+            write_include(load_index(config_path))
+        except ConfigError as e:
+            error(f"Could not load config: {e.message}")
+            sys.exit(1)
+        except OSError as e:
+            error(f"Could not write completion include: {e}")
+            sys.exit(1)
+        return
+
+    if sys.argv[1:] == ["--current"]:
+        current(config_path)
+        return
+
     try:
-        config = Config(file=get_config_path())
+        with profile.phase("config.load"):
+            config = Config(file=config_path)
     except ConfigError as e:
         error(f"Could not load config: {e.message}")
         return
 
+    handle(config)
+
+
+def handle(config: Config):
+    """
+    Handle the command line request using a loaded config
+    """
     completions = autocomplete(config)
     if completions is not None:
         for completion in completions:
@@ -34,13 +125,16 @@ def run():
     args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
     actions = [action[2:] for action in sys.argv[1:] if action.startswith("--")]
 
-    if len(actions) > 1 or (len(actions) == 0 and len(args) == 0) or len(args) > 2:
+    # Actions check their own arguments
+    if len(actions) > 1 or (len(actions) == 0 and len(args) not in (1, 2)):
         command_name = os.environ.get(COMMAND_VAR, "we")
         error(f"Usage: {command_name} <project> [<command>]")
         error(f"Usage: {command_name} <action> [<project> [<command>]]")
         return
 
     if actions:
+        from .actions import registry as action_registry
+
         action = actions[0].lower()
         if action in action_registry:
             action_registry[action](config, actions, args)
@@ -50,25 +144,37 @@ def run():
         return
 
     project_name = args[0]
+    if project_name == CURRENT_PROJECT and config.file:
+        found = load_index(config.file, config).find_project(os.getcwd())
+        if found is None:
+            error("No project found for the current dir")
+            return
+        project_name = found
     if project_name not in config.projects:
         error(f"Unknown project {project_name}")
         return
-    project = config.projects[project_name]
+    try:
+        project = config.projects[project_name]
+    except ConfigError as e:
+        error(f"Could not load project {project_name}: {e.message}")
+        return
 
     if len(args) == 2:
         command_name = args[1]
         if command_name not in project.commands:
             error(f"Unknown command {command_name} for {project_name}")
             return
-        command = project.commands[command_name]
-
-        # If command is common, we need to change its context
-        if command.parent != project:
-            command = command.clone_to(project)
-
-        shell_cmds = command()
+        command = project.get_command(command_name)
     else:
-        shell_cmds = project()
+        command = project
 
-    for shell_cmd in shell_cmds:
-        echo(shell_cmd)
+    with profile.phase("render"):
+        shell_cmds = list(command())
+
+    with profile.phase("echo"):
+        if os.environ.get(PROTOCOL_VAR) == PROTOCOL_VERSION:
+            echo_records(PROTOCOL_HEADER, shell_cmds)
+        else:
+            # Original protocol, for shell functions installed by older versions
+            for shell_cmd in shell_cmds:
+                echo(shell_cmd)
@@ -0,0 +1,67 @@
+"""
+Minimal client for the workenv server
+
+The shell function runs this as a standalone script with ``python -I -S`` so that it
+starts as quickly as possible. It must not import anything from workenv, and should
+only use fast imports from the standard library.
+
+Exits with FALLBACK if the server could not handle the request, so the shell function
+knows to run workenv normally.
+"""
+
+import json
+import os
+import socket
+import sys
+
+# Exit code to tell the shell function to fall back to running workenv normally
+FALLBACK = 75
+
+# Env vars used by the command line - see constants.py and bash.py
+FORWARD_ENV = [
+    "WORKENV_CONFIG_PATH",
+    "_WORKENV_COMMAND",
+    "_WORKENV_COMPLETE",
+    "_WORKENV_PROTOCOL",
+    "COMP_WORDS",
+    "COMP_CWORD",
+]
+
+
+def request(socket_path, argv, env):
+    """
+    Send a request to the server and return the decoded response
+    """
+    data = json.dumps({"argv": argv, "env": env}).encode() + b"\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(data)
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+def main(argv):
+    if len(argv) < 2:
+        return FALLBACK
+    socket_path = argv[1]
+    env = {key: os.environ[key] for key in FORWARD_ENV if key in os.environ}
+    try:
+        response = request(socket_path, argv[2:], env)
+    except (OSError, ValueError):
+        return FALLBACK
+
+    if response.get("status") != "ok":
+        return FALLBACK
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
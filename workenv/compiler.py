@@ -0,0 +1,139 @@
+"""
+Compile projects into bash functions
+
+``workenv --compile`` renders every project and project command into a file of bash
+functions in the cache dir. Once that exists, the ``we`` shell function sources it and
+calls the functions directly, so switching project doesn't need to start python.
+
+The file records the config files it was built from, and the shell function compiles
+it again before use if any of them are newer than it. Anything which can't be compiled
+is left out, so the shell function falls back to running workenv for it - as are
+commands which use environment snapshots or ``run_if_changed`` steps, which need their
+input files checking, and everything if incremental switching is on, as that depends
+on the shell's state.
+"""
+
+from __future__ import annotations
+
+import shlex
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from .cache import get_cache_path, get_signature, write_file
+from .config import Config
+
+FUNCTION_PREFIX = "_workenv_fn_"
+
+# Separates project and command names in the function lookup
+KEY_SEPARATOR = "\t"
+
+COMPILED_ECHO = """
+        echo "\\$ $CMD"
+"""
+COMPILED_HISTORY = """
+        history -s "$CMD"
+"""
+COMPILED_RUN = """
+_workenv_compiled_run() {
+    local CMD
+    for CMD in "$@"; do
+        %(script_echo)s
+        %(script_history)s
+        eval "$CMD"
+    done
+}
+"""
+
+
+def get_compiled_path(config_path: Path) -> Path:
+    return get_cache_path("compiled", config_path, suffix="bash")
+
+
+def get_entries(config: Config) -> List[Tuple[str, List[str]]]:
+    """
+    Render each project and project command
+
+    Returns a list of (key, shell commands)
+    """
+    entries: List[Tuple[str, List[str]]] = []
+    if config.incremental:
+        # Switching depends on what the shell has active, so is left to workenv
+        return entries
+
+    for name in config.get_project_names():
+        try:
+            project = config.projects[name]
+            project_entries = []
+            commands = [(name, project)] + [
+                (
+                    f"{name}{KEY_SEPARATOR}{command_name}",
+                    project.get_command(command_name),
+                )
+                for command_name in project.get_command_names()
+            ]
+            for key, command in commands:
+                # Snapshots and run_if_changed steps depend on files outside the
+                # config, so are left to workenv
+                if not command.depends_on_files():
+                    project_entries.append((key, list(command())))
+        except Exception:
+            # Leave it for workenv to report the error when it is used
+            continue
+        entries.extend(project_entries)
+    return entries
+
+
+def compile_config(config: Config) -> str:
+    """
+    Render the config into a bash script of functions
+    """
+    if config.file is None:
+        raise ValueError("Cannot compile a config without a file")
+
+    sources = config.get_source_files()
+    for name in config.get_project_names():
+        try:
+            sources.extend(config.projects[name].get_source_files())
+        except Exception:
+            continue
+    existing = [str(path) for path in sources if get_signature(path) is not None]
+    missing = [str(path) for path in sources if str(path) not in existing]
+
+    entries = get_entries(config)
+
+    header = f"# workenv compiled {time.time_ns()}"
+    lines = [
+        header,
+        f"_WORKENV_COMPILED={shlex.quote(header)}",
+        f"_WORKENV_COMPILED_SOURCES=({' '.join(map(shlex.quote, existing))})",
+        f"_WORKENV_COMPILED_MISSING=({' '.join(map(shlex.quote, missing))})",
+        (
+            COMPILED_RUN
+            % {
+                "script_echo": COMPILED_ECHO if config.verbose else "",
+                "script_history": COMPILED_HISTORY if config.history else "",
+            }
+        ).strip(),
+        "declare -gA _WORKENV_FUNCTIONS=(",
+    ]
+    lines.extend(
+        f"    [{shlex.quote(key)}]={FUNCTION_PREFIX}{i}"
+        for i, (key, _) in enumerate(entries)
+    )
+    lines.append(")")
+    for i, (_, shell_cmds) in enumerate(entries):
+        args = " ".join(shlex.quote(shell_cmd) for shell_cmd in shell_cmds)
+        lines.append(f"{FUNCTION_PREFIX}{i}() {{ _workenv_compiled_run {args}; }}")
+    return "\n".join(lines) + "\n"
+
+
+def write_compiled(config: Config) -> Path:
+    """
+    Compile the config and write it to the cache dir
+    """
+    if config.file is None:
+        raise ValueError("Cannot compile a config without a file")
+    path = get_compiled_path(config.file)
+    write_file(path, compile_config(config).encode())
+    return path
@@ -4,24 +4,158 @@ Config loader
 
 from __future__ import annotations
 
+import os
 import re
-import unicodedata
+import shlex
+from collections.abc import MutableMapping
 from functools import cached_property
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Type, TypeVar
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar, Union, cast
 
-import yaml
-
-from .constants import PROJECT_DEFAULT_FILENAME
+from . import profile
+from .cache import Signature, get_signature, load_yaml
+from .constants import ACTIVE_VAR, PROJECT_DEFAULT_FILENAME
+from .fragments import Fragment, get_fragments_dir, list_fragment_files, scan_fragments
+from .index import NameIndex
+from .matching import WordIndex
+from .needs import find_cycle
+from .template import compile_template, slugify
 
 CommandType = TypeVar("CommandType", bound="Command")
 ProjectType = TypeVar("ProjectType", bound="Project")
 
+# Deprecated - templates are now parsed by template.compile_template()
 var_pattern = re.compile(r"\{\{\s*project\.([a-z]+)\s*\}\}")
 
+# A step in a run list - a command, or a dict defining a group of parallel jobs or a
+# command to run when its inputs change
+RunStep = Union[str, Dict[str, Any]]
+
+# Wait for the jobs of a parallel group, exiting with the status of the last to fail.
+# The pids are kept in an array, as the shell function changes IFS
+PARALLEL_WAIT = (
+    'status=0; for pid in "${pids[@]}"; do wait "$pid" || status=$?; done;'
+    " exit $status"
+)
+
 
 class ConfigError(Exception):
-    pass
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def is_command_list(value: Any) -> bool:
+    """
+    Check a value is a command or a list of commands
+    """
+    commands = value if isinstance(value, list) else [value]
+    return all(isinstance(command, str) for command in commands)
+
+
+def parse_run(name: str, value: Any) -> List[RunStep]:
+    """
+    Check a run value is a command, a parallel group, a run_if_changed step, or a list
+    of them
+    """
+    steps = [value] if isinstance(value, (str, dict)) else list(value)
+    for step in steps:
+        if isinstance(step, str):
+            continue
+        if isinstance(step, dict) and "run_if_changed" in step:
+            if (
+                not set(step) <= {"run_if_changed", "inputs"}
+                or not is_command_list(step["run_if_changed"])
+                or not is_command_list(step.get("inputs", []))
+            ):
+                raise ConfigError(
+                    f"Unexpected run_if_changed step in {name} - expected a command"
+                    " or list of commands, and a list of inputs"
+                )
+            continue
+        if (
+            not isinstance(step, dict)
+            or not isinstance(step.get("parallel"), list)
+            or not set(step) <= {"parallel", "wait"}
+            or not isinstance(step.get("wait", True), bool)
+        ):
+            raise ConfigError(
+                f"Unexpected run step in {name} - expected a command, a parallel"
+                " group or a run_if_changed step"
+            )
+        for job in step["parallel"]:
+            if not is_command_list(job):
+                raise ConfigError(
+                    f"Unexpected parallel job in {name} - expected a command or a"
+                    " list of commands"
+                )
+    return steps
+
+
+def parse_needs(name: str, value: Any) -> List[str]:
+    """
+    Check a needs value is a command name or a list of them
+    """
+    needs = [value] if isinstance(value, str) else value
+    if not isinstance(needs, list) or not all(isinstance(n, str) for n in needs):
+        raise ConfigError(
+            f"Unexpected needs in {name} - expected a command name or a list of"
+            " command names"
+        )
+    return list(needs)
+
+
+def check_needs(name: str, graph: Dict[str, List[str]], needs: List[str]):
+    """
+    Check the commands in a project's graph of needs exist and don't need each other
+
+    The project's own needs are checked too - nothing can need the project itself, so
+    it can't be part of a cycle.
+    """
+    for command_name, command_needs in [(name, needs), *graph.items()]:
+        for need in command_needs:
+            if need not in graph:
+                raise ConfigError(
+                    f"Unknown command {need} needed by {command_name} in {name}"
+                )
+    cycle = find_cycle(graph)
+    if cycle:
+        raise ConfigError(f"Commands in {name} need each other: {' -> '.join(cycle)}")
+
+
+def resolve_path(value: str, cwd: Optional[str]) -> Optional[str]:
+    """
+    Resolve a rendered path as the shell would, or None if it can't be known here
+    """
+    value = os.path.expanduser(os.path.expandvars(value))
+    if "$" in value or "`" in value:
+        return None
+    if not os.path.isabs(value):
+        if cwd is None:
+            return None
+        value = os.path.join(cwd, value)
+    return value
+
+
+def resolved(fn):
+    """
+    Property which caches its value on the object until the config changes
+
+    The value is shared between calls, so callers must not modify it.
+    """
+    name = fn.__name__
+
+    def get(self):
+        generation = self.config.generation
+        cached = self._resolved.get(name)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        value = fn(self)
+        self._resolved[name] = (generation, value)
+        return value
+
+    get.__doc__ = fn.__doc__
+    return property(get)
 
 
 class Command:
@@ -30,9 +164,14 @@ class Command:
     _path: Optional[Path]
     _source: List[str]
     _env: Dict[str, str]
-    _run: List[str]
+    _run: List[RunStep]
+    _needs: List[str]
     parent: Optional[Command]
-    _replacements: Optional[Dict[str, str]]
+    _slug: Optional[str]
+    _resolved: Dict[str, Tuple[int, Any]]
+
+    # True or a list of files to watch to snapshot the environment, None to inherit
+    _snapshot: bool | List[str] | None
 
     def __init__(
         self,
@@ -41,8 +180,10 @@ class Command:
         path: Optional[Path],
         source: List[str],
         env: Dict[str, str],
-        run: List[str],
+        run: List[RunStep],
         parent: Optional[Command],
+        snapshot: bool | List[str] | None = None,
+        needs: Optional[List[str]] = None,
     ):
         self.config = config
         self.name = name
@@ -51,7 +192,10 @@ class Command:
         self._env = env
         self._run = run
         self.parent = parent
-        self._replacements = None
+        self._snapshot = snapshot
+        self._needs = needs or []
+        self._slug = None
+        self._resolved = {}
 
     @classmethod
     def from_dict(
@@ -76,12 +220,20 @@ class Command:
         if "env" in data:
             env.update(data["env"])
 
-        run: List[str] = []
+        run: List[RunStep] = []
         if "run" in data:
-            if isinstance(data["run"], str):
-                run.append(data["run"])
-            else:
-                run.extend(data["run"])
+            run.extend(parse_run(name, data["run"]))
+
+        snapshot = data.get("snapshot")
+        if snapshot is not None and not isinstance(snapshot, (bool, list)):
+            raise ConfigError(
+                f"Unexpected snapshot in {name} - expected true or a list of files,"
+                f" but found {type(snapshot).__name__}"
+            )
+
+        needs: List[str] = []
+        if "needs" in data:
+            needs = parse_needs(name, data["needs"])
 
         command = cls(
             config=config,
@@ -91,6 +243,8 @@ class Command:
             env=env,
             run=run,
             parent=parent,
+            snapshot=snapshot,
+            needs=needs,
         )
         return command
 
@@ -98,10 +252,46 @@ class Command:
         """
         Generate list of commands to run
         """
+        if self.needs:
+            from .needs import render_needs
+
+            yield from render_needs(self)
+
+        if not self.config.incremental:
+            yield from self.render()
+        elif self.snapshot is None:
+            from .incremental import render_incremental
+
+            yield from render_incremental(self)
+        else:
+            from .incremental import get_active_state, render_restore
+
+            # The snapshot's changes aren't known, so the next switch starts afresh
+            yield from render_restore(get_active_state().get("env", {}))
+            yield from self.render()
+            yield f"unset {ACTIVE_VAR}"
+
+    def render(self):
+        """
+        Generate the commands to change to the path and run the steps, without
+        running the commands this needs
+        """
+        path = None
         if self.path:
             path = self.replace_values(str(self.path))
             yield f"cd {path}"
 
+        if self.snapshot is not None:
+            from .snapshot import get_snapshot
+
+            yield from get_snapshot(self, path)
+        else:
+            yield from self.get_steps()
+
+    def get_steps(self):
+        """
+        Generate the commands to run after changing to the path
+        """
         for source in self.source:
             source = self.replace_values(source)
             yield f"source {source}"
@@ -110,32 +300,112 @@ class Command:
             val = self.replace_values(val)
             yield f"export {key}={val}"
 
+        yield from self.get_run_steps()
+
+    def get_run_steps(self):
+        """
+        Generate the commands for the run steps
+        """
+        cwd: Optional[str] = None
         for run in self.run:
-            run = self.replace_values(run)
-            yield run
+            if isinstance(run, str):
+                yield self.replace_values(run)
+            elif "run_if_changed" in run:
+                from .inputs import render_if_changed
+
+                if cwd is None and self.path:
+                    cwd = resolve_path(self.replace_values(str(self.path)), None)
+                rendered = render_if_changed(self, run, cwd)
+                if rendered is not None:
+                    yield rendered
+            else:
+                yield self.render_parallel(run)
 
-    @property
-    def replacements(self):
+    def render_parallel(self, group: Dict[str, Any]) -> str:
         """
-        Get data for variable replacement
+        Render a parallel group as background jobs
+
+        Unless the group sets ``wait: false``, the jobs run in a subshell which waits
+        for them all to finish, and fails if any of them fail.
         """
-        if not self._replacements:
-            self._replacements = dict(
-                name=self.get_project_name(),
-                slug=self.get_project_slug(),
+        jobs = []
+        for job in group["parallel"]:
+            commands = job if isinstance(job, list) else [job]
+            jobs.append(
+                [self.render_eval(self.replace_values(command)) for command in commands]
             )
-        return self._replacements
+        return self.render_jobs(jobs, wait=group.get("wait", True))
+
+    @staticmethod
+    def render_eval(command: str) -> str:
+        """
+        Render a command to be parsed on its own, so it can share a line with others
+        even if it has a comment or a heredoc
+        """
+        if "\n" not in command:
+            return f"eval {shlex.quote(command)}"
+
+        # Keep it on one line, so it works with the protocol of one command per line
+        escaped = command.replace("\\", "\\\\").replace("'", "\\'")
+        escaped = escaped.replace("\n", "\\n")
+        return f"eval $'{escaped}'"
+
+    @staticmethod
+    def render_jobs(jobs: List[List[str]], wait: bool) -> str:
+        """
+        Render lists of rendered commands as background jobs
+        """
+        rendered = []
+        for commands in jobs:
+            job = "; ".join(commands)
+            rendered.append(f"{{ {job}; }} &" + (" pids+=($!);" if wait else ""))
+        background = " ".join(rendered)
+        if not wait:
+            return background
+        return f"( pids=(); {background} {PARALLEL_WAIT} )"
+
+    @resolved
+    def replacements(self) -> Dict[str, str]:
+        """
+        Get data for variable replacement
+        """
+        project = self.parent or self
+        context = {
+            "project.name": self.get_project_name(),
+            "project.slug": self.get_project_slug(),
+            "command.name": self.name,
+        }
+        path = project.path
+        context["project.path"] = (
+            compile_template(str(path)).render(context) if path else ""
+        )
+        return context
+
+    @resolved
+    def _rendered(self) -> Dict[str, str]:
+        """
+        Cache of rendered template values
+        """
+        return {}
 
     def replace_values(self, value: str):
         """
         Replace template values
         """
-        # This currently uses a naive regex which doesn't support escaping
-        # If this ever causes problems we can switch it for a proper parser
-        value = var_pattern.sub(
-            lambda matchobj: self.replacements.get(matchobj.group(1), ""), value
-        )
-        return value
+        rendered = self._rendered
+        try:
+            return rendered[value]
+        except KeyError:
+            pass
+        if profile.enabled:
+            profile.count("templates_rendered")
+        template = compile_template(value)
+        if template.static is not None:
+            result = template.static
+        else:
+            result = template.render(self.replacements)
+        rendered[value] = result
+        return result
 
     def to_dict(self):
         data = {}
@@ -147,6 +417,12 @@ class Command:
             if len(val) > 0:
                 data[attr] = val
 
+        if self._snapshot is not None:
+            data["snapshot"] = self._snapshot
+
+        if self._needs:
+            data["needs"] = self._needs
+
         return data
 
     def get_project_name(self):
@@ -155,17 +431,10 @@ class Command:
         return self.name
 
     def get_project_slug(self):
-        # Based on Django's slugify()
-        name = self.get_project_name()
-
-        slug = (
-            unicodedata.normalize("NFKD", name)
-            .encode("ascii", "ignore")
-            .decode("ascii")
-        )
-        slug = re.sub(r"[^\w\s-]", "", slug.lower())
-        slug = re.sub(r"[-\s]+", "-", slug).strip("-_")
-        return slug
+        project = self.parent or self
+        if project._slug is None:
+            project._slug = slugify(project.name)
+        return project._slug
 
     def clone_to(self, parent: Command) -> Command:
         clone = self.from_dict(
@@ -180,6 +449,41 @@ class Command:
         return self._path
 
     @property
+    def snapshot(self) -> Optional[List[str]]:
+        """
+        Extra files to watch if the environment is snapshotted, or None if it isn't
+
+        Inherits from the parent if not set.
+        """
+        if self._snapshot is None:
+            return self.parent.snapshot if self.parent else None
+        if self._snapshot is True:
+            return []
+        return self._snapshot or None
+
+    def depends_on_files(self) -> bool:
+        """
+        Check if the commands depend on files outside the config, so can change
+        without the config changing
+        """
+        if self.snapshot is not None or any(
+            isinstance(run, dict) and "run_if_changed" in run for run in self.run
+        ):
+            return True
+        # A command's parent is always a project
+        project = cast("Project", self.parent or self)
+        return any(project.get_command(name).depends_on_files() for name in self.needs)
+
+    @property
+    def needs(self) -> List[str]:
+        """
+        Names of the commands in the project to run first
+
+        These are not inherited.
+        """
+        return self._needs
+
+    @resolved
     def source(self):
         """
         Inherit from parent if source and path not set
@@ -194,7 +498,7 @@ class Command:
 
         return common + self._source
 
-    @property
+    @resolved
     def env(self):
         data = {}
         if self.config.common_project:
@@ -206,7 +510,7 @@ class Command:
             data.update(self._env)
         return data
 
-    @property
+    @resolved
     def run(self):
         common = []
         if self.config.common_project:
@@ -241,18 +545,24 @@ class Project(Command):
                 if cmd_data is None:
                     cmd_data = {}
 
-                # Create command
+                # Create command - the project is new, so nothing needs invalidating
                 command = Command.from_dict(
                     config=config, name=cmd_name, data=cmd_data, parent=project
                 )
-                project.add_command(cmd_name, command)
+                project._commands[cmd_name] = command
+
+        # Common commands can need commands which are defined by each project
+        if not isinstance(project, Common) and (
+            project.needs or any(cmd.needs for cmd in project.commands.values())
+        ):
+            check_needs(name, project.get_needs_graph(), project.needs)
         return project
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._commands = {}
 
-    @property
+    @resolved
     def commands(self) -> Dict[str, Command]:
         cmds: Dict[str, Command] = {}
         if self.config.common_project:
@@ -262,10 +572,45 @@ class Project(Command):
 
     def add_command(self: Project, name: str, command: Command):
         self._commands[name] = command
+        self.config.invalidate()
 
     def get_command_names(self):
         return list(self.commands.keys())
 
+    def get_needs_graph(self) -> Dict[str, List[str]]:
+        """
+        Names of the project's commands, and the commands they need
+        """
+        return {name: command.needs for name, command in self.commands.items()}
+
+    def get_command(self, name: str) -> Command:
+        """
+        Get a command in the context of this project
+        """
+        command = self.commands[name]
+
+        # If command is common, we need to change its context
+        if command.parent is not self:
+            command = command.clone_to(self)
+        return command
+
+    def get_source_files(self) -> List[Path]:
+        """
+        Files other than the main config which this project was loaded from
+        """
+        return []
+
+    def get_dir(self) -> Optional[str]:
+        """
+        Real path of the project's dir, or None if it can't be known without a shell
+        """
+        if not self.path:
+            return None
+        path = resolve_path(self.replace_values(str(self.path)), None)
+        if path is None:
+            return None
+        return os.path.realpath(path)
+
     def to_dict(self):
         data = super().to_dict()
         if self._commands:
@@ -316,24 +661,57 @@ class DeferredProject:
     def name(self):
         return self._name
 
+    @property
+    def file(self) -> Path:
+        if self._path.is_dir():
+            return self._path / PROJECT_DEFAULT_FILENAME
+        return self._path
+
     def to_dict(self):
         data = {"config": str(self._path_str)}
         return data
 
+    def get_source_files(self) -> List[Path]:
+        return [self.file]
+
+    def get_dir(self) -> Optional[str]:
+        # Always the dir of the project file, so there's no need to load it
+        path = resolve_path(str(self.file.parent), os.getcwd())
+        if path is None:
+            return None
+        return os.path.realpath(path)
+
     @cached_property
     def project(self):
-        if self._path.is_dir():
-            self._path /= PROJECT_DEFAULT_FILENAME
-        raw = self._path.read_text()
-        data = yaml.safe_load(raw)
-        data["path"] = str(self._path.parent)
-        project = Project.from_dict(
-            config=self._config,
-            name=self._name,
-            data=data,
-        )
+        with profile.phase("deferred.load"):
+            file = self.file
+            self._signature = get_signature(file)
+            data = load_yaml(file)
+            data["path"] = str(file.parent)
+            project = Project.from_dict(
+                config=self._config,
+                name=self._name,
+                data=data,
+            )
         return project
 
+    def is_loaded(self) -> bool:
+        return "project" in self.__dict__
+
+    def is_current(self) -> bool:
+        """
+        Check the project file has not changed since it was loaded
+        """
+        if not self.is_loaded():
+            return True
+        return get_signature(self.file) == self.__dict__["_signature"]
+
+    def reload(self):
+        """
+        Discard the loaded project so it is loaded again on next access
+        """
+        self.__dict__.pop("project", None)
+
     def __getattr__(self, attr):
         return getattr(object.__getattribute__(self, "project"), attr)
 
@@ -341,40 +719,199 @@ class DeferredProject:
         return self.project()
 
 
+class ProjectMap(MutableMapping):
+    """
+    Dict of projects which keeps the raw data for each project, and only builds the
+    Project or DeferredProject when it is first accessed
+
+    Projects in config fragments are added by name, and their fragment is only parsed
+    when one of them is built.
+    """
+
+    config: Config
+    _projects: Dict[str, Optional[Project | DeferredProject]]
+    _raw: Dict[str, Dict[str, Any]]
+
+    # Projects defined in fragments, and the fragment which owns them
+    _fragments: Dict[str, Fragment]
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._projects = {}
+        self._raw = {}
+        self._fragments = {}
+
+    def set_raw(self, name: str, data: Dict[str, Any]):
+        """
+        Add a project by its raw data, to be built on first access
+        """
+        self._projects[name] = None
+        self._raw[name] = data
+
+    def set_fragment(self, name: str, fragment: Fragment):
+        """
+        Add a project defined in a fragment, to be loaded on first access
+        """
+        self._projects[name] = None
+        self._fragments[name] = fragment
+
+    def get_fragment(self, name: str) -> Optional[Fragment]:
+        """
+        Return the fragment which owns a project, or None if it is in the main file
+        """
+        return self._fragments.get(name)
+
+    def built(self) -> List[Project | DeferredProject]:
+        """
+        Return the projects which have been built so far
+        """
+        return [project for project in self._projects.values() if project is not None]
+
+    def __getitem__(self, name: str) -> Project | DeferredProject:
+        project = self._projects[name]
+        if project is None:
+            if profile.enabled:
+                profile.count("projects_built")
+            if name in self._raw:
+                data = self._raw[name]
+            else:
+                data = self.load_fragment_data(name)
+            project = self.config.build_project(name, data)
+            self._projects[name] = project
+            # Only discard the raw data once built, so a failed build raises again
+            self._raw.pop(name, None)
+        return project
+
+    def load_fragment_data(self, name: str) -> Dict[str, Any]:
+        fragment = self._fragments[name]
+        fragment_data = fragment.load()
+        if name not in fragment_data:
+            raise ConfigError(f"Project {name} not found in {fragment.file}")
+        return fragment_data[name] or {}
+
+    def __setitem__(self, name: str, project: Project | DeferredProject):
+        self._projects[name] = project
+        self._raw.pop(name, None)
+        self.config.invalidate()
+
+    def __delitem__(self, name: str):
+        del self._projects[name]
+        self._raw.pop(name, None)
+        self._fragments.pop(name, None)
+        self.config.invalidate()
+
+    def __contains__(self, name: object) -> bool:
+        # Don't build the project just to check it exists
+        return name in self._projects
+
+    def __iter__(self):
+        return iter(self._projects)
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+
 class Config:
     file: Optional[Path]
-    projects: Dict[str, Project | DeferredProject]
+    projects: ProjectMap
     common_project: Optional[Project]
+    fragments: List[Fragment]
+
+    # Incremented whenever the config changes, to invalidate resolved values
+    generation: int
+
+    # State of the file when last loaded or saved, to find what needs saving
+    _saved_signature: Optional[Signature]
+    _saved_data: Optional[Dict[Any, Any]]
+    _saved_settings: Optional[Dict[str, Any]]
+    _saved_common: Optional[Dict[str, Any]]
+
+    # Names for completion, cached with the generation they were built for
+    _sorted_names: Optional[Tuple[int, List[str]]]
+    _word_index: Optional[Tuple[int, WordIndex]]
 
     # Config variables
     verbose = False
     history = False
+    native_completion = False
+    fuzzy_completion = False
+    incremental = False
 
     def __init__(self, file: Optional[Path] = None):
         self.file = file
-        self.projects = {}
+        self.generation = 0
+        self.projects = ProjectMap(self)
         self.common_project = None
-
-        if file and file.is_file():
+        self.fragments = []
+        self._saved_signature = None
+        self._saved_data = None
+        self._saved_settings = None
+        self._saved_common = None
+        self._sorted_names = None
+        self._word_index = None
+
+        if file and (file.is_file() or get_fragments_dir(file).is_dir()):
             self.load()
 
     def load(self):
         """
-        Load from self.file
+        Load from self.file and its fragments
         """
         if not self.file:
             raise ConfigError("Cannot load a config without specifying the file")
-        if not self.file.is_file():
+
+        signature = get_signature(self.file)
+        if signature is not None:
+            parsed = load_yaml(self.file)
+        elif get_fragments_dir(self.file).is_dir():
+            # Projects can all be in fragments
+            parsed = {}
+        else:
             raise ConfigError("Config file does not exist")
 
-        raw = self.file.read_text()
-        self.loads(raw)
+        self.load_data(parsed)
+        self.load_fragments()
+        self.mark_saved(signature, parsed)
+
+    def load_fragments(self):
+        """
+        Add the projects from the fragments dir, without parsing the fragments
+        """
+        assert self.file is not None
+        self.fragments = scan_fragments(self.file)
+        for fragment in self.fragments:
+            for name in fragment.names:
+                if name in self.projects:
+                    owner = self.projects.get_fragment(name)
+                    raise ConfigError(
+                        f"Project {name} in {fragment.file} is already defined in"
+                        f" {owner.file if owner else self.file}"
+                    )
+                self.projects.set_fragment(name, fragment)
+
+    def get_source_files(self) -> List[Path]:
+        """
+        Files and dirs the config is loaded from, not including deferred projects
+        """
+        if self.file is None:
+            return []
+        files = [self.file, get_fragments_dir(self.file)]
+        files.extend(fragment.file for fragment in self.fragments)
+        return files
 
     def loads(self, raw: str):
         """
         Load from a string
         """
-        parsed = yaml.safe_load(raw)
+        from . import loader
+
+        self.load_data(loader.load(raw))
+
+    def load_data(self, parsed: Dict[str, Any]):
+        """
+        Load from parsed yaml data
+        """
+        self.invalidate()
         for name, data in parsed.items():
             if data is None:
                 data = {}
@@ -384,20 +921,94 @@ class Config:
                 if "path" in data:
                     raise ConfigError("Common config cannot define a path")
                 self.common_project = Common.from_dict(self, name, data)
-            elif "config" in data:
-                self.projects[name] = DeferredProject(self, name, data["config"])
             else:
-                self.projects[name] = Project.from_dict(self, name, data)
+                self.projects.set_raw(name, data)
+        self.check_raw_needs(parsed)
+
+    def check_raw_needs(self, parsed: Dict[str, Any]):
+        """
+        Check the needs of the projects in parsed yaml data, without building them
+
+        Projects which are loaded from other files are checked when they are built.
+        """
+        common: Dict[str, List[str]] = {}
+        if self.common_project:
+            common = self.common_project.get_needs_graph()
+        has_common_needs = any(common.values())
+
+        for name, data in parsed.items():
+            if (
+                name in ("_config", "_common")
+                or not isinstance(data, dict)
+                or "config" in data
+            ):
+                continue
+            commands = data.get("commands")
+            if not isinstance(commands, dict):
+                commands = {}
+            if not (
+                has_common_needs
+                or "needs" in data
+                or any(isinstance(c, dict) and "needs" in c for c in commands.values())
+            ):
+                continue
+
+            graph = dict(common)
+            for cmd_name, cmd_data in commands.items():
+                cmd_needs = []
+                if isinstance(cmd_data, dict):
+                    cmd_needs = cmd_data.get("needs", [])
+                graph[cmd_name] = parse_needs(cmd_name, cmd_needs)
+            check_needs(name, graph, parse_needs(name, data.get("needs", [])))
+
+    def build_project(
+        self, name: str, data: Dict[str, Any]
+    ) -> Project | DeferredProject:
+        """
+        Build a project from its raw data
+        """
+        if "config" in data:
+            return DeferredProject(self, name, data["config"])
+        return Project.from_dict(self, name, data)
+
+    def invalidate(self):
+        """
+        Discard values resolved from the config, after it has changed
+        """
+        self.generation += 1
 
     def get_project_names(self):
         return list(self.projects.keys())
 
+    def get_sorted_project_names(self) -> List[str]:
+        if self._sorted_names is None or self._sorted_names[0] != self.generation:
+            self._sorted_names = (self.generation, sorted(self.projects))
+        return self._sorted_names[1]
+
+    def get_word_index(self) -> WordIndex:
+        """
+        Word index for fuzzy matching project names
+        """
+        if self._word_index is None or self._word_index[0] != self.generation:
+            word_index = WordIndex.build(self.get_sorted_project_names())
+            self._word_index = (self.generation, word_index)
+        return self._word_index[1]
+
+    def get_command_names(self, project_name):
+        project = self.projects.get(project_name)
+        if not project:
+            return []
+        return project.get_command_names()
+
     def from_dict(self, data):
         """
         Load config values from _config definition dict
         """
         self.verbose = data.get("verbose", False)
         self.history = data.get("history", False)
+        self.native_completion = data.get("native_completion", False)
+        self.fuzzy_completion = data.get("fuzzy_completion", False)
+        self.incremental = data.get("incremental", False)
 
     def to_dict(self):
         """
@@ -407,9 +1018,14 @@ class Config:
         return {
             "verbose": self.verbose,
             "history": self.history,
+            "native_completion": self.native_completion,
+            "fuzzy_completion": self.fuzzy_completion,
+            "incremental": self.incremental,
         }
 
     def to_yaml(self):
+        from . import loader
+
         projects = {
             "_config": self.to_dict(),
         }
@@ -417,16 +1033,224 @@ class Config:
         if self.common_project:
             projects["_common"] = self.common_project.to_dict()
 
-        for project in self.projects.values():
-            projects[project.name] = project.to_dict()
+        # Projects in fragments are written to their own files
+        for name in self.projects:
+            if self.projects.get_fragment(name) is None:
+                projects[name] = self.projects[name].to_dict()
 
-        raw = yaml.dump(projects, sort_keys=True)
+        raw = loader.dump(projects)
         return raw
 
+    def is_current(self) -> bool:
+        """
+        Check the file and fragments have not changed since they were loaded or saved
+        """
+        if self.file is None:
+            return True
+        if get_signature(self.file) != self._saved_signature:
+            return False
+        if list_fragment_files(self.file) != [f.file for f in self.fragments]:
+            return False
+        return all(fragment.is_current() for fragment in self.fragments)
+
+    def mark_saved(self, signature: Optional[Signature], data: Dict[Any, Any]):
+        """
+        Record the state of the file, after it has been loaded or saved
+        """
+        self._saved_signature = signature
+        self._saved_data = data
+        self._saved_settings = self.to_dict()
+        self._saved_common = None
+        if self.common_project:
+            self._saved_common = self.common_project.to_dict()
+
+    def get_changes(self) -> Optional[Dict[Any, Optional[Dict[str, Any]]]]:
+        """
+        Find the top-level blocks which have changed since the file was loaded or saved
+
+        Returns a dict of names to their new data, or None if they have been removed.
+        Returns None if the file was not loaded, so changes are unknown.
+
+        Projects in fragments are not included - see get_fragment_changes()
+        """
+        saved = self._saved_data
+        if saved is None:
+            return None
+
+        changes: Dict[Any, Optional[Dict[str, Any]]] = {}
+        settings = self.to_dict()
+        if settings != self._saved_settings:
+            changes["_config"] = settings
+
+        common = self.common_project.to_dict() if self.common_project else None
+        if common != self._saved_common:
+            changes["_common"] = common
+
+        for name in saved:
+            if name not in ("_config", "_common") and name not in self.projects:
+                changes[name] = None
+
+        # Projects which haven't been built can't have changed
+        for project in self.projects.built():
+            if self.projects.get_fragment(project.name) is not None:
+                continue
+            data = project.to_dict()
+            if project.name in saved:
+                original = self.build_project(project.name, saved[project.name] or {})
+                if data == original.to_dict():
+                    continue
+            changes[project.name] = data
+        return changes
+
+    def get_fragment_changes(
+        self,
+    ) -> Dict[Fragment, Dict[str, Optional[Dict[str, Any]]]]:
+        """
+        Find the projects in each fragment which have changed since it was loaded
+
+        Returns a dict of fragments to their changes, in the same form as get_changes()
+        """
+        changes: Dict[Fragment, Dict[str, Optional[Dict[str, Any]]]] = {}
+        for fragment in self.fragments:
+            for name in fragment.names:
+                if self.projects.get_fragment(name) is not fragment:
+                    changes.setdefault(fragment, {})[name] = None
+
+        for project in self.projects.built():
+            owner = self.projects.get_fragment(project.name)
+            if owner is None:
+                continue
+            data = project.to_dict()
+            saved = owner.load()
+            if project.name in saved:
+                original = self.build_project(project.name, saved[project.name] or {})
+                if data == original.to_dict():
+                    continue
+            changes.setdefault(owner, {})[project.name] = data
+        return changes
+
+    def save_fragment(
+        self, fragment: Fragment, changes: Dict[str, Optional[Dict[str, Any]]]
+    ):
+        """
+        Write changes to the projects in a fragment
+
+        Changed blocks are spliced in if possible, otherwise the fragment's projects
+        are all written.
+        """
+        from . import document, loader
+
+        spliced = None
+        if fragment.is_current():
+            blocks = {
+                name: None if data is None else loader.dump({name: data})
+                for name, data in changes.items()
+            }
+            spliced = document.splice(fragment.file.read_text(), fragment.names, blocks)
+
+        saved = fragment.load()
+        if spliced is None:
+            data = {
+                name: self.projects[name].to_dict()
+                for name in self.projects
+                if self.projects.get_fragment(name) is fragment
+            }
+            raw = loader.dump(data) if data else ""
+        else:
+            raw, names = spliced
+            data = {
+                name: changes[name] if name in changes else saved[name]
+                for name in names
+            }
+
+        document.write_atomic(fragment.file, raw)
+        fragment.mark_saved(get_signature(fragment.file), data)
+
+    def save_changes(
+        self, changes: Dict[Any, Optional[Dict[str, Any]]]
+    ) -> Optional[Tuple[str, Dict[Any, Any]]]:
+        """
+        Splice changed blocks into the file
+
+        Returns the new document and its data, or None if the whole config needs to be
+        written instead.
+        """
+        from . import document, loader
+
+        if self.file is None or self._saved_data is None:
+            return None
+        if self._saved_signature is None:
+            # No main file yet - the projects were all in fragments
+            return None
+        if get_signature(self.file) != self._saved_signature:
+            # Changed by something else since we loaded it
+            return None
+
+        blocks = {
+            name: None if data is None else loader.dump({name: data})
+            for name, data in changes.items()
+        }
+        spliced = document.splice(self.file.read_text(), list(self._saved_data), blocks)
+        if spliced is None:
+            return None
+        raw, names = spliced
+        saved = self._saved_data
+        data = {
+            name: changes[name] if name in changes else saved[name] for name in names
+        }
+        return raw, data
+
     def save(self):
+        """
+        Write the config to its file
+
+        If the file hasn't changed since it was loaded, only the projects which have
+        changed are serialised and spliced into it. The file is replaced atomically.
+
+        Projects in fragments are written to the fragment which owns them, and the main
+        file is only written if something in it has changed.
+        """
+        from . import loader
+        from .document import write_atomic
+        from .fragments import write_names
+
         if self.file is None:
             raise ConfigError("Cannot save a config without specifying the file")
 
-        raw = self.to_yaml()
+        changes = self.get_changes()
+        fragment_changes = self.get_fragment_changes()
+        saved = self.save_changes(changes) if changes else None
+
+        # Keep the index if only the changed projects need updating
+        index = None
+        if (
+            changes is not None
+            and "_common" not in changes
+            and (saved is not None or not changes)
+        ):
+            index = NameIndex.read(self.file)
+            if index is not None and not index.is_current():
+                index = None
+
+        if changes is None or changes:
+            if saved is None:
+                raw = self.to_yaml()
+                data = loader.load(raw)
+            else:
+                raw, data = saved
+            write_atomic(self.file, raw)
+            self.mark_saved(get_signature(self.file), data)
+
+        for fragment, fragment_change in fragment_changes.items():
+            self.save_fragment(fragment, fragment_change)
+        if fragment_changes:
+            write_names(self.file, self.fragments)
 
-        self.file.write_text(raw)
+        if index is None:
+            NameIndex.from_config(self).write()
+        else:
+            changed = list(changes or {})
+            for fragment_change in fragment_changes.values():
+                changed.extend(fragment_change)
+            index.update(self, changed)
+            index.write()
@@ -8,3 +8,28 @@ COMPLETE_VAR = "_WORKENV_COMPLETE"
 CONFIG_DEFAULT_FILENAME = "~/.workenv_config.yml"
 CONFIG_ENV_VAR = "WORKENV_CONFIG_PATH"
 PROJECT_DEFAULT_FILENAME = "workenv.yaml"
+CACHE_DIR_ENV_VAR = "WORKENV_CACHE_DIR"
+CACHE_DIRNAME = "workenv"
+YAML_BACKEND_ENV_VAR = "WORKENV_YAML_BACKEND"
+SERVER_SOCKET_FILENAME = "workenv.sock"
+PROFILE_ENV_VAR = "WORKENV_PROFILE"
+
+# What the active project applied, for incremental switching
+ACTIVE_VAR = "_WORKENV_ACTIVE"
+
+# Prerequisite commands which have been run in the current shell session
+SATISFIED_VAR = "_WORKENV_SATISFIED"
+
+# Project name which means the project for the current dir
+CURRENT_PROJECT = "."
+
+# Output protocol - the shell function sets PROTOCOL_VAR to the version it expects. The
+# original protocol (when unset) is one command per line; version 2 is a header and
+# then each command as a NUL-terminated record, so commands can contain newlines.
+PROTOCOL_VAR = "_WORKENV_PROTOCOL"
+PROTOCOL_VERSION = "2"
+PROTOCOL_HEADER = f"workenv:{PROTOCOL_VERSION}"
+
+# Threads checking and discovering projects spend their time blocked on the filesystem,
+# so use more than there are cores
+MAX_WORKERS = 32
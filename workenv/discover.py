@@ -0,0 +1,158 @@
+"""
+Discover projects by scanning dirs for project files
+
+``workenv --discover <root>`` walks each root looking for dirs which contain a
+``workenv.yaml``, so they can be added as deferred projects. Dirs are scanned across a
+thread pool, as the walk spends nearly all of its time waiting on the filesystem.
+Version control dirs, hidden dirs, ``node_modules`` and virtual environments are not
+walked.
+
+To make re-runs fast, the listing of each dir is cached with the dir's mtime. A dir's
+mtime changes when entries are added to or removed from it, so a dir whose mtime hasn't
+changed is only stat'ed, and its cached subdirs are walked without reading it again.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cache import get_cache_path, read_cache, write_cache
+from .config import Config, DeferredProject
+from .constants import MAX_WORKERS, PROJECT_DEFAULT_FILENAME
+
+# Increment when the cache format changes
+DISCOVER_VERSION = 1
+
+# Dirs which are never walked, as well as hidden dirs
+PRUNE_NAMES = {"node_modules", "__pycache__", "venv", "site-packages"}
+
+# A dir containing this is a virtual environment
+VENV_MARKER = "pyvenv.cfg"
+
+# Cached listing of a dir, as (mtime, has a project file, subdirs to walk)
+Listing = Tuple[int, bool, List[str]]
+
+
+def is_pruned(name: str) -> bool:
+    return name.startswith(".") or name in PRUNE_NAMES
+
+
+def scan_dir(path: str, cached: Optional[Listing]) -> Optional[Listing]:
+    """
+    List a dir, or return the cached listing if the dir hasn't changed
+
+    Returns None if the dir can't be read.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if cached is not None and cached[0] == mtime:
+        return cached
+
+    has_project = False
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name == VENV_MARKER:
+                    return (mtime, False, [])
+                if entry.name == PROJECT_DEFAULT_FILENAME:
+                    has_project = entry.is_file()
+                elif not is_pruned(entry.name) and entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+    except OSError:
+        return None
+    return (mtime, has_project, sorted(subdirs))
+
+
+def read_listings(root: str) -> Dict[str, Listing]:
+    listings = read_cache(get_cache_path("discover", Path(root)), DISCOVER_VERSION)
+    if listings is None:
+        return {}
+    return listings
+
+
+def write_listings(root: str, listings: Dict[str, Listing]):
+    prefix = os.path.join(root, "")
+    write_cache(
+        get_cache_path("discover", Path(root)),
+        DISCOVER_VERSION,
+        {
+            path: listing
+            for path, listing in listings.items()
+            if path == root or path.startswith(prefix)
+        },
+    )
+
+
+def find_project_dirs(roots: List[str], max_workers: int = MAX_WORKERS) -> List[str]:
+    """
+    Walk the roots and return the dirs which contain a project file, sorted
+
+    Roots should be absolute paths.
+    """
+    cached: Dict[str, Listing] = {}
+    for root in roots:
+        cached.update(read_listings(root))
+
+    listings: Dict[str, Listing] = {}
+    seen: Set[str] = set(roots)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {
+            pool.submit(scan_dir, root, cached.get(root)): root for root in roots
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                listing = future.result()
+                if listing is None:
+                    continue
+                listings[path] = listing
+                for name in listing[2]:
+                    child = os.path.join(path, name)
+                    if child in seen:
+                        continue
+                    seen.add(child)
+                    pending[pool.submit(scan_dir, child, cached.get(child))] = child
+
+    for root in roots:
+        write_listings(root, listings)
+    return sorted(path for path, listing in listings.items() if listing[1])
+
+
+def get_registered_dirs(config: Config) -> Set[str]:
+    """
+    Find the dirs of the deferred projects already in the config
+    """
+    dirs = set()
+    for name in config.projects:
+        try:
+            project = config.projects[name]
+        except Exception:
+            continue
+        if isinstance(project, DeferredProject):
+            dirs.add(str(project.file.parent.expanduser().resolve()))
+    return dirs
+
+
+def get_project_name(path: str, roots: List[str], taken: Set[str]) -> Optional[str]:
+    """
+    Name a discovered project after its dir, or its path under the root if that is
+    already taken
+
+    Returns None if both names are taken.
+    """
+    candidates = [os.path.basename(path)]
+    for root in roots:
+        if path.startswith(os.path.join(root, "")):
+            candidates.append(os.path.relpath(path, root))
+            break
+    for name in candidates:
+        if name not in taken:
+            return name
+    return None
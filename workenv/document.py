@@ -0,0 +1,189 @@
+"""
+Write changes to the config file
+
+Serialising the whole config on every save gets slow as it grows, so when only a few
+projects have changed, their top-level blocks are serialised and spliced into the
+existing file in place of the old ones. Everything else in the file, including
+comments and formatting, is left as it was.
+
+Top-level blocks are found by looking for lines which aren't indented. If the file uses
+anything which makes that unreliable, such as multiple documents or anchors in a
+changed block, splicing is refused and the caller should write the whole config.
+
+Processes changing the config at the same time should hold ``locked()`` while they
+load, change and save it, so they don't overwrite each other's changes.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import stat
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Lines which can't start a top-level key in a single-document block mapping
+unsupported_prefixes = ("---", "...", "%", "-", "?", "{", "[", "&", "*", "!", "|", ">")
+
+# Anchors defined in a block - other blocks could refer to them
+anchor_pattern = re.compile(r"(?:^|[\s\[{,:])&[^\s\[\]{},]")
+
+
+def write_atomic(path: Path, raw: str):
+    """
+    Write a file by writing a temporary file next to it and renaming it over the
+    original, so a crash or full disk can't leave it truncated
+
+    Symlinks are followed, so a linked config stays linked.
+    """
+    path = path.resolve()
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_path.open("w") as file:
+            file.write(raw)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(path.stat().st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def locked(path: Path) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock for changing a file
+
+    The file itself is replaced on write, so the lock is taken on a separate lock file
+    in the cache dir, which is left in place.
+    """
+    import fcntl
+
+    from .cache import get_cache_path
+
+    lock_path = get_cache_path("locks", path.resolve(), suffix="lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def is_top_level(line: str) -> bool:
+    return bool(line.strip()) and line[0] not in " \t#"
+
+
+def split_blocks(raw: str) -> Optional[Tuple[List[str], List[Tuple[int, int, int]]]]:
+    """
+    Split a yaml document into top-level blocks
+
+    Returns the lines and a list of blocks as (start, end, trailer end) line indexes,
+    where the trailer is the blank lines and comments between the block and the next.
+    Lines before the first block are not part of any block. Returns None if the
+    document can't be split reliably.
+    """
+    lines = raw.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+
+    starts: List[int] = []
+    for i, line in enumerate(lines):
+        if not is_top_level(line):
+            continue
+        if line.startswith(unsupported_prefixes):
+            if not starts and line.startswith(("---", "%")):
+                # Document start and directives are fine before the first block
+                continue
+            return None
+        starts.append(i)
+
+    blocks = []
+    for i, start in enumerate(starts):
+        trailer_end = starts[i + 1] if i + 1 < len(starts) else len(lines)
+        end = trailer_end
+        while end > start + 1 and (
+            not lines[end - 1].strip() or lines[end - 1].startswith("#")
+        ):
+            end -= 1
+        blocks.append((start, end, trailer_end))
+    return lines, blocks
+
+
+def is_block_for(line: str, name: Any) -> bool:
+    """
+    Check the first line of a block is the key for the given name
+    """
+    from . import loader
+
+    try:
+        data = loader.load(line)
+    except Exception:
+        return False
+    return isinstance(data, dict) and name in data
+
+
+def is_header_name(name: Any) -> bool:
+    """
+    Check if the name is a special block such as ``_config``, which belong at the top
+    """
+    return isinstance(name, str) and name.startswith("_")
+
+
+def splice(
+    raw: str, names: List[Any], blocks: Dict[Any, Optional[str]]
+) -> Optional[Tuple[str, List[Any]]]:
+    """
+    Replace, remove or add top-level blocks in a yaml document
+
+    ``names`` are the top-level keys of ``raw`` in order, and ``blocks`` maps names to
+    their new serialised block, or None to remove them. New header blocks are added
+    before the first block, and any other new blocks are added at the end.
+
+    Returns the new document and its top-level keys in order, or None if the document
+    can't be spliced reliably.
+    """
+    split = split_blocks(raw)
+    if split is None:
+        return None
+    lines, positions = split
+    if len(positions) != len(names):
+        return None
+
+    added = {
+        name: block
+        for name, block in blocks.items()
+        if name not in names and block is not None
+    }
+    head = [name for name in added if is_header_name(name)]
+    tail = [name for name in added if not is_header_name(name)]
+
+    first = positions[0][0] if positions else len(lines)
+    out = lines[:first]
+    out.extend(added[name] for name in head)
+    new_names = list(head)
+
+    for name, (start, end, trailer_end) in zip(names, positions):
+        if name not in blocks:
+            out.extend(lines[start:trailer_end])
+            new_names.append(name)
+            continue
+
+        old = "".join(lines[start:end])
+        if not is_block_for(lines[start], name) or anchor_pattern.search(old):
+            return None
+        block = blocks[name]
+        if block is not None:
+            out.append(block)
+            new_names.append(name)
+        out.extend(lines[end:trailer_end])
+
+    out.extend(added[name] for name in tail)
+    new_names.extend(tail)
+    return "".join(out), new_names
@@ -0,0 +1,167 @@
+"""
+Config fragments
+
+As well as the main config file, projects can be defined in fragment files in a ``.d``
+dir next to it - for ``~/.workenv_config.yml`` this is ``~/.workenv_config.d/``. Each
+``.yml`` or ``.yaml`` file in it is a mapping of project names, in the same format as
+the main file. ``_config`` and ``_common`` can only be set in the main file.
+
+So that a large config split across many fragments doesn't mean parsing all of them on
+every run, the names in each fragment are stored in a cache file, keyed on the
+fragment's signature. A fragment is only parsed when one of its projects is used, or
+when it has changed since its names were cached.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import profile
+from .cache import (
+    Signature,
+    get_cache_path,
+    get_signature,
+    load_yaml,
+    read_cache,
+    write_cache,
+)
+
+# Increment when the names cache format changes
+NAMES_VERSION = 1
+
+FRAGMENT_SUFFIXES = (".yml", ".yaml")
+
+# Keys which can only be set in the main config file
+RESERVED_NAMES = ("_config", "_common")
+
+
+def get_fragments_dir(file: Path) -> Path:
+    return file.with_name(f"{file.stem}.d")
+
+
+def list_fragment_files(file: Path) -> List[Path]:
+    """
+    Find the fragment files for a config file, in the order they are loaded
+    """
+    directory = get_fragments_dir(file)
+    try:
+        with os.scandir(directory) as entries:
+            names = [
+                entry.name
+                for entry in entries
+                if not entry.name.startswith(".")
+                and entry.name.endswith(FRAGMENT_SUFFIXES)
+                and entry.is_file()
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    return [directory / name for name in sorted(names)]
+
+
+def parse_fragment(path: Path) -> Dict[str, Any]:
+    from .config import ConfigError
+
+    data = load_yaml(path)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ConfigError(f"Config fragment {path} must be a mapping of projects")
+    for name in RESERVED_NAMES:
+        if name in data:
+            raise ConfigError(
+                f"Config fragment {path} cannot set {name} - it must be in the main"
+                " config file"
+            )
+    return data
+
+
+class Fragment:
+    """
+    A fragment file, and the names of the projects it holds
+    """
+
+    file: Path
+    names: List[str]
+    signature: Optional[Signature]
+    _data: Optional[Dict[str, Any]]
+
+    def __init__(
+        self,
+        file: Path,
+        names: List[str],
+        signature: Optional[Signature],
+        data: Optional[Dict[str, Any]] = None,
+    ):
+        self.file = file
+        self.names = names
+        self.signature = signature
+        self._data = data
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Parse the fragment, if it hasn't been already
+        """
+        if self._data is None:
+            with profile.phase("fragment.load"):
+                self._data = parse_fragment(self.file)
+        return self._data
+
+    def is_loaded(self) -> bool:
+        return self._data is not None
+
+    def is_current(self) -> bool:
+        """
+        Check the file has not changed since the fragment was loaded or saved
+        """
+        return get_signature(self.file) == self.signature
+
+    def mark_saved(self, signature: Optional[Signature], data: Dict[str, Any]):
+        self.signature = signature
+        self.names = list(data)
+        self._data = data
+
+
+def scan_fragments(file: Path) -> List[Fragment]:
+    """
+    Find the fragments for a config file, using cached names where they are current
+    """
+    paths = list_fragment_files(file)
+    if not paths:
+        return []
+
+    cached = read_cache(get_cache_path("fragments", file), NAMES_VERSION)
+    if cached is None:
+        cached = {}
+
+    fragments = []
+    changed = len(cached) != len(paths)
+    for path in paths:
+        signature = get_signature(path)
+        entry = cached.get(str(path))
+        if signature is not None and entry is not None and entry[0] == signature:
+            fragments.append(Fragment(path, entry[1], signature))
+            continue
+
+        data = parse_fragment(path)
+        fragments.append(Fragment(path, list(data), signature, data))
+        changed = True
+
+    if changed:
+        write_names(file, fragments)
+    return fragments
+
+
+def write_names(file: Path, fragments: List[Fragment]):
+    """
+    Cache the names in each fragment
+    """
+    write_cache(
+        get_cache_path("fragments", file),
+        NAMES_VERSION,
+        {
+            str(fragment.file): (fragment.signature, fragment.names)
+            for fragment in fragments
+        },
+    )
@@ -0,0 +1,149 @@
+"""
+Incremental switching between projects
+
+With ``incremental: true`` in ``_config``, activating a project sets
+``_WORKENV_ACTIVE`` in the shell with a record of what it applied - the files it
+sourced with their signatures, and the variables it exported. The shell function passes
+it back to workenv, and when another project or command is activated in the same shell,
+only the difference is output:
+
+* variables the new command doesn't set are put back how they were, or unset
+* variables are only exported if their value has changed
+* files are only sourced if they weren't sourced last time, or have changed since
+
+Before a variable is first exported, the shell saves its value in
+``_WORKENV_ORIG_<name>``, so it can be put back as it was in the shell - workenv's own
+environment may differ, and can't see variables which aren't exported.
+``_WORKENV_ACTIVE`` and the saved values are not exported, so child shells start
+without an active project.
+
+Run steps are always output. Commands which use environment snapshots put back what the
+active command changed, are then activated in full, and clear the record.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shlex
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+from .cache import get_signature
+from .config import resolve_path
+from .constants import ACTIVE_VAR
+
+if TYPE_CHECKING:
+    from .config import Command
+
+
+# Increment when the state format changes
+ACTIVE_VERSION = 2
+
+# Shell variable holding the value of a variable before it was first exported, as
+# "set:<value>", or empty if it was unset
+ORIGINAL_VAR = "_WORKENV_ORIG_%s"
+
+
+def get_active_state() -> Dict[str, Any]:
+    """
+    Read what the last activation in this shell applied, from the environment
+    """
+    try:
+        state = json.loads(os.environ.get(ACTIVE_VAR, ""))
+    except ValueError:
+        return {}
+    if not isinstance(state, dict) or state.get("version") != ACTIVE_VERSION:
+        return {}
+    return state
+
+
+def get_source_key(source: str, cwd: Optional[str]) -> Optional[str]:
+    """
+    Identify a sourced file by its path and signature, or None if it can't be found
+    without a shell
+    """
+    path = resolve_path(source, cwd)
+    if path is None:
+        return None
+    signature = get_signature(Path(path))
+    if signature is None:
+        return None
+    return f"{path}:{':'.join(map(str, signature))}"
+
+
+def save_original(name: str) -> str:
+    """
+    Save the value of a variable before it is first exported
+    """
+    original = ORIGINAL_VAR % name
+    return f"[[ -n ${{{original}+x}} ]] || {original}=${{{name}+set:${name}}}"
+
+
+def restore_original(name: str) -> str:
+    """
+    Put a variable back to its saved value, or unset it if it wasn't set
+    """
+    original = ORIGINAL_VAR % name
+    return (
+        f'if [[ -n ${original} ]]; then {name}="${{{original}#set:}}";'
+        f" else unset {name}; fi"
+    )
+
+
+def render_restore(names: Iterable[str]) -> Iterator[str]:
+    """
+    Put back variables the active command exported, and forget their saved values
+    """
+    for name in names:
+        yield restore_original(name)
+        yield f"unset {ORIGINAL_VAR % name}"
+
+
+def render_incremental(command: Command) -> Iterator[str]:
+    """
+    Generate the shell commands to switch from the active command to this one
+    """
+    active = get_active_state()
+    active_sources: List[str] = active.get("sources", [])
+    active_env: Dict[str, str] = active.get("env", {})
+
+    path = None
+    if command.path:
+        path = command.replace_values(str(command.path))
+        yield f"cd {path}"
+    cwd = resolve_path(path, None) if path is not None else None
+
+    # Put back anything the active command changed which this one doesn't set
+    env = {key: command.replace_values(val) for key, val in command.env.items()}
+    yield from render_restore(key for key in active_env if key not in env)
+
+    sources: List[str] = []
+    for source in command.source:
+        source = command.replace_values(source)
+        source_key = get_source_key(source, cwd)
+        if source_key is None or source_key not in active_sources:
+            yield f"source {source}"
+        if source_key is not None:
+            sources.append(source_key)
+
+    for key, val in env.items():
+        if key in active_env:
+            if active_env[key] != val:
+                # Values can refer to the variable, so apply to what it was before
+                yield restore_original(key)
+                yield f"export {key}={val}"
+        else:
+            yield save_original(key)
+            yield f"export {key}={val}"
+
+    yield from command.get_run_steps()
+
+    state = {
+        "version": ACTIVE_VERSION,
+        "project": command.get_project_name(),
+        "command": command.name if command.parent else None,
+        "sources": sources,
+        "env": env,
+    }
+    yield f"{ACTIVE_VAR}={shlex.quote(json.dumps(state))}"
@@ -0,0 +1,267 @@
+"""
+Persisted index of project and command names
+
+Tab completion only needs names, so rather than load the config and any deferred
+project files on every tab press, the names are stored in a small index in the cache
+dir. The index records the signature of each file it was built from, and is rebuilt
+when any of them change.
+
+Project names are also stored sorted, so completions can be found by bisecting. If
+fuzzy completion is enabled, the word index for fuzzy matching is stored in a separate
+cache file, as it is larger and only needed when no names match the prefix.
+
+The index also records the dir of each project, so the project for a dir can be found
+without loading the config. These are arranged in a trie of path components, stored in
+its own cache file, so the deepest project containing a dir is found with one lookup
+for each component of the dir's path.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from .cache import Signature, get_cache_path, get_signature, read_cache, write_cache
+from .matching import WordIndex
+
+if TYPE_CHECKING:
+    from .config import Config
+
+
+# Increment when the index format changes
+INDEX_VERSION = 3
+
+# Key in a path trie node for the name of the project in that dir. Path components
+# can't be empty, so it can't clash with a component.
+PATH_END = ""
+
+# Nested dicts of path components
+PathTrie = Dict[str, Any]
+
+
+def split_path(path: str) -> List[str]:
+    return [part for part in path.split(os.sep) if part]
+
+
+def build_path_trie(dirs: Dict[str, Optional[str]]) -> PathTrie:
+    """
+    Build a trie of project dirs - if projects share a dir, the first one is used
+    """
+    trie: PathTrie = {}
+    for name, path in dirs.items():
+        if path is None:
+            continue
+        node = trie
+        for part in split_path(path):
+            node = node.setdefault(part, {})
+        node.setdefault(PATH_END, name)
+    return trie
+
+
+class NameIndex:
+    file: Path
+    sources: Dict[str, Optional[Signature]]
+    projects: Dict[str, List[str]]
+    sorted_projects: List[str]
+    fuzzy_completion: bool
+
+    # Project names to their real dir, if known
+    dirs: Dict[str, Optional[str]]
+
+    # Identifies this build of the index, to match it to its word index and path trie
+    build_id: int
+
+    def __init__(
+        self,
+        file: Path,
+        sources: Dict[str, Optional[Signature]],
+        projects: Dict[str, List[str]],
+        fuzzy_completion: bool = False,
+        sorted_projects: Optional[List[str]] = None,
+        dirs: Optional[Dict[str, Optional[str]]] = None,
+        build_id: Optional[int] = None,
+    ):
+        self.file = file
+        self.sources = sources
+        self.projects = projects
+        self.fuzzy_completion = fuzzy_completion
+        if sorted_projects is None:
+            sorted_projects = sorted(projects)
+        self.sorted_projects = sorted_projects
+        self.dirs = dirs or {}
+        self.build_id = build_id or time.time_ns()
+
+    @classmethod
+    def from_config(cls, config: Config) -> NameIndex:
+        """
+        Build the index from a loaded config
+        """
+        if config.file is None:
+            raise ValueError("Cannot index a config without a file")
+
+        index = cls(
+            file=config.file,
+            sources={
+                str(path): get_signature(path) for path in config.get_source_files()
+            },
+            projects={},
+            fuzzy_completion=config.fuzzy_completion,
+        )
+        for name in config.projects:
+            index.add_project(config, name)
+        index.sorted_projects = sorted(index.projects)
+        return index
+
+    def add_project(self, config: Config, name: str):
+        """
+        Add or replace the entry for a project
+        """
+        project = config.projects[name]
+        for source in project.get_source_files():
+            self.sources[str(source)] = get_signature(source)
+        try:
+            self.projects[name] = project.get_command_names()
+        except Exception:
+            # A broken deferred project shouldn't stop completion of the rest;
+            # its file's signature is recorded, so it will be retried once fixed
+            common_names = []
+            if config.common_project:
+                common_names = config.common_project.get_command_names()
+            self.projects[name] = common_names
+
+        try:
+            self.dirs[name] = project.get_dir()
+        except Exception:
+            self.dirs[name] = None
+
+    def update(self, config: Config, names: Iterable[Any]):
+        """
+        Update the entries for the given projects after the config was saved
+        """
+        if config.file is None:
+            raise ValueError("Cannot index a config without a file")
+
+        for path in config.get_source_files():
+            self.sources[str(path)] = get_signature(path)
+        for name in names:
+            if name in config.projects:
+                self.add_project(config, name)
+            else:
+                self.projects.pop(name, None)
+                self.dirs.pop(name, None)
+
+        # Keep the config's order
+        self.projects = {name: self.projects[name] for name in config.projects}
+        self.dirs = {name: self.dirs.get(name) for name in config.projects}
+        self.sorted_projects = sorted(self.projects)
+        self.fuzzy_completion = config.fuzzy_completion
+        self.build_id = time.time_ns()
+
+    @classmethod
+    def read(cls, file: Path) -> Optional[NameIndex]:
+        """
+        Read the index for the given config file, if there is one
+        """
+        data = read_cache(get_cache_path("index", file), INDEX_VERSION)
+        if data is None:
+            return None
+        return cls(
+            file=file,
+            sources=data["sources"],
+            projects=data["projects"],
+            fuzzy_completion=data["fuzzy_completion"],
+            sorted_projects=data["sorted_projects"],
+            dirs=data["dirs"],
+            build_id=data["build_id"],
+        )
+
+    def write(self):
+        write_cache(
+            get_cache_path("index", self.file),
+            INDEX_VERSION,
+            {
+                "sources": self.sources,
+                "projects": self.projects,
+                "fuzzy_completion": self.fuzzy_completion,
+                "sorted_projects": self.sorted_projects,
+                "dirs": self.dirs,
+                "build_id": self.build_id,
+            },
+        )
+
+    def is_current(self) -> bool:
+        """
+        Check none of the source files have changed since the index was built
+        """
+        return all(
+            get_signature(Path(source)) == signature
+            for source, signature in self.sources.items()
+        )
+
+    def get_project_names(self) -> List[str]:
+        return list(self.projects.keys())
+
+    def get_sorted_project_names(self) -> List[str]:
+        return self.sorted_projects
+
+    def get_word_index(self) -> WordIndex:
+        """
+        Load the word index for fuzzy matching project names, building it if needed
+        """
+        path = get_cache_path("words", self.file)
+        data = read_cache(path, INDEX_VERSION)
+        if data is not None and data[0] == self.build_id:
+            return WordIndex.from_data(self.sorted_projects, data[1])
+
+        word_index = WordIndex.build(self.sorted_projects)
+        write_cache(path, INDEX_VERSION, (self.build_id, word_index.to_data()))
+        return word_index
+
+    def get_command_names(self, project_name: str) -> List[str]:
+        return self.projects.get(project_name, [])
+
+    def get_path_trie(self) -> PathTrie:
+        """
+        Load the trie of project dirs, building it if needed
+        """
+        path = get_cache_path("paths", self.file)
+        data = read_cache(path, INDEX_VERSION)
+        if data is not None and data[0] == self.build_id:
+            return data[1]
+
+        trie = build_path_trie(self.dirs)
+        write_cache(path, INDEX_VERSION, (self.build_id, trie))
+        return trie
+
+    def find_project(self, path: str) -> Optional[str]:
+        """
+        Find the project whose dir is the deepest one containing the given path
+        """
+        node = self.get_path_trie()
+        found = node.get(PATH_END)
+        for part in split_path(os.path.realpath(path)):
+            child: Optional[PathTrie] = node.get(part)
+            if child is None:
+                break
+            node = child
+            found = node.get(PATH_END, found)
+        return found
+
+
+def load_index(file: Path, config: Optional[Config] = None) -> NameIndex:
+    """
+    Load the index for the given config file, rebuilding it if it is out of date
+
+    If the config has already been loaded, pass it in to rebuild the index from it.
+    """
+    index = NameIndex.read(file)
+    if index is None or not index.is_current():
+        if config is None or not config.is_current():
+            from .config import Config
+
+            config = Config(file=file)
+        index = NameIndex.from_config(config)
+        index.write()
+    return index
@@ -0,0 +1,133 @@
+"""
+Run steps which only run when their input files change
+
+A ``run`` step can be given as ``run_if_changed`` with a list of ``inputs`` - files or
+globs, relative to the command's path. The step is only output if the contents of its
+inputs have changed since it last succeeded, so setup steps such as ``npm ci`` or
+``./manage.py migrate`` don't run on every activation.
+
+Each project has a state dir in the cache dir. Input files are hashed, and the hashes
+are kept in the state dir with the files' signatures, so a file is only hashed again
+when its signature changes. A step is output with a command to write the digest of its
+inputs to a stamp file in the state dir when it succeeds, and is skipped while the
+stamp matches the current digest.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import shlex
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from . import profile
+from .cache import (
+    Signature,
+    get_cache_path,
+    get_signature,
+    hash_file,
+    read_cache,
+    write_cache,
+)
+from .config import resolve_path
+
+if TYPE_CHECKING:
+    from .config import Command
+
+
+# Increment when the state format changes
+INPUTS_VERSION = 1
+
+# Name of the file in the state dir which holds the hashes of input files
+HASHES_FILENAME = "hashes.cache"
+
+
+def get_state_dir(command: Command) -> Path:
+    key = f"{command.config.file}#{command.get_project_name()}"
+    return get_cache_path("steps", Path(key), suffix="d")
+
+
+def find_inputs(patterns: List[str], cwd: Optional[str]) -> Optional[List[str]]:
+    """
+    Find the files matching the input patterns, or None if a pattern can't be resolved
+    without a shell
+    """
+    paths: Set[str] = set()
+    for pattern in patterns:
+        resolved = resolve_path(pattern, cwd)
+        if resolved is None:
+            return None
+        paths.update(
+            path for path in glob.glob(resolved, recursive=True) if os.path.isfile(path)
+        )
+    return sorted(paths)
+
+
+def hash_inputs(state_dir: Path, paths: List[str]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Hash the input files, reusing the hashes of files which haven't changed
+    """
+    hashes_path = state_dir / HASHES_FILENAME
+    hashes: Dict[str, Tuple[Optional[Signature], Optional[str]]] = (
+        read_cache(hashes_path, INPUTS_VERSION) or {}
+    )
+
+    changed = False
+    digests = []
+    for path in paths:
+        signature = get_signature(Path(path))
+        cached = hashes.get(path)
+        if cached is not None and signature is not None and cached[0] == signature:
+            digest = cached[1]
+        else:
+            if profile.enabled:
+                profile.count("inputs_hashed")
+            digest = hash_file(path)
+            hashes[path] = (signature, digest)
+            changed = True
+        digests.append((path, digest))
+
+    if changed:
+        write_cache(hashes_path, INPUTS_VERSION, hashes)
+    return digests
+
+
+def render_if_changed(
+    command: Command, step: Dict[str, Any], cwd: Optional[str]
+) -> Optional[str]:
+    """
+    Render a run_if_changed step, or return None if its inputs haven't changed since
+    it last succeeded
+    """
+    import hashlib
+
+    run = step["run_if_changed"]
+    commands = [run] if isinstance(run, str) else run
+    # Stop at the first failure, so the stamp is only written if they all succeed
+    rendered = " && ".join(
+        command.render_eval(command.replace_values(c)) for c in commands
+    )
+    inputs = step.get("inputs", [])
+    patterns = [inputs] if isinstance(inputs, str) else inputs
+    paths = find_inputs([command.replace_values(p) for p in patterns], cwd)
+    if paths is None:
+        # Can't tell if the inputs have changed, so always run it
+        return rendered
+
+    state_dir = get_state_dir(command)
+    digest = hashlib.sha1(
+        repr((rendered, hash_inputs(state_dir, paths))).encode()
+    ).hexdigest()
+    stamp = state_dir / f"{hashlib.sha1(rendered.encode()).hexdigest()}.done"
+    try:
+        if stamp.read_text() == digest:
+            return None
+    except OSError:
+        pass
+
+    try:
+        state_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return rendered
+    return f"{{ {rendered}; }} && printf %s {digest} > {shlex.quote(str(stamp))}"
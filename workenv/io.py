@@ -13,3 +13,14 @@ def echo(line):
 def error(line):
     sys.stderr.write(line)
     sys.stderr.write("\n")
+
+
+def echo_records(header, records):
+    """
+    Write a header and records, each terminated by a NUL
+    """
+    sys.stdout.write(header)
+    sys.stdout.write("\0")
+    for record in records:
+        sys.stdout.write(record)
+        sys.stdout.write("\0")
@@ -0,0 +1,57 @@
+"""
+Yaml loader and dumper
+
+All config parsing and serialisation goes through here, so it can use the libyaml C
+implementation when it is available - it is several times faster than pure python.
+
+The backend can be forced by setting the WORKENV_YAML_BACKEND env var to ``c`` or
+``python``.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, NamedTuple, Optional, Type
+
+import yaml
+
+from .config import ConfigError
+from .constants import YAML_BACKEND_ENV_VAR
+
+BACKEND_C = "c"
+BACKEND_PYTHON = "python"
+
+
+class Backend(NamedTuple):
+    name: str
+    loader: Type
+    dumper: Type
+
+
+def get_backend(name: Optional[str] = None) -> Backend:
+    """
+    Find the requested backend, or the fastest available if no name is given
+    """
+    if not name:
+        name = BACKEND_C if yaml.__with_libyaml__ else BACKEND_PYTHON
+
+    if name == BACKEND_C:
+        if not yaml.__with_libyaml__:
+            raise ConfigError("The libyaml C backend is not available")
+        return Backend(name, yaml.CSafeLoader, yaml.CSafeDumper)
+
+    if name == BACKEND_PYTHON:
+        return Backend(name, yaml.SafeLoader, yaml.SafeDumper)
+
+    raise ConfigError(f"Unexpected value for env var {YAML_BACKEND_ENV_VAR}: {name}")
+
+
+backend: Backend = get_backend(os.environ.get(YAML_BACKEND_ENV_VAR))
+
+
+def load(raw: str) -> Any:
+    return yaml.load(raw, Loader=backend.loader)
+
+
+def dump(data: Any) -> str:
+    return yaml.dump(data, Dumper=backend.dumper, sort_keys=True)
@@ -0,0 +1,223 @@
+"""
+Match names for completion
+
+Prefix matches are found by bisecting a sorted list of names.
+
+Fuzzy matches use word boundaries: the query is split into parts on separators such as
+``-``, and each part must start a word in the name, with the rest of its characters
+appearing in that word in order. For example, ``api-gw`` matches
+``company-api-gateway``.
+
+To avoid checking every name, a ``WordIndex`` maps each distinct word to the names
+which contain it. Each part of the query is only checked against the words which start
+with its first character, and the names containing those words are intersected.
+"""
+
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Pattern, Set, Tuple
+
+# Characters which separate words in a name
+SEPARATORS = "-_./: "
+
+# Maximum number of fuzzy matches to return
+FUZZY_LIMIT = 100
+
+# Walk the ranking rather than sorting matches when more than 1 in this many names match
+DENSE_RATIO = 20
+
+separator_pattern = re.compile(f"[{re.escape(SEPARATORS)}]+")
+
+# Sorts after any character which would be typed
+MAX_CHAR = "\U0010ffff"
+
+
+def prefix_matches(sorted_names: List[str], prefix: str) -> List[str]:
+    """
+    Find the names which start with the prefix, in sorted order
+    """
+    start = bisect_left(sorted_names, prefix)
+    end = bisect_left(sorted_names, prefix + MAX_CHAR, lo=start)
+    return sorted_names[start:end]
+
+
+def split_words(value: str) -> List[str]:
+    return [word for word in separator_pattern.split(value.lower()) if word]
+
+
+def get_part_pattern(part: str) -> str:
+    """
+    Pattern for a part of a query at the start of a word, with the rest of its
+    characters in order in the same word
+    """
+    pattern = re.escape(part[0])
+    for char in part[1:]:
+        # Negated classes can't backtrack, so this is linear in the length of the word
+        pattern += f"[^{re.escape(SEPARATORS + char)}]*{re.escape(char)}"
+    return pattern
+
+
+def get_name_pattern(parts: List[str]) -> Pattern[str]:
+    """
+    Pattern to check the parts match separate words of a name, in order
+    """
+    word_start = f"(?:.*?[{re.escape(SEPARATORS)}])"
+    return re.compile(
+        word_start + "?" + word_start.join(get_part_pattern(part) for part in parts)
+    )
+
+
+class WordIndex:
+    """
+    Index of the words in a list of names
+
+    ``words`` are the distinct lower case words, sorted. The names containing
+    ``words[i]`` are ``postings[offsets[i]:offsets[i + 1]]``, as indexes into
+    ``names``. ``by_rank`` lists name indexes shortest first, and ``rank`` maps each
+    name index to its position in ``by_rank``.
+    """
+
+    names: List[str]
+    words: List[str]
+    offsets: array
+    postings: array
+    by_rank: array
+    rank: array
+
+    def __init__(
+        self,
+        names: List[str],
+        words: List[str],
+        offsets: array,
+        postings: array,
+        by_rank: array,
+        rank: array,
+    ):
+        self.names = names
+        self.words = words
+        self.offsets = offsets
+        self.postings = postings
+        self.by_rank = by_rank
+        self.rank = rank
+
+    @classmethod
+    def build(cls, names: List[str]) -> WordIndex:
+        word_names: Dict[str, List[int]] = {}
+        for i, name in enumerate(names):
+            for word in set(split_words(name)):
+                word_names.setdefault(word, []).append(i)
+
+        words = sorted(word_names)
+        offsets = array("I", [0])
+        postings = array("I")
+        for word in words:
+            postings.extend(word_names[word])
+            offsets.append(len(postings))
+
+        by_rank = array("I", sorted(range(len(names)), key=lambda i: len(names[i])))
+        rank = array("I", bytes(4 * len(names)))
+        for position, i in enumerate(by_rank):
+            rank[i] = position
+        return cls(names, words, offsets, postings, by_rank, rank)
+
+    def to_data(self) -> Tuple[List[str], bytes, bytes, bytes, bytes]:
+        """
+        Serialise the index, without the names
+        """
+        return (
+            self.words,
+            self.offsets.tobytes(),
+            self.postings.tobytes(),
+            self.by_rank.tobytes(),
+            self.rank.tobytes(),
+        )
+
+    @classmethod
+    def from_data(
+        cls, names: List[str], data: Tuple[List[str], bytes, bytes, bytes, bytes]
+    ) -> WordIndex:
+        words, *raw_arrays = data
+        arrays = []
+        for raw in raw_arrays:
+            values = array("I")
+            values.frombytes(raw)
+            arrays.append(values)
+        return cls(names, words, *arrays)
+
+    def find_part(self, part: str) -> Tuple[Set[int], Set[int]]:
+        """
+        Find the names with a word matching the part
+
+        Returns the indexes of names with a word which starts with the part, and of
+        names with a word which only matches it as a subsequence.
+        """
+        words = self.words
+        offsets = self.offsets
+        postings = self.postings
+        check = re.compile(get_part_pattern(part))
+        prefixed: Set[int] = set()
+        matched: Set[int] = set()
+
+        start = bisect_left(words, part[0])
+        end = bisect_left(words, part[0] + MAX_CHAR, lo=start)
+        for i in range(start, end):
+            word = words[i]
+            if word.startswith(part):
+                prefixed.update(postings[offsets[i] : offsets[i + 1]])
+            elif check.match(word):
+                matched.update(postings[offsets[i] : offsets[i + 1]])
+        return prefixed, matched - prefixed
+
+    def ranked(self, indexes: Set[int]) -> Iterator[int]:
+        """
+        Iterate over name indexes, shortest name first
+        """
+        if len(indexes) * DENSE_RATIO < len(self.names):
+            yield from sorted(indexes, key=self.rank.__getitem__)
+            return
+
+        # Most names are included, so it's quicker to walk the ranking until we have
+        # enough than to sort them all
+        for i in self.by_rank:
+            if i in indexes:
+                yield i
+
+    def match(self, query: str, limit: int = FUZZY_LIMIT) -> List[str]:
+        """
+        Find names which match the query at word boundaries, best first
+
+        Names where each part of the query starts a word come first, then shorter
+        names, then in sorted order.
+        """
+        parts = split_words(query)
+        if not parts:
+            return []
+
+        exact: Set[int] = set()
+        candidates: Optional[Set[int]] = None
+        for part in parts:
+            prefixed, matched = self.find_part(part)
+            if candidates is None:
+                exact, candidates = prefixed, prefixed | matched
+            else:
+                exact &= prefixed
+                candidates &= prefixed | matched
+            if not candidates:
+                return []
+        assert candidates is not None
+
+        # Candidates have a word for each part, but check they're in order
+        pattern = get_name_pattern(parts) if len(parts) > 1 else None
+        names = self.names
+        matches: List[str] = []
+        for tier in (exact, candidates - exact):
+            for i in self.ranked(tier):
+                if pattern and not pattern.match(names[i].lower()):
+                    continue
+                matches.append(names[i])
+                if len(matches) == limit:
+                    return matches
+        return matches
@@ -0,0 +1,118 @@
+"""
+Command prerequisites
+
+A command can list the commands it ``needs`` in the same project, such as a ``test``
+command which needs ``database``, which needs ``network``. The commands form a graph,
+which is checked for cycles when the config is loaded.
+
+When a command is run, its prerequisites are run first, in a schedule of levels - each
+level only needs commands from earlier levels, so the commands in a level are run at
+the same time as background jobs. Each prerequisite runs in a subshell, so it doesn't
+change the directory or environment of the shell.
+
+Once a prerequisite has succeeded, it is added to ``_WORKENV_SATISFIED`` so it is
+skipped the next time it is needed in the same shell session. If a prerequisite fails,
+the command and any remaining prerequisites are not run.
+"""
+
+from __future__ import annotations
+
+import shlex
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, cast
+
+from .constants import SATISFIED_VAR
+
+if TYPE_CHECKING:
+    from .config import Command, Project
+
+
+# Check the marker var for a key, in a form which can be formatted with the key
+SATISFIED_TEST = '[[ ":$%(var)s:" == *:%(key)s:* ]]'
+
+
+def find_cycle(graph: Dict[str, List[str]]) -> Optional[List[str]]:
+    """
+    Find a cycle in a graph of names to the names they need
+
+    Returns the names in the cycle, starting and ending with the same name, or None if
+    there are no cycles. Names which aren't in the graph are ignored.
+    """
+    # Names which are being visited, in order, and names which have been cleared
+    path: List[str] = []
+    visiting: Dict[str, int] = {}
+    cleared = set()
+
+    def visit(name: str) -> Optional[List[str]]:
+        if name in cleared or name not in graph:
+            return None
+        if name in visiting:
+            return path[visiting[name] :] + [name]
+        visiting[name] = len(path)
+        path.append(name)
+        for need in graph[name]:
+            cycle = visit(need)
+            if cycle:
+                return cycle
+        path.pop()
+        del visiting[name]
+        cleared.add(name)
+        return None
+
+    for name in graph:
+        cycle = visit(name)
+        if cycle:
+            return cycle
+    return None
+
+
+def get_schedule(graph: Dict[str, List[str]], needs: List[str]) -> List[List[str]]:
+    """
+    Order the names and everything they need into levels which can run concurrently
+
+    Each name is in the level after the deepest of the names it needs. The graph must
+    not have any cycles.
+    """
+    depths: Dict[str, int] = {}
+
+    def get_depth(name: str) -> int:
+        if name not in depths:
+            depths[name] = 1 + max((get_depth(n) for n in graph[name]), default=-1)
+        return depths[name]
+
+    for name in needs:
+        get_depth(name)
+
+    levels = max(depths.values(), default=-1) + 1
+    schedule: List[List[str]] = [[] for _ in range(levels)]
+    for name, depth in depths.items():
+        schedule[depth].append(name)
+    return schedule
+
+
+def render_needs(command: Command) -> Iterator[str]:
+    """
+    Generate the shell commands to run the prerequisites of a command
+    """
+    # A command's parent is always a project
+    project = cast("Project", command.parent or command)
+    for level in get_schedule(project.get_needs_graph(), command.needs):
+        jobs = []
+        keys = []
+        for name in level:
+            key = shlex.quote(f"{project.name}/{name}")
+            # One line, so it works with the protocol of one command per line
+            steps = "; ".join(
+                map(command.render_eval, project.get_command(name).render())
+            )
+            test = SATISFIED_TEST % {"var": SATISFIED_VAR, "key": key}
+            jobs.append([f"{test} || ( {steps or ':'}; )"])
+            keys.append(key)
+
+        if len(jobs) == 1:
+            yield f"{jobs[0][0]} || return 1"
+        else:
+            yield f"{command.render_jobs(jobs, wait=True)} || return 1"
+
+        for key in keys:
+            test = SATISFIED_TEST % {"var": SATISFIED_VAR, "key": key}
+            yield f"{test} || export {SATISFIED_VAR}=${SATISFIED_VAR}:{key}"
@@ -0,0 +1,116 @@
+"""
+Per-phase timing, enabled with ``WORKENV_PROFILE``
+
+Set ``WORKENV_PROFILE=1`` to write timings for each run to stderr, or set it to a file
+path to append them to that file. Each run writes one line of JSON, with the time spent
+and number of calls for each phase, and counts such as the number of projects built.
+
+When the env var is not set or is ``0``, ``phase()`` returns a shared no-op context manager and
+callers check ``enabled`` before counting, so instrumentation costs next to nothing.
+
+This is imported before the rest of workenv, so the ``imports`` phase covers the time
+from here until ``start()`` is called.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from typing import Dict, List
+
+from .constants import PROFILE_ENV_VAR
+
+started = time.perf_counter()
+target = os.environ.get(PROFILE_ENV_VAR, "")
+enabled = target not in ("", "0")
+
+# Phase name to [seconds, calls]
+phases: Dict[str, List[float]] = {}
+counts: Dict[str, int] = {}
+
+
+class Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+null_phase = NullPhase()
+
+
+def phase(name: str) -> Phase | NullPhase:
+    """
+    Context manager to time a phase, if profiling is enabled
+    """
+    if enabled:
+        return Phase(name)
+    return null_phase
+
+
+def record(name: str, seconds: float):
+    data = phases.setdefault(name, [0.0, 0])
+    data[0] += seconds
+    data[1] += 1
+
+
+def count(name: str, number: int = 1):
+    """
+    Add to a counter - callers on hot paths should check ``enabled`` first
+    """
+    counts[name] = counts.get(name, 0) + number
+
+
+def start():
+    """
+    Mark the start of a run, recording the time spent importing
+    """
+    if enabled:
+        record("imports", time.perf_counter() - started)
+
+
+def report(argv: List[str]):
+    """
+    Write the timings for the run
+    """
+    if not enabled:
+        return
+    import json
+
+    line = json.dumps(
+        {
+            "argv": argv,
+            "pid": os.getpid(),
+            "total": time.perf_counter() - started,
+            "phases": {
+                name: {"seconds": seconds, "calls": calls}
+                for name, (seconds, calls) in phases.items()
+            },
+            "counts": counts,
+        }
+    )
+    if target in ("1", "stderr"):
+        sys.stderr.write(line + "\n")
+        return
+    try:
+        with open(target, "a") as file:
+            file.write(line + "\n")
+    except OSError as e:
+        sys.stderr.write(f"Could not write profile to {target}: {e}\n")
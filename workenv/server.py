@@ -0,0 +1,172 @@
+"""
+Resident server which holds a loaded config in memory
+
+Started with ``workenv --serve``. The shell function sends resolve and completion
+requests to it over a unix socket in $XDG_RUNTIME_DIR using client.py, and falls back
+to running workenv normally if the server is not running or can't handle the request.
+
+Before each request the server checks the signatures of the config files it has
+loaded, and reloads only the ones which have changed.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from . import cli
+from .client import FORWARD_ENV
+from .config import Config, ConfigError, DeferredProject
+from .constants import CURRENT_PROJECT, SERVER_SOCKET_FILENAME
+
+
+def get_socket_path() -> Optional[Path]:
+    """
+    Return the path to the server socket, or None if there is no runtime dir
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        return None
+    return Path(runtime_dir) / SERVER_SOCKET_FILENAME
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    server: Server
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            response = {"status": "fallback"}
+        else:
+            response = self.server.process(request)
+        self.wfile.write(json.dumps(response).encode())
+
+
+class Server(socketserver.UnixStreamServer):
+    config: Config
+
+    def __init__(self, socket_path: Path, config: Config):
+        if config.file is None:
+            raise ConfigError("Cannot serve a config without a file")
+        self.config = config
+        super().__init__(str(socket_path), RequestHandler)
+
+    def refresh(self):
+        """
+        Reload anything which has changed since it was loaded
+        """
+        if not self.config.is_current():
+            self.config = Config(file=self.config.file)
+            return
+
+        for project in self.config.projects.built():
+            if isinstance(project, DeferredProject) and not project.is_current():
+                project.reload()
+
+    def process(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process a request from the client
+        """
+        argv = request.get("argv", [])
+        env = request.get("env", {})
+
+        # Actions change state or interact with the user, so always run normally
+        if any(arg.startswith("--") for arg in argv):
+            return {"status": "fallback"}
+
+        # The server doesn't know the client's current dir
+        if argv and argv[0] == CURRENT_PROJECT:
+            return {"status": "fallback"}
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        old_argv = sys.argv
+        old_env = {key: os.environ.get(key) for key in FORWARD_ENV}
+        try:
+            sys.argv = ["workenv"] + argv
+            for key in FORWARD_ENV:
+                if key in env:
+                    os.environ[key] = env[key]
+                else:
+                    os.environ.pop(key, None)
+
+            if cli.get_config_path() != self.config.file:
+                return {"status": "fallback"}
+
+            self.refresh()
+
+            # Incremental switching needs the client's environment
+            if self.config.incremental:
+                return {"status": "fallback"}
+
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                cli.handle(self.config)
+
+        except Exception:
+            # Let the normal path report the problem
+            return {"status": "fallback"}
+
+        finally:
+            sys.argv = old_argv
+            for key, val in old_env.items():
+                if val is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = val
+
+        return {
+            "status": "ok",
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+        }
+
+
+def is_running(socket_path: Path) -> bool:
+    """
+    Check if a server is listening on the socket
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def serve(config: Config, socket_path: Path):
+    """
+    Serve requests until interrupted
+    """
+    if socket_path.exists():
+        if is_running(socket_path):
+            raise ConfigError(f"A server is already running on {socket_path}")
+        socket_path.unlink()
+
+    # Stop on SIGTERM as well as ctrl+c
+    def stop(signum, frame):
+        raise KeyboardInterrupt()
+
+    signal.signal(signal.SIGTERM, stop)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(socket_path, config)
+    finally:
+        os.umask(old_umask)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
@@ -0,0 +1,208 @@
+"""
+Environment snapshots
+
+Sourcing a virtualenv's ``activate`` script or running ``nvm use`` can take a second or
+more, and does the same thing every time. A command with ``snapshot: true`` runs its
+``source``, ``env`` and ``run`` steps once in a bash subshell, and records how they
+changed the environment. Later activations output ``export`` and ``unset`` lines to make
+the same changes, instead of running the steps again.
+
+The steps run with only a minimal baseline of variables from the environment, such as
+``HOME`` and ``PATH``, so the changes recorded don't depend on the shell which took the
+snapshot.
+
+A snapshot is kept until the rendered steps change, or one of its input files changes -
+the files it sources, and any others listed under ``snapshot`` in the config. Input
+files are checked by signature, and only hashed if the signature has changed.
+
+Snapshots can't capture anything other than exported variables, so steps which define
+shell functions or aliases, or which have side effects such as starting services,
+should not be snapshotted. Variables which aren't in the baseline can't be unset. If the
+steps fail, they are output to run as normal.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from . import profile
+from .cache import (
+    Signature,
+    get_cache_path,
+    get_signature,
+    hash_file,
+    read_cache,
+    write_cache,
+)
+from .config import resolve_path
+
+if TYPE_CHECKING:
+    from .config import Command
+
+
+# Increment when the snapshot format changes
+ENVIRONMENT_VERSION = 2
+
+# Variables which bash changes by itself, which workenv sets separately, or which
+# belong to the interactive shell - a venv's activate script exports its prompt
+IGNORED_VARS = {"PWD", "OLDPWD", "SHLVL", "_", "PS1", "PS2", "PROMPT_COMMAND"}
+
+# Prefixes of variables to ignore, such as the values a venv saves to deactivate
+IGNORED_PREFIXES = ("BASH_FUNC_", "_OLD_VIRTUAL_")
+
+# Variables passed from the environment to the steps - anything else they set is recorded
+BASELINE_VARS = ("HOME", "LOGNAME", "PATH", "USER")
+
+# Give up on steps which take longer than this, in seconds
+CAPTURE_TIMEOUT = 60
+
+# An input file, as (path, signature, sha1 of its contents)
+Input = Tuple[str, Optional[Signature], Optional[str]]
+
+# Separates the environment before and after the steps in the capture output
+MARKER = "\0workenv-snapshot\0"
+
+CAPTURE_SCRIPT = """
+env -0
+printf %(marker)s
+{
+%(steps)s
+} >&2 </dev/null
+printf %(marker)s
+env -0
+"""
+
+
+def get_snapshot_path(command: Command) -> Path:
+    key = f"{command.config.file}#{command.get_project_name()}#{command.name}"
+    return get_cache_path("environments", Path(key))
+
+
+def get_input_paths(command: Command, cwd: Optional[str]) -> List[str]:
+    """
+    Find the files which the snapshot depends on
+    """
+    if cwd is not None:
+        cwd = resolve_path(cwd, None)
+    paths = []
+    for value in command.source + (command.snapshot or []):
+        path = resolve_path(command.replace_values(value), cwd)
+        if path is not None and path not in paths:
+            paths.append(path)
+    return paths
+
+
+def check_inputs(inputs: List[Input]) -> Optional[List[Input]]:
+    """
+    Check none of the input files have changed since the snapshot was taken
+
+    Returns the inputs with their current signatures, or None if any have changed.
+    """
+    checked = []
+    for path, signature, digest in inputs:
+        current = get_signature(Path(path))
+        if current != signature:
+            # Touched or copied, but it may have the same contents
+            if current is None or signature is None or hash_file(path) != digest:
+                return None
+        checked.append((path, current, digest))
+    return checked
+
+
+def parse_env(raw: str) -> Dict[str, str]:
+    env = {}
+    for entry in raw.split("\0"):
+        name, sep, value = entry.partition("=")
+        if sep and name not in IGNORED_VARS and not name.startswith(IGNORED_PREFIXES):
+            env[name] = value
+    return env
+
+
+def diff_env(before: Dict[str, str], after: Dict[str, str]) -> List[str]:
+    """
+    Build the shell commands to change the environment from before to after
+
+    If a variable was added to at the start or end, such as ``PATH``, the command adds
+    the same value to whatever it is when the snapshot is used.
+    """
+    lines = []
+    for name, value in after.items():
+        old = before.get(name)
+        if old == value:
+            continue
+        if old and value.endswith(old):
+            added = value[: -len(old)]
+            lines.append(f'export {name}={shlex.quote(added)}"${name}"')
+        elif old and value.startswith(old):
+            added = value[len(old) :]
+            lines.append(f'export {name}="${name}"{shlex.quote(added)}')
+        else:
+            lines.append(f"export {name}={shlex.quote(value)}")
+    for name in before:
+        if name not in after:
+            lines.append(f"unset {name}")
+    return lines
+
+
+def capture(cwd: Optional[str], steps: List[str]) -> Optional[List[str]]:
+    """
+    Run the steps in a bash subshell and return the environment changes, or None if
+    they failed
+    """
+    import subprocess
+
+    script = CAPTURE_SCRIPT % {
+        "marker": shlex.quote(MARKER.replace("\0", "\\0")),
+        "steps": "\n".join(([f"cd {cwd}"] if cwd else []) + steps),
+    }
+    try:
+        result = subprocess.run(
+            ["bash", "-c", script],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env={
+                name: os.environ[name] for name in BASELINE_VARS if name in os.environ
+            },
+            timeout=CAPTURE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    parts = result.stdout.decode(errors="surrogateescape").split(MARKER)
+    if result.returncode != 0 or len(parts) != 3:
+        return None
+    return diff_env(parse_env(parts[0]), parse_env(parts[2]))
+
+
+def get_snapshot(command: Command, cwd: Optional[str]) -> Iterator[str]:
+    """
+    Generate the shell commands for a command's steps from its snapshot, taking the
+    snapshot if there isn't a current one
+    """
+    steps = list(command.get_steps())
+    path = get_snapshot_path(command)
+    data = read_cache(path, ENVIRONMENT_VERSION)
+    if data is not None and data[:2] == (cwd, steps):
+        inputs = check_inputs(data[2])
+        if inputs is not None:
+            if inputs != data[2]:
+                write_cache(path, ENVIRONMENT_VERSION, (*data[:2], inputs, data[3]))
+            yield from data[3]
+            return
+
+    with profile.phase("snapshot.capture"):
+        inputs = [
+            (input_path, get_signature(Path(input_path)), hash_file(input_path))
+            for input_path in get_input_paths(command, cwd)
+        ]
+        lines = capture(cwd, steps)
+    if lines is None:
+        # Run them as normal, so the user sees what went wrong
+        yield from steps
+        return
+
+    write_cache(path, ENVIRONMENT_VERSION, (cwd, steps, inputs, lines))
+    yield from lines
@@ -0,0 +1,94 @@
+"""
+Template values
+
+Config values can include variables such as ``{{project.name}}``. Each template string
+is parsed once into a list of segments, so rendering it is a join rather than a regex
+substitution.
+
+Supported variables:
+
+* ``{{project.name}}`` - the name of the project
+* ``{{project.slug}}`` - the name of the project as a slug
+* ``{{project.path}}`` - the path of the project
+* ``{{command.name}}`` - the name of the command, or the project if not a command
+
+To include a literal ``{{``, escape it as ``\\{{``. Unknown variables render as an
+empty string.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+# Matches an escaped opening brace or a variable
+token_pattern = re.compile(
+    r"(?P<escape>\\\{\{)|\{\{\s*(?P<var>(?:project|command)\.[a-z]+)\s*\}\}"
+)
+
+Segment = Union[str, Tuple[str]]
+
+
+class Template:
+    """
+    Parsed template string
+
+    Segments are either literal strings or 1-tuples containing a variable name.
+    """
+
+    segments: List[Segment]
+
+    # The rendered string if there are no variables, otherwise None
+    static: Optional[str]
+
+    def __init__(self, raw: str):
+        self.segments = []
+        pos = 0
+        literal = ""
+        any_vars = False
+        for match in token_pattern.finditer(raw):
+            literal += raw[pos : match.start()]
+            pos = match.end()
+            if match.group("escape"):
+                literal += "{{"
+                continue
+            if literal:
+                self.segments.append(literal)
+                literal = ""
+            self.segments.append((match.group("var"),))
+            any_vars = True
+        literal += raw[pos:]
+        if literal:
+            self.segments.append(literal)
+
+        # Without variables, the literal is the whole rendered string
+        self.static = None if any_vars else literal
+
+    def render(self, context: Dict[str, str]) -> str:
+        return "".join(
+            segment if isinstance(segment, str) else context.get(segment[0], "")
+            for segment in self.segments
+        )
+
+
+@lru_cache(maxsize=None)
+def compile_template(raw: str) -> Template:
+    """
+    Parse a template string, reusing the result for identical strings
+    """
+    return Template(raw)
+
+
+def slugify(name: str) -> str:
+    """
+    Convert a name to a slug
+
+    Based on Django's slugify()
+    """
+    import unicodedata
+
+    slug = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    slug = re.sub(r"[^\w\s-]", "", slug.lower())
+    slug = re.sub(r"[-\s]+", "-", slug).strip("-_")
+    return slug